@@ -1,12 +1,21 @@
+from functools import wraps
+
+from django.conf import settings
 from django.contrib import admin, messages
 from django.utils.html import format_html
-from import_export.admin import ImportExportModelAdmin
 from django.db.models import Count
-from django.db.models.functions import TruncMonth
 from django.urls import path
 from django.template.response import TemplateResponse
-from django.shortcuts import redirect
-from .models import Product, Category, Supplier, SupplierDetail, HomePage, Commande
+from django.shortcuts import get_object_or_404, redirect
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, StreamingHttpResponse
+from .models import (
+    Product, Category, Supplier, SupplierDetail, HomePage, Commande, CommandeLine, ProductImportJob,
+)
+from .forms import CommandeLineInlineFormSet, PriceAdjustmentForm, ProductImportForm
+from .orders import cancel_orders, reserve_admin_lines
+from . import bulk, caching, invoices, metrics, product_io, routers, stats
+from .templatetags.image_variants import variant
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.admin import UserAdmin, GroupAdmin
 
@@ -14,22 +23,28 @@ from django.contrib.auth.admin import UserAdmin, GroupAdmin
 #      PRODUCT ADMIN
 # ==============================
 @admin.register(Product)
-class ProductAdmin(ImportExportModelAdmin, admin.ModelAdmin):
+class ProductAdmin(admin.ModelAdmin):
     list_display = (
         'image_tag', 'name', 'price', 'supplier', 'quantity', 'formatted_created_at',
         'stock_status', 'categories_list', 'short_description'
     )
-    search_fields = ('name', 'price')
+    search_fields = ('reference', 'name', 'price')
     list_filter = ('created_at', 'price', 'quantity')
     ordering = ('-created_at',)
-    fields = ('name', 'price', 'quantity', 'description', 'supplier', 'created_at', 'categories', 'image', 'image_tag')
+    fields = ('reference', 'name', 'price', 'quantity', 'description', 'supplier', 'created_at', 'categories', 'image', 'image_tag')
     readonly_fields = ('created_at', 'image_tag')
     list_per_page = 10
     list_editable = ('quantity',)
     date_hierarchy = 'created_at'
-    actions = ['set_price_to_zero', 'duplicate_product', 'apply_discount']
+    actions = ['set_price_to_zero', 'duplicate_product', 'apply_discount', 'adjust_prices', 'export_selection_csv']
+    # Boutons Importer / Exporter (import et export en flux, voir product_io.py)
+    change_list_template = 'admin/myapp/product/change_list.html'
     filter_horizontal = ('categories',)
     autocomplete_fields = ('categories',)
+    list_select_related = ('supplier',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('categories')
 
     def formatted_created_at(self, obj):
         return obj.created_at.strftime('%d-%m-%Y %H:%M:%S')
@@ -43,33 +58,128 @@ class ProductAdmin(ImportExportModelAdmin, admin.ModelAdmin):
 
     def set_price_to_zero(self, request, queryset):
         updated = queryset.update(price=0)
+        caching.bump_version(caching.CATALOGUE)
         self.message_user(request, f"{updated} produit(s) mis à 0.", messages.SUCCESS)
     set_price_to_zero.short_description = 'Mettre le prix à 0'
 
+    @staticmethod
+    def _progress_reporter():
+        # Avancement lot par lot (aussi journalisé par myapp.bulk)
+        batches = []
+
+        def progress(done, total):
+            batches.append(done)
+        return batches, progress
+
     def duplicate_product(self, request, queryset):
-        count = 0
-        for product in queryset:
-            product.pk = None
-            product.save()
-            count += 1
-        self.message_user(request, f"{count} produit(s) dupliqué(s).", messages.SUCCESS)
+        batches, progress = self._progress_reporter()
+        count = bulk.duplicate_products(queryset, progress=progress)
+        self.message_user(
+            request, f"{count} produit(s) dupliqué(s) en {len(batches)} lot(s).", messages.SUCCESS
+        )
     duplicate_product.short_description = 'Dupliquer les produits'
 
     def apply_discount(self, request, queryset):
-        from decimal import Decimal
-        discount_percentage = Decimal("0.9")
-        count = 0
-        for product in queryset:
-            if product.price:
-                product.price = Decimal(product.price) * discount_percentage
-                product.save()
-                count += 1
-        self.message_user(request, f"Remise de 10%% appliquée sur {count} produit(s).", messages.SUCCESS)
+        batches, progress = self._progress_reporter()
+        count = bulk.adjust_prices(queryset.exclude(price=0), bulk.PERCENT, -10, progress=progress)
+        self.message_user(
+            request, f"Remise de 10% appliquée sur {count} produit(s) en {len(batches)} lot(s).",
+            messages.SUCCESS,
+        )
     apply_discount.short_description = "Appliquer une remise de 10%%"
 
+    def adjust_prices(self, request, queryset):
+        form = PriceAdjustmentForm(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            batches, progress = self._progress_reporter()
+            count = bulk.adjust_prices(
+                queryset, form.cleaned_data['mode'], form.cleaned_data['value'], progress=progress
+            )
+            self.message_user(
+                request, f"Prix ajusté sur {count} produit(s) en {len(batches)} lot(s).",
+                messages.SUCCESS,
+            )
+            return None
+
+        return TemplateResponse(request, 'admin/myapp/product/adjust_prices.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Ajuster les prix',
+            'opts': self.model._meta,
+            'form': form,
+            'queryset': queryset,
+            'selected': request.POST.getlist(admin.helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': admin.helpers.ACTION_CHECKBOX_NAME,
+        })
+    adjust_prices.short_description = 'Ajuster les prix (pourcentage ou montant)'
+
+    # ----------------- Import / export -----------------
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='myapp_product_import'),
+            path(
+                'import/<int:job_id>/', self.admin_site.admin_view(self.import_status_view),
+                name='myapp_product_import_status',
+            ),
+            path('export/<str:fmt>/', self.admin_site.admin_view(self.export_view), name='myapp_product_export'),
+        ]
+        return custom_urls + urls
+
+    def import_view(self, request):
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+        form = ProductImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            job = product_io.start_import(form.cleaned_data['file'])
+            return redirect('admin:myapp_product_import_status', job.pk)
+
+        return TemplateResponse(request, 'admin/myapp/product/import.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Importer des produits',
+            'opts': self.model._meta,
+            'form': form,
+            'recent_jobs': ProductImportJob.objects.all()[:5],
+        })
+
+    def import_status_view(self, request, job_id):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        return TemplateResponse(request, 'admin/myapp/product/import_status.html', {
+            **self.admin_site.each_context(request),
+            'title': "Suivi de l'import",
+            'opts': self.model._meta,
+            'job': get_object_or_404(ProductImportJob, pk=job_id),
+        })
+
+    def _export_response(self, queryset, fmt):
+        if fmt == 'csv':
+            response = StreamingHttpResponse(
+                product_io.iter_products_csv(queryset), content_type='text/csv; charset=utf-8'
+            )
+        elif fmt == 'xlsx' and product_io.xlsx_supported():
+            response = StreamingHttpResponse(
+                product_io.iter_products_xlsx(queryset),
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            )
+        else:
+            raise Http404('Format non disponible')
+        response['Content-Disposition'] = f'attachment; filename="produits.{fmt}"'
+        return response
+
+    def export_view(self, request, fmt):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        return self._export_response(Product.objects.all(), fmt)
+
+    def export_selection_csv(self, request, queryset):
+        return self._export_response(queryset, 'csv')
+    export_selection_csv.short_description = 'Exporter la sélection (CSV)'
+
     def image_tag(self, obj):
         if obj.image:
-            return format_html('<img src="{}" width="50" style="border-radius:5px;" />', obj.image.url)
+            # Miniature générée en arrière-plan plutôt que l'original
+            return format_html('<img src="{}" width="50" style="border-radius:5px;" />', variant(obj.image, 'thumbnail'))
         return "Pas d'image"
     image_tag.short_description = 'Aperçu'
 
@@ -86,9 +196,13 @@ class CategoryAdmin(admin.ModelAdmin):
     fields = ('name',)
     list_per_page = 10
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(products_total=Count('products'))
+
     def products_count(self, obj):
-        return obj.products.count()
+        return obj.products_total
     products_count.short_description = 'Nombre de produits'
+    products_count.admin_order_field = 'products_total'
 
 
 # ==============================
@@ -109,6 +223,7 @@ class SupplierDetailAdmin(admin.ModelAdmin):
     fields = ('supplier', 'address', 'contact_email', 'website', 'contact_person', 'supplier_type', 
               'country', 'payment_terms', 'bank_account', 'region_served')
     list_per_page = 10
+    list_select_related = ('supplier',)
 
 
 # ==============================
@@ -153,29 +268,112 @@ class HomePageAdmin(admin.ModelAdmin):
 # ==============================
 #      COMMANDE ADMIN
 # ==============================
+class CommandeLineInline(admin.TabularInline):
+    model = CommandeLine
+    formset = CommandeLineInlineFormSet
+    fields = ('product', 'quantity', 'unit_price')
+    readonly_fields = ('product_name', 'unit_price')
+    autocomplete_fields = ('product',)
+    extra = 1
+
+    def get_fields(self, request, obj=None):
+        # Commande enregistrée : le nom figé, sans relire chaque produit
+        if obj is not None:
+            return ('product_name', 'quantity', 'unit_price')
+        return self.fields
+
+    # Les lignes ne sont modifiables qu'à la création : le stock est réservé à ce moment-là
+    def has_change_permission(self, request, obj=None):
+        return obj is None
+
+    def has_delete_permission(self, request, obj=None):
+        return obj is None
+
+
 @admin.register(Commande)
 class CommandeAdmin(admin.ModelAdmin):
     list_display = (
-        'product', 'quantity', 'total_commande', 'customer_name', 'status_colored',
+        'products_summary', 'items_count', 'total_commande', 'customer_name', 'status_colored',
         'customer_email', 'customer_phone', 'created_at', 'payment', 'is_delivered'
     )
     list_editable = ('is_delivered',)
     search_fields = ('customer_name', 'customer_email', 'customer_phone', 'customer_address')
-    list_filter = ('payment', 'is_delivered')
-    fields = ('product', 'quantity', 'customer_name', 'customer_email', 'customer_phone',
-              'customer_address', 'payment', 'is_delivered')
+    list_filter = ('payment', 'is_delivered', ('cancelled_at', admin.EmptyFieldListFilter))
+    fields = ('customer_name', 'customer_email', 'customer_phone',
+              'customer_address', 'payment', 'is_delivered', 'cancelled_at')
+    readonly_fields = ('cancelled_at',)
+    inlines = [CommandeLineInline]
     list_per_page = 5
+    actions = ['export_invoices_pdf', 'export_invoices_zip', 'cancel_selected']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('lines')
+
+    def save_related(self, request, form, formsets, change):
+        if not change:
+            lines = [
+                line_form.instance
+                for formset in formsets
+                for line_form in formset.forms
+                if line_form.has_changed() and not formset._should_delete_form(line_form)
+            ]
+            form.instance.total_amount = reserve_admin_lines(form.instance, lines)
+            form.instance.save(update_fields=['total_amount'])
+        super().save_related(request, form, formsets, change)
+
+    def products_summary(self, obj):
+        return obj.products_summary
+    products_summary.short_description = 'Produits'
+
+    def items_count(self, obj):
+        return obj.items_count
+    items_count.short_description = 'Articles'
 
     def total_commande(self, obj):
-        if obj.product and obj.product.price:
-            return obj.quantity * obj.product.price
-        return 0
+        # Total figé à la commande (somme des lignes au prix du moment)
+        return obj.total_amount
     total_commande.short_description = 'Total (€)'
 
+    def export_invoices_pdf(self, request, queryset):
+        try:
+            chunks = invoices.iter_invoices_pdf(queryset)
+        except invoices.TooManyInvoices:
+            # Grosse sélection : le PDF unique tiendrait tout en mémoire, ZIP à la place
+            self.message_user(
+                request,
+                f"Plus de {invoices.PDF_EXPORT_LIMIT} commandes : confirmations exportées en ZIP.",
+                messages.WARNING,
+            )
+            return self.export_invoices_zip(request, queryset)
+        response = StreamingHttpResponse(chunks, content_type='application/pdf')
+        response['Content-Disposition'] = 'attachment; filename="commandes.pdf"'
+        return response
+    export_invoices_pdf.short_description = f'Exporter les confirmations (un PDF, {invoices.PDF_EXPORT_LIMIT} max, ZIP au-delà)'
+
+    def export_invoices_zip(self, request, queryset):
+        response = StreamingHttpResponse(
+            invoices.iter_invoices_zip(queryset), content_type='application/zip'
+        )
+        response['Content-Disposition'] = 'attachment; filename="commandes.zip"'
+        return response
+    export_invoices_zip.short_description = 'Exporter les confirmations (ZIP de PDF)'
+
+    def cancel_selected(self, request, queryset):
+        selected = queryset.count()
+        count = cancel_orders(queryset)
+        skipped = selected - count
+        message = f"{count} commande(s) annulée(s), stock remis en rayon."
+        if skipped:
+            message += f" {skipped} commande(s) livrée(s) ou déjà annulée(s) ignorée(s)."
+        self.message_user(request, message, messages.SUCCESS)
+    cancel_selected.short_description = 'Annuler (remettre le stock)'
+
     def status_colored(self, obj):
-        color = 'green' if obj.is_delivered else 'red'
-        text = 'Livrée' if obj.is_delivered else 'En attente'
-        return format_html('<strong style="color:{};">{}</strong>', color, text)
+        if obj.cancelled_at:
+            color = 'gray'
+        else:
+            color = 'green' if obj.is_delivered else 'red'
+        return format_html('<strong style="color:{};">{}</strong>', color, obj.status)
     status_colored.short_description = 'Statut'
 
 
@@ -190,32 +388,51 @@ class MyAdminSite(admin.AdminSite):
         # Dashboard à la racine de l'admin
         custom_urls = [
             path('', self.admin_view(self.dashboard_view), name='dashboard'),
+            path('metriques/', self.admin_view(self.metrics_view), name='request_metrics'),
         ]
         return custom_urls + urls
 
-    def dashboard_view(self, request):
-        last_commands = (
-            Commande.objects
-            .select_related('product')
-            .order_by('-created_at')[:5]
-        )
-        monthly_orders = (
-            Commande.objects
-            .annotate(month=TruncMonth("created_at"))
-            .values("month")
-            .annotate(total=Count("id"))
-            .order_by("month")
-        )
+    def admin_view(self, view, cacheable=False):
+        protected = super().admin_view(view, cacheable)
+
+        # Après une modification, l'admin relit sur la base principale
+        @wraps(protected)
+        def pinned(request, *args, **kwargs):
+            response = protected(request, *args, **kwargs)
+            if request.method == 'POST':
+                routers.pin_to_primary(response)
+            return response
+        return pinned
 
+    def dashboard_view(self, request):
+        # Lecture seule : sur la réplique, rendu compris (requêtes paresseuses)
+        with routers.replica_reads(request):
+            last_commands = (
+                Commande.objects.filter(cancelled_at__isnull=True)
+                .prefetch_related('lines')
+                .order_by('-created_at')[:5]
+            )
+
+            context = dict(
+                self.each_context(request),
+                 commande=last_commands,  # 🔥 OBLIGATOIRE
+                products_count=stats.products_count(),
+                **stats.dashboard_stats(),
+            )
+            return TemplateResponse(request, "admin/dashboard.html", context).render()
+
+    def metrics_view(self, request):
+        if request.method == 'POST':
+            metrics.reset()
+            messages.success(request, "Métriques remises à zéro.")
+            return redirect('admin:request_metrics')
         context = dict(
             self.each_context(request),
-             commande=last_commands,  # 🔥 OBLIGATOIRE
-            products_count=Product.objects.count(),
-            orders_pending=Commande.objects.filter(is_delivered=False).count(),
-            orders_delivered=Commande.objects.filter(is_delivered=True).count(),
-            monthly_orders=monthly_orders,
+            title="Métriques par requête",
+            routes=metrics.summary(),
+            sample_rate=getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 0.1),
         )
-        return TemplateResponse(request, "admin/dashboard.html", context)
+        return TemplateResponse(request, "admin/request_metrics.html", context)
 
 
 # ==============================
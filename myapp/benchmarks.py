@@ -0,0 +1,245 @@
+import json
+import math
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import invoices
+from .models import Commande, Product
+from .pagination import PAGE_SIZE
+
+
+# ================= MESURES DE PERFORMANCE =================
+# À lancer sur une base peuplée (commande seed_data).
+#
+# Chemins d'accès : les requêtes réellement faites par les pages, avec
+# leur plan d'exécution et leur durée médiane. En mode comparaison, elles
+# sont rejouées sans les index déclarés dans Meta.indexes, supprimés dans
+# une transaction annulée ensuite (commande benchmark_queries).
+#
+# Charge : les pages elles-mêmes, appelées avec le client de test, pour
+# les percentiles de latence et le nombre de requêtes SQL, comparés à une
+# référence enregistrée (commande run_benchmarks).
+
+INDEXED_MODELS = (Product, Commande)
+
+
+def access_paths():
+    """Nom -> (queryset, fonction qui l'exécute comme la page le fait)."""
+    orders = Commande.objects.order_by("-created_at")
+    return {
+        "catalogue_accueil": (
+            Product.objects.filter(quantity__gt=0).order_by("-created_at", "-id")[:PAGE_SIZE + 1],
+            list,
+        ),
+        "admin_produits": (Product.objects.order_by("-created_at")[:10], list),
+        "admin_commandes": (orders[:5], list),
+        "admin_commandes_par_paiement": (orders.filter(payment="WAVE")[:5], list),
+        "admin_commandes_a_livrer": (orders.filter(is_delivered=False)[:5], list),
+        "commandes_a_livrer_total": (
+            Commande.objects.filter(is_delivered=False).order_by().values("pk"),
+            lambda qs: qs.count(),
+        ),
+        "statistiques_par_jour": (
+            Commande.objects.order_by()
+            .annotate(day=TruncDate("created_at", tzinfo=timezone.get_current_timezone()))
+            .values("day")
+            .annotate(total=Count("id"), delivered=Count("id", filter=Q(is_delivered=True))),
+            list,
+        ),
+    }
+
+
+def explain(queryset, tag=""):
+    """
+    Plan d'exécution de `queryset`. Le commentaire `tag` rend le texte SQL
+    propre à chaque passe : SQLite garde en cache les EXPLAIN préparés sans
+    revérifier le schéma, un plan d'avant suppression des index serait
+    sinon réaffiché.
+    """
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(f"{connection.ops.explain_query_prefix()} {sql} /* {tag} */", params)
+        return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def median_ms(queryset, evaluate, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # .all() : copie sans cache de résultats, la requête est rejouée
+        evaluate(queryset.all())
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def measure(repeat=5, tag=""):
+    return {
+        name: {"plan": explain(queryset, tag), "ms": median_ms(queryset, evaluate, repeat)}
+        for name, (queryset, evaluate) in access_paths().items()
+    }
+
+
+@contextmanager
+def without_indexes():
+    """Supprime les index de INDEXED_MODELS le temps du bloc, puis annule."""
+    # DROP INDEX direct : le schema_editor de SQLite refuse de tourner
+    # dans une transaction
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
+        try:
+            yield
+        finally:
+            transaction.set_rollback(True)
+
+
+def compare(repeat=5):
+    """Mesures avec et sans les index : {nom: {"with": ..., "without": ...}}."""
+    with_indexes = measure(repeat, "avec index")
+    with without_indexes():
+        without = measure(repeat, "sans index")
+    return {name: {"with": with_indexes[name], "without": without[name]} for name in with_indexes}
+
+
+# ----------------- Charge -----------------
+CUSTOMER = {
+    "customer_name": "Client Benchmark",
+    "customer_email": "benchmark@seed.invalid",
+    "customer_phone": "0700000000",
+    "customer_address": "Abidjan",
+    "payment": "WAVE",
+    "quantity": 1,
+}
+
+
+def percentile(values, rank):
+    """Percentile au rang le plus proche (`rank` entre 0 et 100)."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(rank / 100 * len(ordered)) - 1)]
+
+
+def scenarios(iterations):
+    """
+    Nom -> fonction(client, i) qui fait la requête i du scénario. Les
+    données utilisées sont tirées de la base au moment du lancement (dans
+    la transaction de run_suite : le stock ajouté ici est annulé ensuite).
+    """
+    product = Product.objects.filter(quantity__gt=0).order_by("pk").first()
+    if product is not None:
+        # Assez de stock pour que chaque commande passe vraiment
+        Product.objects.filter(pk=product.pk).update(quantity=F("quantity") + iterations)
+    words = list(
+        Product.objects.order_by("pk").values_list("name", flat=True)[:20]
+    ) or ["clavier"]
+    orders = list(Commande.objects.order_by("-pk").values_list("pk", flat=True)[:50])
+
+    # Client connecté : le cache des pages anonymes est contourné, on
+    # mesure le coût réel de la vue
+    def home(client, i):
+        return client.get(reverse("home"))
+
+    def search(client, i):
+        return client.get(reverse("home"), {"q": words[i % len(words)].split()[0]})
+
+    def order(client, i):
+        return client.post(reverse("commande", args=[product.pk]), CUSTOMER)
+
+    def invoice(client, i):
+        return client.get(reverse("generate_pdf", args=[orders[i % len(orders)]]))
+
+    def dashboard(client, i):
+        return client.get(reverse("admin:dashboard"))
+
+    suite = {"home": home, "search": search, "dashboard": dashboard}
+    if product is not None:
+        suite["commande_post"] = order
+    if orders:
+        suite["generate_pdf"] = invoice
+    return suite
+
+
+def run_suite(iterations=50, names=None):
+    """
+    Lance chaque scénario `iterations` fois, après un appel à blanc.
+    Retourne, par scénario, les latences p50/p95/p99 (ms) et le nombre
+    maximal de requêtes SQL. Tout est fait dans une transaction annulée :
+    la base n'est pas modifiée, et les factures sont rendues dans un
+    dossier temporaire.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as invoice_dir, \
+            mock.patch.object(invoices, "CACHE_DIR", invoice_dir), \
+            override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]), \
+            transaction.atomic():
+        try:
+            client = Client()
+            client.force_login(User.objects.create_superuser(
+                f"benchmark-{time.time_ns()}", "benchmark@seed.invalid", None
+            ))
+            for name, request in scenarios(iterations + 1).items():
+                if names and name not in names:
+                    continue
+                # Premier appel hors mesure : caches et sessions à froid
+                # ajouteraient des requêtes qui ne reviennent pas ensuite
+                request(client, 0)
+                timings, queries = [], []
+                for i in range(iterations):
+                    with CaptureQueriesContext(connection) as captured:
+                        start = time.perf_counter()
+                        response = request(client, i)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    if response.status_code >= 400:
+                        raise RuntimeError(f"{name} : réponse {response.status_code}")
+                    queries.append(len(captured))
+                results[name] = {
+                    "p50": round(percentile(timings, 50), 2),
+                    "p95": round(percentile(timings, 95), 2),
+                    "p99": round(percentile(timings, 99), 2),
+                    "queries": max(queries),
+                }
+        finally:
+            transaction.set_rollback(True)
+    return results
+
+
+def regressions(results, baseline, tolerance=0.25):
+    """
+    Écarts par rapport à la référence : p95 plus lent de plus de
+    `tolerance` (25 % par défaut) ou requêtes SQL en plus (aucune marge,
+    ce nombre est déterministe).
+    """
+    problems = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if result["queries"] > reference["queries"]:
+            problems.append(f"{name} : {result['queries']} requêtes SQL (référence {reference['queries']})")
+        if result["p95"] > reference["p95"] * (1 + tolerance):
+            problems.append(f"{name} : p95 {result['p95']:.1f} ms (référence {reference['p95']:.1f} ms)")
+    return problems
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as source:
+        return json.load(source)
+
+
+def save_baseline(path, results):
+    with open(path, "w", encoding="utf-8") as out:
+        json.dump(results, out, indent=2, sort_keys=True)
@@ -0,0 +1,127 @@
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Greatest, Round
+
+from . import caching, images, recommendations, search, stock
+from .models import Product, StockEvent
+from .storage import media_storage
+
+
+# ================= OPÉRATIONS DE MASSE SUR LE CATALOGUE =================
+# Chaque lot est un seul UPDATE (ou bulk_create) dans sa propre
+# transaction : sur SQLite le verrou d'écriture est relâché entre deux
+# lots, les commandes en cours ne restent pas bloquées.
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = getattr(settings, "BULK_CHUNK_SIZE", 500)
+
+PERCENT = "percent"
+FIXED = "fixed"
+
+
+def iter_id_chunks(queryset, size=CHUNK_SIZE):
+    """Identifiants de `queryset` par lots, parcourus par clé (sans OFFSET)."""
+    last_pk = 0
+    queryset = queryset.order_by("pk").values_list("pk", flat=True)
+    while True:
+        ids = list(queryset.filter(pk__gt=last_pk)[:size])
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+
+
+def _report(progress, done, total):
+    logger.info("%s/%s produit(s) traité(s)", done, total)
+    if progress:
+        progress(done, total)
+
+
+def price_expression(mode, value):
+    """
+    Nouveau prix calculé par la base : pourcentage (-10 = remise de 10 %)
+    ou montant fixe ajouté, arrondi au centime et jamais négatif.
+    """
+    value = Decimal(value)
+    if mode == PERCENT:
+        expression = F("price") * Value(1 + value / 100)
+    elif mode == FIXED:
+        expression = F("price") + Value(value)
+    else:
+        raise ValueError(f"Mode d'ajustement inconnu : {mode}")
+    return Greatest(
+        Round(expression, 2, output_field=DecimalField(max_digits=10, decimal_places=2)),
+        Value(Decimal("0")),
+    )
+
+
+def adjust_prices(queryset, mode, value, chunk_size=CHUNK_SIZE, progress=None):
+    """Applique l'ajustement à tout `queryset`, un UPDATE par lot. Retourne le nombre de produits."""
+    new_price = price_expression(mode, value)
+    total = queryset.count()
+    done = 0
+    for ids in iter_id_chunks(queryset, chunk_size):
+        with transaction.atomic():
+            done += Product.objects.filter(pk__in=ids).update(price=new_price)
+            # La gamme de prix entre dans le calcul des produits similaires
+            recommendations.schedule_refresh(ids)
+        _report(progress, done, total)
+
+    caching.bump_version(caching.CATALOGUE)
+    return done
+
+
+def duplicate_products(queryset, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Copie les produits de `queryset` avec leurs catégories : un bulk_create
+    pour les produits et un pour la table de liaison, par lot.
+    """
+    Through = Product.categories.through
+    # La référence est unique : les copies n'en ont pas
+    concrete_fields = [
+        f.attname for f in Product._meta.concrete_fields
+        if not f.primary_key and f.name != "reference"
+    ]
+    total = queryset.count()
+    done = 0
+
+    for ids in iter_id_chunks(queryset, chunk_size):
+        originals = list(Product.objects.filter(pk__in=ids).order_by("pk"))
+        categories = {}
+        for product_id, category_id in Through.objects.filter(
+            product_id__in=ids
+        ).values_list("product_id", "category_id"):
+            categories.setdefault(product_id, []).append(category_id)
+
+        with transaction.atomic():
+            copies = Product.objects.bulk_create([
+                Product(**{name: getattr(original, name) for name in concrete_fields})
+                for original in originals
+            ])
+            Through.objects.bulk_create([
+                Through(product_id=copy.pk, category_id=category_id)
+                for original, copy in zip(originals, copies)
+                for category_id in categories.get(original.pk, [])
+            ])
+            # bulk_create n'envoie pas post_save : index de recherche,
+            # journal du stock et produits similaires à la main
+            search.index_products(copies)
+            stock.record_movements({copy.pk: copy.quantity for copy in copies}, StockEvent.ADJUSTMENT)
+            recommendations.schedule_refresh(copy.pk for copy in copies)
+            # Les copies partagent l'image et ses tailles : une référence de plus
+            media_storage.retain(
+                name
+                for copy in copies
+                for name in [copy.image.name, *images.variant_paths(copy.image_variants)]
+            )
+
+        done += len(copies)
+        _report(progress, done, total)
+
+    caching.bump_version(caching.CATALOGUE)
+    return done
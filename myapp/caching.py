@@ -0,0 +1,112 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import routers
+
+
+# ================= CACHE DE LA VITRINE =================
+# Les clés sont versionnées par espace de noms ("homepage", "slides",
+# "catalogue"). Les signaux des modèles incrémentent la version : les
+# anciennes entrées ne sont plus jamais lues et expirent d'elles-mêmes,
+# sans avoir à retrouver ni supprimer chaque clé.
+
+TIMEOUT = getattr(settings, "STOREFRONT_CACHE_TIMEOUT", 60 * 15)
+
+HOMEPAGE = "homepage"
+SLIDES = "slides"
+CATALOGUE = "catalogue"
+
+_MISSING = object()
+
+
+def _version_key(namespace):
+    return f"myshop:version:{namespace}"
+
+
+def get_versions(*namespaces):
+    keys = [_version_key(ns) for ns in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Valeur initiale unique : une version évincée du cache ne
+            # peut pas ressusciter d'anciennes entrées
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(*namespaces):
+    for namespace in namespaces:
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def versioned_key(name, *namespaces):
+    versions = ".".join(str(v) for v in get_versions(*namespaces))
+    return f"myshop:{name}:{versions}"
+
+
+def get_or_set(name, namespace, compute):
+    key = versioned_key(name, namespace)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        # Jamais depuis la réplique, qui peut être en retard sur la version
+        with routers.primary_reads():
+            value = compute()
+        cache.set(key, value, TIMEOUT)
+    return value
+
+
+# ----------------- Fragments -----------------
+def get_home_data():
+    from .models import HomePage
+
+    return get_or_set("home_data", HOMEPAGE, HomePage.objects.first)
+
+
+def get_slides():
+    from .models import HomeSlide
+
+    return get_or_set("slides", SLIDES, lambda: list(HomeSlide.objects.all()))
+
+
+# ----------------- Pages complètes -----------------
+def cache_anonymous_page(*namespaces):
+    """
+    Met en cache la réponse des GET anonymes, par URL complète (chemin et
+    query string) et par version des espaces de noms dont la page dépend.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method != "GET" or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = versioned_key(f"page:{view.__name__}:{digest}", *namespaces)
+
+            response = cache.get(key)
+            if response is not None:
+                return response
+
+            # Page mise en cache : lue sur la base principale (voir routers.py)
+            with routers.primary_reads():
+                response = view(request, *args, **kwargs)
+            # Une page qui pose un cookie (CSRF, session) est propre au visiteur
+            if (
+                response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+                and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+            ):
+                cache.set(key, response, TIMEOUT)
+            return response
+        return wrapped
+    return decorator
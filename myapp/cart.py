@@ -0,0 +1,41 @@
+from .models import Product
+
+
+# ================= PANIER =================
+# Le panier vit dans la session : {id produit (str): quantité}.
+CART_SESSION_KEY = "cart"
+
+
+class Cart:
+    def __init__(self, request):
+        self.session = request.session
+        self.items = self.session.get(CART_SESSION_KEY, {})
+
+    def _save(self):
+        self.session[CART_SESSION_KEY] = self.items
+        self.session.modified = True
+
+    def add(self, product_id, quantity=1):
+        key = str(product_id)
+        self.items[key] = self.items.get(key, 0) + quantity
+        self._save()
+
+    def remove(self, product_id):
+        if self.items.pop(str(product_id), None) is not None:
+            self._save()
+
+    def clear(self):
+        self.items = {}
+        self._save()
+
+    def lines(self):
+        """[(produit, quantité)] en une seule requête."""
+        products = Product.objects.in_bulk([int(pk) for pk in self.items])
+        return [
+            (products[int(pk)], quantity)
+            for pk, quantity in self.items.items()
+            if int(pk) in products
+        ]
+
+    def __len__(self):
+        return sum(self.items.values())
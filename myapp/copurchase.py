@@ -0,0 +1,183 @@
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .bulk import iter_id_chunks
+from .models import Commande, CommandeLine, CoPurchase, CoPurchaseRun
+
+
+# ================= ACHATS CONJOINTS =================
+# Table CoPurchase : pour chaque paire de produits, le nombre de
+# commandes qui les ont réunis. Une commande compte avec les commandes
+# précédentes du même client (même email) passées à moins de WINDOW
+# d'elle : deux achats séparés de quelques jours forment un panier.
+# Les commandes annulées avant leur passe ne comptent pas.
+#
+# Chaque commande est comptée une seule fois, quand une passe la traite.
+# Une passe (commande update_copurchases, lancée chaque nuit) reprend
+# après la dernière commande traitée (CoPurchaseRun.last_order_id) et
+# avance par lots, chaque lot validé avec sa reprise : une passe
+# interrompue reprend où elle s'était arrêtée.
+#
+# Une seule passe à la fois : deux passes partiraient de la même reprise
+# et compteraient deux fois les mêmes commandes. Une passe se déclare en
+# verrouillant la dernière passe enregistrée (select_for_update ; sous
+# SQLite, la transaction IMMEDIATE prend le verrou d'écriture) et
+# renonce si une autre n'est pas terminée. Une passe sans nouvelle
+# depuis STALE est considérée comme arrêtée.
+
+logger = logging.getLogger(__name__)
+
+WINDOW = timedelta(days=getattr(settings, "COPURCHASE_WINDOW_DAYS", 7))
+# Commandes trop récentes laissées à la passe suivante : une transaction
+# plus lente pourrait encore valider une commande d'identifiant inférieur
+SETTLE = timedelta(minutes=5)
+CHUNK_SIZE = 2000
+SHOWN = 4
+MIN_COUNT = getattr(settings, "COPURCHASE_MIN_COUNT", 2)
+STALE = timedelta(minutes=30)
+
+
+def watermark():
+    """Identifiant de la dernière commande déjà comptée."""
+    return CoPurchaseRun.objects.aggregate(last=Max("last_order_id"))["last"] or 0
+
+
+def _baskets(order_ids):
+    baskets = defaultdict(set)
+    lines = CommandeLine.objects.filter(commande_id__in=order_ids, product__isnull=False)
+    for order_id, product_id in lines.values_list("commande_id", "product_id"):
+        baskets[order_id].add(product_id)
+    return baskets
+
+
+def count_pairs(order_ids, window=WINDOW):
+    """
+    Paires (a, b) des commandes `order_ids`, dans les deux sens, avec
+    leur nombre d'occurrences : produits d'une même commande, et produits
+    de la commande avec ceux des commandes antérieures du client dans la
+    fenêtre.
+    """
+    orders = list(
+        Commande.objects.filter(pk__in=order_ids, cancelled_at__isnull=True)
+        .values_list("pk", "customer_email", "created_at")
+    )
+    if not orders:
+        return Counter()
+    dates = [created_at for _, _, created_at in orders]
+    history = defaultdict(list)
+    for pk, email, created_at in Commande.objects.filter(
+        customer_email__in={email for _, email, _ in orders},
+        created_at__range=(min(dates) - window, max(dates) + window),
+        pk__lte=max(order_ids),
+        cancelled_at__isnull=True,
+    ).values_list("pk", "customer_email", "created_at"):
+        history[email].append((pk, created_at))
+    baskets = _baskets([pk for visits in history.values() for pk, _ in visits])
+
+    counts = Counter()
+    for pk, email, created_at in orders:
+        mine = baskets.get(pk)
+        if not mine:
+            continue
+        together = set(mine)
+        for other_pk, other_date in history[email]:
+            if other_pk < pk and abs(created_at - other_date) <= window:
+                together |= baskets.get(other_pk, set())
+        # Ensemble : une paire ne compte qu'une fois par commande
+        counts.update({
+            pair
+            for a in mine
+            for b in together
+            if a != b
+            for pair in ((a, b), (b, a))
+        })
+    return counts
+
+
+def _apply(counts):
+    """Ajoute `counts` à la table : UPDATE groupé des paires connues, INSERT des nouvelles."""
+    existing = {
+        (row.product_id, row.other_id): row
+        for row in CoPurchase.objects.filter(
+            product_id__in={a for a, _ in counts}, other_id__in={b for _, b in counts}
+        )
+    }
+    updated, created = [], []
+    for (a, b), count in counts.items():
+        row = existing.get((a, b))
+        if row is None:
+            created.append(CoPurchase(product_id=a, other_id=b, count=count))
+        else:
+            row.count += count
+            updated.append(row)
+    CoPurchase.objects.bulk_update(updated, ["count"], batch_size=1000)
+    CoPurchase.objects.bulk_create(created, batch_size=1000)
+
+
+def running():
+    """Passe en cours (non terminée et active depuis moins de STALE), ou None."""
+    return CoPurchaseRun.objects.filter(
+        finished_at__isnull=True, updated_at__gte=timezone.now() - STALE
+    ).first()
+
+
+def _claim():
+    with transaction.atomic():
+        # Deux passes qui démarrent ensemble se suivent ici
+        list(CoPurchaseRun.objects.select_for_update().order_by("-pk")[:1])
+        if running() is not None:
+            return None
+        return CoPurchaseRun.objects.create(last_order_id=watermark())
+
+
+def update_index(chunk_size=CHUNK_SIZE, window=WINDOW, progress=None):
+    """
+    Compte les commandes arrivées depuis la dernière passe. Retourne la
+    passe, ou None si une autre est en cours.
+    """
+    run = _claim()
+    if run is None:
+        logger.warning("Calcul des achats conjoints déjà en cours, passe annulée")
+        return None
+    orders = Commande.objects.filter(
+        pk__gt=run.last_order_id, created_at__lt=timezone.now() - SETTLE
+    )
+    total = orders.count()
+    for ids in iter_id_chunks(orders, chunk_size):
+        counts = count_pairs(ids, window)
+        with transaction.atomic():
+            _apply(counts)
+            run.last_order_id = ids[-1]
+            run.orders_processed += len(ids)
+            run.pairs_updated += len(counts)
+            run.save(update_fields=["last_order_id", "orders_processed", "pairs_updated", "updated_at"])
+        logger.info("%s/%s commande(s) traitée(s)", run.orders_processed, total)
+        if progress:
+            progress(run.orders_processed, total)
+    run.finished_at = timezone.now()
+    run.save(update_fields=["finished_at", "updated_at"])
+    return run
+
+
+def reset():
+    """Oublie tous les comptes : la passe suivante repart de la première commande."""
+    with transaction.atomic():
+        CoPurchase.objects.all().delete()
+        CoPurchaseRun.objects.all().delete()
+
+
+def frequently_bought_with(product, limit=SHOWN):
+    """Produits en stock le plus souvent commandés avec `product`, en une requête."""
+    return [
+        row.other
+        for row in CoPurchase.objects
+        .filter(product=product, count__gte=MIN_COUNT, other__quantity__gt=0)
+        .select_related("other")
+        .order_by("-count", "other_id")[:limit]
+    ]
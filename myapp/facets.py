@@ -0,0 +1,173 @@
+from collections import Counter
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from . import caching
+from .models import Category, Product, Supplier
+
+
+# ================= FILTRES DU CATALOGUE =================
+# Filtres de l'accueil par catégorie, fournisseur et tranche de prix,
+# avec le nombre de produits en stock de chaque choix.
+#
+# Les comptes viennent d'un cube mis en cache (espace "catalogue",
+# invalidé par les signaux Product, catégories et fournisseurs) : nombre
+# de produits par (catégorie, fournisseur, tranche), calculé par GROUP
+# BY. Toute combinaison de filtres se compte ensuite en mémoire : le
+# compte d'un choix tient compte des filtres des AUTRES dimensions,
+# comme sur les sites marchands. La recherche texte n'entre pas dans
+# les comptes.
+
+# (borne basse incluse, borne haute exclue), en FCFA
+PRICE_BUCKETS = (
+    (None, 10000),
+    (10000, 50000),
+    (50000, 100000),
+    (100000, 500000),
+    (500000, None),
+)
+PARAMS = ("category", "supplier", "price")
+TITLES = {"category": "Catégories", "supplier": "Fournisseurs", "price": "Prix"}
+
+
+def bucket_label(index):
+    low, high = PRICE_BUCKETS[index]
+    if low is None:
+        return f"Moins de {high:,} FCFA".replace(",", " ")
+    if high is None:
+        return f"{low:,} FCFA et plus".replace(",", " ")
+    return f"{low:,} à {high:,} FCFA".replace(",", " ")
+
+
+def _bucket_expression():
+    whens = []
+    for index, (_, high) in enumerate(PRICE_BUCKETS[:-1]):
+        whens.append(When(price__lt=Decimal(high), then=Value(index)))
+    return Case(*whens, default=Value(len(PRICE_BUCKETS) - 1), output_field=IntegerField())
+
+
+def _parse_id(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def parse_filters(params):
+    """Filtres valides de la query string : {"category": id, ...}, les autres ignorés."""
+    price = params.get("price", "")
+    filters = {
+        "category": _parse_id(params.get("category")),
+        "supplier": _parse_id(params.get("supplier")),
+        "price": int(price) if price.isdigit() and int(price) < len(PRICE_BUCKETS) else None,
+    }
+    return {name: value for name, value in filters.items() if value is not None}
+
+
+def apply_filters(queryset, filters):
+    if "category" in filters:
+        queryset = queryset.filter(categories=filters["category"])
+    if "supplier" in filters:
+        queryset = queryset.filter(supplier_id=filters["supplier"])
+    if "price" in filters:
+        low, high = PRICE_BUCKETS[filters["price"]]
+        if low is not None:
+            queryset = queryset.filter(price__gte=low)
+        if high is not None:
+            queryset = queryset.filter(price__lt=high)
+    return queryset
+
+
+# ----------------- Cube des comptes -----------------
+def _compute():
+    in_stock = Product.objects.filter(quantity__gt=0).annotate(bucket=_bucket_expression())
+    # Un produit compte une fois par catégorie...
+    by_category = Counter({
+        (row["categories"], row["supplier"], row["bucket"]): row["count"]
+        for row in in_stock.values("categories", "supplier", "bucket").annotate(count=Count("id"))
+        if row["categories"] is not None
+    })
+    # ...et une seule fois sans filtre de catégorie
+    by_product = Counter({
+        (row["supplier"], row["bucket"]): row["count"]
+        for row in in_stock.values("supplier", "bucket").annotate(count=Count("id"))
+    })
+    return {
+        "categories": list(Category.objects.order_by("name").values_list("pk", "name")),
+        "suppliers": list(Supplier.objects.order_by("name").values_list("pk", "name")),
+        "by_category": by_category,
+        "by_product": by_product,
+    }
+
+
+def facet_data():
+    """Cube des comptes, recalculé après tout changement du catalogue."""
+    return caching.get_or_set("facets", caching.CATALOGUE, _compute)
+
+
+def _counts(data, filters, dimension):
+    """Comptes par valeur de `dimension`, avec les filtres des autres dimensions."""
+    category = filters.get("category") if dimension != "category" else None
+    supplier = filters.get("supplier") if dimension != "supplier" else None
+    price = filters.get("price") if dimension != "price" else None
+
+    counts = Counter()
+    if dimension == "category" or category is not None:
+        for (cat, sup, bucket), count in data["by_category"].items():
+            if (category is None or cat == category) and (supplier is None or sup == supplier) \
+                    and (price is None or bucket == price):
+                counts[{"category": cat, "supplier": sup, "price": bucket}[dimension]] += count
+    else:
+        for (sup, bucket), count in data["by_product"].items():
+            if (supplier is None or sup == supplier) and (price is None or bucket == price):
+                counts[sup if dimension == "supplier" else bucket] += count
+    return counts
+
+
+def _url(params, **changes):
+    params = {**params, **changes}
+    query = urlencode({name: params[name] for name in ("q", *PARAMS) if params.get(name) is not None})
+    return f"?{query}" if query else "?"
+
+
+def build_facets(filters, query=None):
+    """
+    Dimensions pour le gabarit, chacune avec ses choix : libellé, compte,
+    sélection et lien qui active (ou retire) le choix en gardant les
+    autres filtres. Les choix sans produit sont masqués, sauf s'ils sont
+    sélectionnés.
+    """
+    data = facet_data()
+    base = {**filters, "q": query} if query else dict(filters)
+    choices = {
+        "category": data["categories"],
+        "supplier": data["suppliers"],
+        "price": [(index, bucket_label(index)) for index in range(len(PRICE_BUCKETS))],
+    }
+    facets = []
+    for dimension, options in choices.items():
+        counts = _counts(data, filters, dimension)
+        selected = filters.get(dimension)
+        facets.append({
+            "name": dimension,
+            "title": TITLES[dimension],
+            "options": [
+                {
+                    "label": label,
+                    "count": counts[value],
+                    "selected": value == selected,
+                    "url": _url(base, **{dimension: None if value == selected else value}),
+                }
+                for value, label in options
+                if counts[value] or value == selected
+            ],
+        })
+    return facets
+
+
+def filters_query(filters):
+    """Query string des filtres actifs (pour la page suivante du défilement)."""
+    return urlencode({name: filters[name] for name in PARAMS if name in filters})
@@ -5,12 +5,11 @@ class CommandeForm(forms.ModelForm):
     class Meta:
         model = Commande
         fields = [
-            'quantity', 'payment', 'customer_name', 
+            'payment', 'customer_name', 
             'customer_email', 'customer_phone', 'customer_address',
         ]
         
         labels = {
-            'quantity': 'Quantité',
             'payment': 'Mode de paiement',
             'customer_name': 'Nom complet',
             'customer_email': 'Email',
@@ -19,10 +18,6 @@ class CommandeForm(forms.ModelForm):
         }
         
         widgets = {
-            'quantity': forms.NumberInput(attrs={
-                'class': 'form-control', 
-                'placeholder': 'Quantité'
-            }),
             'payment': forms.Select(attrs={
                 'class': 'form- '
             }),
@@ -43,6 +38,60 @@ class CommandeForm(forms.ModelForm):
                 'placeholder': 'Adresse'
             }),
         }
+
+
+class CommandeLineInlineFormSet(forms.BaseInlineFormSet):
+    def clean(self):
+        super().clean()
+        if not self.instance._state.adding:
+            return
+        # Contrôle indicatif : la réservation atomique reste faite à l'enregistrement
+        wanted = {}
+        for form in self.forms:
+            data = getattr(form, 'cleaned_data', None)
+            if not data or data.get('DELETE') or not data.get('product'):
+                continue
+            product = data['product']
+            wanted[product] = wanted.get(product, 0) + (data.get('quantity') or 0)
+        if not wanted:
+            raise forms.ValidationError("Ajoutez au moins un produit à la commande.")
+        for product, quantity in wanted.items():
+            if product.quantity < quantity:
+                raise forms.ValidationError(
+                    f"Stock insuffisant pour {product} : {product.quantity} disponible(s)."
+                )
+
+
+class PriceAdjustmentForm(forms.Form):
+    mode = forms.ChoiceField(
+        label="Type d'ajustement",
+        choices=[
+            ('percent', 'Pourcentage (%)'),
+            ('fixed', 'Montant fixe'),
+        ],
+    )
+    value = forms.DecimalField(
+        label='Valeur',
+        max_digits=10, decimal_places=2,
+        help_text='Négatif pour une baisse : -10 = remise de 10 % ou de 10 FCFA.',
+    )
+
+
+class ProductImportForm(forms.Form):
+    file = forms.FileField(
+        label='Fichier',
+        help_text='CSV (séparateur , ou ;) ou XLSX. Colonnes : reference, name, price, '
+                  'quantity, description, supplier, categories (séparées par |). '
+                  'Seule « reference » est obligatoire.',
+    )
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        if not upload.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError('Format non pris en charge : CSV ou XLSX uniquement.')
+        return upload
+
+
 PAYMENT_CHOICES = [
     ('ORANGE', 'Orange Money'),
     ('MTN', 'MTN MoMo'),
@@ -0,0 +1,209 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+
+from . import caching
+
+
+# ================= DÉRIVÉS D'IMAGES =================
+# Chaque image téléversée est déclinée en plusieurs tailles par un pool
+# de threads, hors de la requête d'admin. Les fichiers passent par l'API
+# de stockage (jamais par .path) et leurs noms sont enregistrés dans le
+# champ JSON "<champ>_variants" du modèle :
+#   {"source": "products/x.jpg", "version": 2,
+#    "thumbnail": "...", "card": "...", "hero": "...",
+#    "responsive": {"avif": [[320, "..."], [640, "..."]], "webp": [...]}}
+# Les tailles "responsive" sont bornées en largeur, dans des formats
+# modernes, pour les attributs srcset/sizes des pages.
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    "thumbnail": (150, 150),
+    "card": (400, 400),
+    "hero": (1200, 400),
+}
+
+# modèle -> (champ image, champ des dérivés, espace de cache à invalider)
+IMAGE_FIELDS = {
+    "myapp.Product": ("image", "image_variants", caching.CATALOGUE),
+    "myapp.HomeSlide": ("image", "image_variants", caching.SLIDES),
+    "myapp.Slide": ("image", "image_variants", caching.SLIDES),
+    "myapp.HomePage": ("logo", "logo_variants", caching.HOMEPAGE),
+}
+
+RESPONSIVE_WIDTHS = (320, 640, 960, 1280)
+# Format -> qualité d'encodage ; un format absent de Pillow est ignoré
+RESPONSIVE_FORMATS = {"avif": 60, "webp": 80}
+
+# Incrémenter quand les tailles ou formats changent : les images existantes
+# sont alors retraitées au prochain enregistrement ou par la commande
+# generate_image_variants
+VERSION = 2
+
+WORKERS = getattr(settings, "IMAGE_WORKERS", 2)
+QUALITY = 85
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="images")
+
+
+def render_variant(image, size):
+    """Copie de `image` réduite pour tenir dans `size`, encodée en JPEG (ou PNG si transparence)."""
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+
+    out = BytesIO()
+    if variant.mode in ("RGBA", "LA", "P"):
+        variant.save(out, "PNG", optimize=True)
+        return out.getvalue(), "png"
+    variant.convert("RGB").save(out, "JPEG", optimize=True, quality=QUALITY, progressive=True)
+    return out.getvalue(), "jpg"
+
+
+def available_formats():
+    return [fmt for fmt in RESPONSIVE_FORMATS if features.check(fmt)]
+
+
+def render_width(image, width, fmt):
+    """Copie de `image` à la largeur `width` (sans agrandir), encodée en `fmt`."""
+    variant = image.copy()
+    if variant.width > width:
+        variant = variant.resize((width, round(variant.height * width / variant.width)), Image.LANCZOS)
+    if variant.mode not in ("RGB", "RGBA"):
+        variant = variant.convert("RGBA" if "transparency" in variant.info else "RGB")
+
+    out = BytesIO()
+    variant.save(out, fmt.upper(), quality=RESPONSIVE_FORMATS[fmt])
+    return out.getvalue()
+
+
+def responsive_widths(source_width):
+    # Pas d'agrandissement : on s'arrête à la largeur de l'original
+    largest = min(source_width, RESPONSIVE_WIDTHS[-1])
+    return [w for w in RESPONSIVE_WIDTHS if w < largest] + [largest]
+
+
+def is_current(variants, source_name):
+    variants = variants or {}
+    return variants.get("source") == source_name and variants.get("version") == VERSION
+
+
+def build_variants(field_file):
+    """Génère et stocke tous les dérivés de `field_file`. Retourne le dict à enregistrer."""
+    storage = field_file.storage
+    with field_file.open("rb") as source:
+        image = Image.open(source)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+
+    directory, filename = os.path.split(field_file.name)
+    stem = os.path.splitext(filename)[0]
+
+    variants = {"source": field_file.name, "version": VERSION}
+    for name, size in VARIANTS.items():
+        content, extension = render_variant(image, size)
+        path = os.path.join("variants", directory, f"{stem}_{name}.{extension}")
+        variants[name] = storage.save(path, ContentFile(content))
+
+    variants["responsive"] = {}
+    for fmt in available_formats():
+        variants["responsive"][fmt] = [
+            [width, storage.save(
+                os.path.join("variants", directory, f"{stem}_{width}w.{fmt}"),
+                ContentFile(render_width(image, width, fmt)),
+            )]
+            for width in responsive_widths(image.width)
+        ]
+    return variants
+
+
+def variant_paths(variants):
+    """Noms de tous les fichiers dérivés enregistrés dans `variants`."""
+    for name, value in (variants or {}).items():
+        if name in VARIANTS:
+            yield value
+        elif name == "responsive":
+            for files in value.values():
+                yield from (path for _, path in files)
+
+
+def delete_variants(storage, variants):
+    for path in variant_paths(variants):
+        if path:
+            try:
+                storage.delete(path)
+            except Exception:
+                logger.warning("Dérivé %s introuvable, ignoré", path)
+
+
+def process_image(model_label, pk, source_name):
+    """
+    Tâche du pool : génère les dérivés puis les enregistre, seulement si
+    l'image n'a pas été remplacée entre-temps.
+    """
+    Model = apps.get_model(model_label)
+    field_name, variants_name, namespace = IMAGE_FIELDS[model_label]
+
+    instance = Model.objects.filter(pk=pk).first()
+    if instance is None:
+        return None
+    field_file = getattr(instance, field_name)
+    if field_file.name != source_name:
+        return None
+
+    variants = build_variants(field_file)
+    updated = Model.objects.filter(pk=pk, **{field_name: source_name}).update(
+        **{variants_name: variants}
+    )
+    if updated:
+        # L'image remplacée a déjà perdu sa référence au save()
+        delete_variants(field_file.storage, getattr(instance, variants_name) or {})
+        caching.bump_version(namespace)
+    else:
+        delete_variants(field_file.storage, variants)
+    return variants
+
+
+def _run(model_label, pk, source_name):
+    try:
+        return process_image(model_label, pk, source_name)
+    except Exception:
+        logger.exception("Échec des dérivés pour %s #%s", model_label, pk)
+    finally:
+        # Connexions propres au thread du pool : ne pas les laisser ouvertes
+        connections.close_all()
+
+
+def schedule_variants(instance):
+    """
+    Après un enregistrement : planifie les dérivés si l'image a changé,
+    ou les efface si l'image a été retirée. L'image remplacée ou retirée
+    perd sa référence ici, que ses dérivés aient été générés ou non.
+    """
+    model_label = instance._meta.label
+    field_name, variants_name, _ = IMAGE_FIELDS[model_label]
+    field_file = getattr(instance, field_name)
+    variants = getattr(instance, variants_name) or {}
+
+    previous = getattr(instance, "_loaded_image", None)
+    if previous and previous != field_file.name:
+        field_file.storage.delete(previous)
+    instance._loaded_image = field_file.name
+
+    if not field_file:
+        if variants:
+            type(instance).objects.filter(pk=instance.pk).update(**{variants_name: {}})
+            delete_variants(field_file.storage, variants)
+        return
+    if is_current(variants, field_file.name):
+        return
+
+    pk, source_name = instance.pk, field_file.name
+    transaction.on_commit(lambda: _executor.submit(_run, model_label, pk, source_name))
@@ -0,0 +1,268 @@
+import glob
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import prefetch_related_objects
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+
+# ================= FACTURES PDF =================
+# Une commande enregistrée ne change plus : son PDF est rendu une seule
+# fois, par un pool de threads, dans un fichier dont le nom dépend de
+# l'id et de la date de modification de la commande. Les téléchargements
+# suivants servent ce fichier tel quel (ETag = empreinte).
+
+# Incrémenter quand la mise en page change : tous les PDF sont régénérés
+LAYOUT_VERSION = 1
+
+CACHE_DIR = getattr(settings, "INVOICE_CACHE_DIR", os.path.join(settings.BASE_DIR, "var", "invoices"))
+WORKERS = getattr(settings, "INVOICE_WORKERS", 2)
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="invoice")
+_pending = {}
+_pending_lock = threading.RLock()
+
+
+# ----------------- Rendu -----------------
+@lru_cache(maxsize=4)
+def _load_logo(path, mtime):
+    return ImageReader(path)
+
+
+def get_logo():
+    """Logo lu et décodé une seule fois (tant que le fichier ne change pas)."""
+    path = os.path.join(settings.MEDIA_ROOT, "logo.png")
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    return _load_logo(path, mtime)
+
+
+def draw_invoice(p, commande, logo=None):
+    """Dessine la confirmation de `commande` sur le canvas `p` (une ou plusieurs pages)."""
+    width, height = letter
+
+    if logo is not None:
+        p.drawImage(logo, 50, height - 47, width=80, height=25)
+
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(180, height - 50, f"Confirmation de Commande - #{commande.id}")
+
+    p.line(50, height - 60, 550, height - 60)
+
+    y = height - 100
+    details = [
+        ("Client", commande.customer_name),
+        ("Adresse", commande.customer_address),
+        ("Paiement", commande.payment),
+        ("Date", commande.created_at.strftime("%d/%m/%Y %H:%M")),
+        ("Total", f"{commande.total_amount} €"),
+    ]
+
+    for label, value in details:
+        p.setFont("Helvetica-Bold", 12)
+        p.drawString(100, y, f"{label} :")
+        p.setFont("Helvetica", 12)
+        p.drawString(250, y, value)
+        y -= 25
+
+    # Lignes de la commande
+    y -= 10
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(100, y, "Produit")
+    p.drawString(350, y, "Qté")
+    p.drawString(420, y, "Montant")
+    p.setFont("Helvetica", 12)
+    for line in commande.lines.all():
+        y -= 20
+        if y < 80:
+            p.showPage()
+            p.setFont("Helvetica", 12)
+            y = height - 60
+        p.drawString(100, y, line.product_name[:40])
+        p.drawString(350, y, str(line.quantity))
+        p.drawString(420, y, f"{line.line_total} €")
+
+    p.drawString(100, y - 30, "Merci pour votre confiance 🚀")
+    p.showPage()
+
+
+def render_invoice(commande, out, logo=None):
+    p = canvas.Canvas(out, pagesize=letter)
+    draw_invoice(p, commande, logo if logo is not None else get_logo())
+    p.save()
+
+
+# ----------------- Cache disque -----------------
+def invoice_etag(commande):
+    raw = f"{commande.pk}:{commande.updated_at.isoformat()}:{LAYOUT_VERSION}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def invoice_path(commande):
+    return os.path.join(CACHE_DIR, f"commande_{commande.pk}_{invoice_etag(commande)}.pdf")
+
+
+def _write_invoice(commande, path):
+    try:
+        if "lines" not in getattr(commande, "_prefetched_objects_cache", {}):
+            prefetch_related_objects([commande], "lines")
+        return _write_file(commande, path)
+    finally:
+        # Connexions propres au thread du pool : ne pas les laisser ouvertes
+        connections.close_all()
+
+
+def _write_file(commande, path):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Écriture dans un fichier temporaire puis renommage atomique :
+    # un lecteur ne voit jamais un PDF à moitié écrit
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            render_invoice(commande, out)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    # Les versions précédentes de la même commande sont obsolètes
+    for old in glob.glob(os.path.join(CACHE_DIR, f"commande_{commande.pk}_*.pdf")):
+        if old != path:
+            try:
+                os.unlink(old)
+            except OSError:
+                pass
+    return path
+
+
+def _done(path):
+    with _pending_lock:
+        _pending.pop(path, None)
+
+
+def schedule_invoice(commande):
+    """
+    Lance le rendu de la facture en arrière-plan s'il n'est ni fait ni en cours.
+    Si les lignes de `commande` sont déjà chargées (prefetch), le thread
+    de rendu ne fait aucune requête.
+    Retourne un Future dont le résultat est le chemin du PDF, ou None si
+    le fichier existe déjà.
+    """
+    path = invoice_path(commande)
+    if os.path.exists(path):
+        return None
+
+    with _pending_lock:
+        future = _pending.get(path)
+        if future is None:
+            future = _executor.submit(_write_invoice, commande, path)
+            _pending[path] = future
+            future.add_done_callback(lambda f: _done(path))
+    return future
+
+
+# ----------------- Export groupé -----------------
+EXPORT_CHUNK_SIZE = 200
+# Le PDF unique reste entier en mémoire (ReportLab) jusqu'à la fin du
+# rendu : au-delà, l'export se fait en ZIP, écrit au fil de l'eau
+PDF_EXPORT_LIMIT = getattr(settings, "INVOICE_PDF_EXPORT_LIMIT", 100)
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Tampon en écriture seule vidé à chaque morceau envoyé au client."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _iter_commandes(queryset):
+    return (
+        queryset.order_by("id")
+        .prefetch_related("lines")
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def _invoice_bytes(commande, logo):
+    # Facture déjà rendue (cache disque) : relue telle quelle
+    path = invoice_path(commande)
+    try:
+        with open(path, "rb") as cached:
+            return cached.read()
+    except OSError:
+        out = io.BytesIO()
+        render_invoice(commande, out, logo)
+        return out.getvalue()
+
+
+def iter_invoices_zip(queryset):
+    """
+    Archive ZIP (un PDF par commande) produite au fil de l'eau : une seule
+    facture en mémoire à la fois.
+    """
+    logo = get_logo()
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for commande in _iter_commandes(queryset):
+            archive.writestr(f"commande_{commande.pk}.pdf", _invoice_bytes(commande, logo))
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+class TooManyInvoices(ValueError):
+    def __init__(self, count):
+        self.count = count
+        super().__init__(
+            f"{count} commandes : le PDF unique est limité à {PDF_EXPORT_LIMIT}, exporter en ZIP"
+        )
+
+
+def iter_invoices_pdf(queryset):
+    """
+    Un seul PDF, une commande par page (ou plus si elle a beaucoup de lignes).
+    ReportLab garde toutes les pages jusqu'à la fin : au-delà de
+    PDF_EXPORT_LIMIT commandes, lève TooManyInvoices tout de suite (avant
+    le premier morceau). Le document est rendu dans un fichier temporaire
+    puis envoyé par morceaux.
+    """
+    count = queryset.count()
+    if count > PDF_EXPORT_LIMIT:
+        raise TooManyInvoices(count)
+    return _render_pdf(queryset)
+
+
+def _render_pdf(queryset):
+    logo = get_logo()
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as out:
+        p = canvas.Canvas(out, pagesize=letter)
+        for commande in _iter_commandes(queryset):
+            draw_invoice(p, commande, logo)
+        p.save()
+
+        out.seek(0)
+        while chunk := out.read(64 * 1024):
+            yield chunk
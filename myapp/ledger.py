@@ -0,0 +1,195 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Sum
+from django.utils import timezone
+
+from .models import Product, StockEvent, StockSnapshot
+
+
+# ================= HISTORIQUE DU STOCK =================
+# Le journal StockEvent garde chaque variation ; StockSnapshot en fige
+# le cumul par produit à intervalles réguliers (commande snapshot_stock,
+# lancée chaque nuit). Le stock d'un produit à une date est son dernier
+# instantané avant cette date, plus les mouvements écrits depuis : au
+# plus une période de journal à relire, jamais tout l'historique.
+#
+# Une passe ne fige que les produits qui ont bougé depuis la précédente.
+# Un produit sans instantané récent n'a donc aucun mouvement entre son
+# dernier instantané et la dernière passe : pour tout le catalogue, il
+# suffit de relire le journal après la dernière passe.
+#
+# La première passe prend le stock actuel des produits comme point de
+# départ. Avant elle, le stock se déduit à rebours du premier instantané.
+#
+# Un produit supprimé garde ses mouvements et instantanés sous son
+# identifiant : sa suppression journalise la sortie du stock restant
+# (StockEvent.DELETION), son historique se lit comme celui d'un autre
+# produit et se termine à zéro. Seuls les mouvements d'avant ce
+# journal par identifiant (sans produit) sont ignorés.
+
+# Mouvements trop récents laissés à la passe suivante : une transaction
+# plus lente pourrait encore valider un mouvement d'identifiant inférieur
+SETTLE = timedelta(minutes=1)
+BATCH_SIZE = 1000
+
+
+def _chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _last_event_before(moment, after=0):
+    return (
+        StockEvent.objects.filter(pk__gt=after, created_at__lt=moment)
+        .order_by("-pk").values_list("pk", flat=True).first()
+    )
+
+
+def _anchor(taken_at):
+    """Première passe : le stock actuel de chaque produit, journal compris jusque-là."""
+    with transaction.atomic():
+        until = StockEvent.objects.aggregate(last=Max("pk"))["last"] or 0
+        rows = [
+            StockSnapshot(product_id=pk, taken_at=taken_at, last_event_id=until, quantity=quantity)
+            for pk, quantity in Product.objects.values_list("pk", "quantity").iterator(chunk_size=BATCH_SIZE)
+        ]
+        StockSnapshot.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def take_snapshots(progress=None):
+    """Fige le stock des produits qui ont bougé depuis la passe précédente. Retourne leur nombre."""
+    now = timezone.now()
+    after = StockSnapshot.objects.aggregate(last=Max("last_event_id"))["last"]
+    if after is None:
+        return _anchor(now)
+
+    taken_at = now - SETTLE
+    until = _last_event_before(taken_at, after)
+    if until is None:
+        return 0
+    deltas = {
+        row["product_id"]: row["total"]
+        for row in StockEvent.objects.filter(pk__gt=after, pk__lte=until, product__isnull=False)
+        .values("product_id").annotate(total=Sum("delta"))
+    }
+
+    done = 0
+    for product_ids in _chunks(sorted(deltas)):
+        with transaction.atomic():
+            StockSnapshot.objects.bulk_create([
+                StockSnapshot(
+                    product_id=pk, taken_at=taken_at, last_event_id=until,
+                    quantity=(previous or 0) + deltas[pk],
+                )
+                for pk, previous in _latest(product_ids).items()
+            ])
+        done += len(product_ids)
+        if progress:
+            progress(done, len(deltas))
+    return done
+
+
+def _latest_snapshots(moment=None):
+    """Dernier instantané de chaque produit (avant `moment`), produits supprimés compris."""
+    snapshots = StockSnapshot.objects.filter(product__isnull=False)
+    if moment is not None:
+        snapshots = snapshots.filter(taken_at__lte=moment)
+    newer = snapshots.filter(product=OuterRef("product"), taken_at__gt=OuterRef("taken_at"))
+    return snapshots.filter(~Exists(newer))
+
+
+def _latest(product_ids):
+    """{product_id: quantité du dernier instantané, ou None}, en une requête."""
+    previous = dict(
+        _latest_snapshots().filter(product__in=product_ids).values_list("product_id", "quantity")
+    )
+    return {pk: previous.get(pk) for pk in product_ids}
+
+
+# ----------------- Lecture -----------------
+def stock_at(product, moment):
+    """
+    Stock de `product` juste avant `moment` : instantané le plus proche
+    et mouvements écrits depuis.
+    """
+    before = (
+        StockSnapshot.objects.filter(product=product, taken_at__lte=moment)
+        .order_by("-taken_at").first()
+    )
+    if before is not None:
+        moved = (
+            StockEvent.objects.filter(product=product, pk__gt=before.last_event_id, created_at__lt=moment)
+            .aggregate(total=Sum("delta"))["total"]
+        )
+        return before.quantity + (moved or 0)
+
+    after = StockSnapshot.objects.filter(product=product).order_by("taken_at").first()
+    if after is None:
+        # Jamais figé : tout son journal (produit créé depuis la dernière passe)
+        moved = StockEvent.objects.filter(product=product, created_at__lt=moment).aggregate(total=Sum("delta"))
+        return moved["total"] or 0
+    # Avant le premier instantané : à rebours
+    undone = (
+        StockEvent.objects.filter(product=product, pk__lte=after.last_event_id, created_at__gte=moment)
+        .aggregate(total=Sum("delta"))["total"]
+    )
+    return after.quantity - (undone or 0)
+
+
+def stock_levels(moment):
+    """{product_id: stock} de tout le catalogue juste avant `moment` (stocks non nuls)."""
+    last_run = StockSnapshot.objects.filter(taken_at__lte=moment).aggregate(last=Max("last_event_id"))["last"]
+    levels = Counter()
+
+    if last_run is None:
+        # Avant la première passe : à rebours depuis elle
+        first = StockSnapshot.objects.order_by("taken_at").first()
+        if first is None:
+            after = 0
+        else:
+            levels.update(dict(
+                StockSnapshot.objects.filter(taken_at=first.taken_at, product__isnull=False)
+                .values_list("product_id", "quantity")
+            ))
+            for row in (
+                StockEvent.objects.filter(pk__lte=first.last_event_id, created_at__gte=moment, product__isnull=False)
+                .values("product_id").annotate(total=Sum("delta"))
+            ):
+                levels[row["product_id"]] -= row["total"]
+            after = first.last_event_id
+    else:
+        for pk, quantity in (
+            _latest_snapshots(moment).values_list("product_id", "quantity")
+            .iterator(chunk_size=BATCH_SIZE)
+        ):
+            levels[pk] = quantity
+        after = last_run
+
+    for row in (
+        StockEvent.objects.filter(pk__gt=after, created_at__lt=moment, product__isnull=False)
+        .values("product_id").annotate(total=Sum("delta"))
+    ):
+        levels[row["product_id"]] += row["total"]
+    return {pk: quantity for pk, quantity in levels.items() if quantity}
+
+
+def movements(start, end):
+    """
+    {product_id: {source: total}} des mouvements de [start, end[, avec
+    le stock d'ouverture et de clôture ("opening", "closing") : ouverture
+    et mouvements donnent la clôture.
+    """
+    report = defaultdict(lambda: {"opening": 0, "closing": 0})
+    for row in (
+        StockEvent.objects.filter(created_at__gte=start, created_at__lt=end, product__isnull=False)
+        .values("product_id", "source").annotate(total=Sum("delta"))
+    ):
+        report[row["product_id"]][row["source"]] = row["total"]
+    for key, levels in (("opening", stock_levels(start)), ("closing", stock_levels(end))):
+        for pk, quantity in levels.items():
+            report[pk][key] = quantity
+    return dict(report)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from myapp import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Plans d'exécution et durées des requêtes des pages principales, "
+        "avec et sans les index de myapp."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Exécutions par requête (médiane).")
+        parser.add_argument("--plans", action="store_true", help="Affiche aussi les plans d'exécution.")
+
+    def handle(self, *args, **options):
+        results = benchmarks.compare(repeat=options["repeat"])
+
+        self.stdout.write(f"{'requête':32} {'sans index':>12} {'avec index':>12}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:32} {result['without']['ms']:>9.2f} ms {result['with']['ms']:>9.2f} ms"
+            )
+            if options["plans"]:
+                for label in ("without", "with"):
+                    self.stdout.write(f"  [{'sans' if label == 'without' else 'avec'} index]")
+                    for line in result[label]["plan"].splitlines():
+                        self.stdout.write(f"    {line}")
@@ -0,0 +1,53 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from myapp import invoices
+from myapp.models import Commande
+
+
+class Command(BaseCommand):
+    help = "Exporte les confirmations de commande dans un PDF unique ou un ZIP de PDF."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Fichier de sortie ('-' pour la sortie standard)")
+        parser.add_argument(
+            "--format", choices=["pdf", "zip"], default="zip",
+            help=f"pdf : {invoices.PDF_EXPORT_LIMIT} commandes au plus ; zip : sans limite",
+        )
+        parser.add_argument("--ids", nargs="+", type=int, help="Identifiants des commandes")
+        parser.add_argument("--since", help="Commandes créées à partir de cette date (AAAA-MM-JJ)")
+        parser.add_argument("--until", help="Commandes créées jusqu'à cette date incluse (AAAA-MM-JJ)")
+        parser.add_argument("--delivered", action="store_true", help="Commandes livrées uniquement")
+
+    def handle(self, *args, **options):
+        commandes = Commande.objects.all()
+        if options["ids"]:
+            commandes = commandes.filter(id__in=options["ids"])
+        if options["since"]:
+            commandes = commandes.filter(created_at__date__gte=parse_date(options["since"]))
+        if options["until"]:
+            commandes = commandes.filter(created_at__date__lte=parse_date(options["until"]))
+        if options["delivered"]:
+            commandes = commandes.filter(is_delivered=True)
+
+        if options["format"] == "pdf":
+            try:
+                chunks = invoices.iter_invoices_pdf(commandes)
+            except invoices.TooManyInvoices as exc:
+                raise CommandError(f"{exc} (--format zip).")
+        else:
+            chunks = invoices.iter_invoices_zip(commandes)
+
+        if options["output"] == "-":
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
+            return
+
+        with open(options["output"], "wb") as out:
+            for chunk in chunks:
+                out.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Export écrit dans {options['output']}."))
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from myapp import storage
+
+
+class Command(BaseCommand):
+    help = "Supprime les fichiers médias qui ne sont plus référencés."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace", type=int, default=60,
+            help="Âge minimal (minutes) d'un fichier orphelin avant suppression.",
+        )
+        parser.add_argument(
+            "--recount", action="store_true",
+            help="Recalcule d'abord les compteurs de références depuis la base.",
+        )
+        parser.add_argument(
+            "--untracked", action="store_true",
+            help="Supprime aussi les anciens fichiers non suivis et non référencés.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Liste sans rien supprimer.")
+
+    def handle(self, *args, **options):
+        if options["recount"]:
+            fixed = storage.recount()
+            self.stdout.write(f"{fixed} compteur(s) de références corrigé(s).")
+
+        removed = storage.collect_garbage(
+            grace=timedelta(minutes=options["grace"]),
+            untracked=options["untracked"],
+            dry_run=options["dry_run"],
+        )
+        for name in removed:
+            self.stdout.write(f"  {name}")
+        verb = "à supprimer" if options["dry_run"] else "supprimé(s)"
+        self.stdout.write(self.style.SUCCESS(f"{len(removed)} fichier(s) {verb}."))
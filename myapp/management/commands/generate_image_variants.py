@@ -0,0 +1,26 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from myapp import images
+
+
+class Command(BaseCommand):
+    help = "Génère les tailles d'image manquantes (ou toutes avec --force), sans passer par le pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Régénère aussi les dérivés à jour.")
+
+    def handle(self, *args, **options):
+        count = 0
+        for model_label, (field_name, variants_name, _) in images.IMAGE_FIELDS.items():
+            Model = apps.get_model(model_label)
+            queryset = Model.objects.exclude(**{field_name: ""}).exclude(**{f"{field_name}__isnull": True})
+            for pk, name, variants in queryset.values_list("pk", field_name, variants_name).iterator():
+                if not options["force"] and images.is_current(variants, name):
+                    continue
+                try:
+                    if images.process_image(model_label, pk, name):
+                        count += 1
+                except Exception as exc:
+                    self.stderr.write(f"{model_label} #{pk} : {exc}")
+        self.stdout.write(self.style.SUCCESS(f"{count} image(s) traitée(s)."))
@@ -0,0 +1,35 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import product_io
+
+
+class Command(BaseCommand):
+    help = "Importe un fichier de produits (CSV ou XLSX) par lots, sans passer par l'admin."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--chunk-size", type=int, default=product_io.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        def progress(result):
+            self.stdout.write(
+                f"{result['processed']} ligne(s) lue(s), {result['created']} créée(s), "
+                f"{result['updated']} mise(s) à jour, {result['error_count']} erreur(s)"
+            )
+
+        try:
+            with open(options["path"], "rb") as source:
+                result = product_io.import_products(
+                    source, os.path.basename(options["path"]),
+                    chunk_size=options["chunk_size"], progress=progress,
+                )
+        except (OSError, product_io.ImportFormatError) as exc:
+            raise CommandError(exc)
+
+        for line, message in result["errors"]:
+            self.stderr.write(f"Ligne {line} : {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['created']} produit(s) créé(s), {result['updated']} mis à jour."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myapp import stats
+
+
+class Command(BaseCommand):
+    help = "Recalcule les statistiques journalières du tableau de bord depuis les commandes."
+
+    def handle(self, *args, **options):
+        days = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{days} jour(s) de statistiques recalculé(s)."))
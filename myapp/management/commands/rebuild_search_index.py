@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from myapp import search
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte des produits."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING(
+                "Base de données sans recherche plein texte : recherche par icontains."
+            ))
+            return
+        count = search.rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{count} produit(s) indexé(s)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from myapp import recommendations
+
+
+class Command(BaseCommand):
+    help = "Recalcule les produits similaires de tout le catalogue (après migration ou import massif)."
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write(f"  {done}/{total}")
+
+        count = recommendations.rebuild(progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Produits similaires calculés pour {count} produit(s)."))
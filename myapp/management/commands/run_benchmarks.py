@@ -0,0 +1,48 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure les pages principales (p50/p95/p99, requêtes SQL) et échoue si un "
+        "résultat régresse par rapport à la référence enregistrée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--scenario", action="append", dest="scenarios", help="Limite à ce scénario.")
+        parser.add_argument("--baseline", default=settings.BENCHMARK_BASELINE)
+        parser.add_argument("--tolerance", type=float, default=0.25, help="Marge sur le p95 (0.25 = 25 %%).")
+        parser.add_argument(
+            "--update-baseline", action="store_true",
+            help="Enregistre ces résultats comme nouvelle référence.",
+        )
+
+    def handle(self, *args, **options):
+        results = benchmarks.run_suite(options["iterations"], options["scenarios"])
+
+        self.stdout.write(f"{'scénario':16} {'p50':>9} {'p95':>9} {'p99':>9} {'SQL':>5}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:16} {result['p50']:>6.1f} ms {result['p95']:>6.1f} ms "
+                f"{result['p99']:>6.1f} ms {result['queries']:>5}"
+            )
+
+        path = options["baseline"]
+        if options["update_baseline"]:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            benchmarks.save_baseline(path, results)
+            self.stdout.write(self.style.SUCCESS(f"Référence enregistrée : {path}"))
+            return
+        if not os.path.exists(path):
+            self.stdout.write(self.style.WARNING(f"Pas de référence ({path}) : --update-baseline pour la créer."))
+            return
+
+        problems = benchmarks.regressions(results, benchmarks.load_baseline(path), options["tolerance"])
+        if problems:
+            raise CommandError("Régressions :\n" + "\n".join(f"  {p}" for p in problems))
+        self.stdout.write(self.style.SUCCESS("Aucune régression par rapport à la référence."))
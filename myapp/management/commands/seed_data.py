@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from myapp import seeding
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un catalogue et des commandes synthétiques (même graine = mêmes données). "
+        "--clear retire d'abord les données déjà générées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--suppliers", type=int, default=50)
+        parser.add_argument("--products", type=int, default=5000)
+        parser.add_argument("--orders", type=int, default=100000)
+        parser.add_argument("--max-lines", type=int, default=3, help="Lignes maximum par commande.")
+        parser.add_argument("--days", type=int, default=365, help="Période couverte par les dates.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=seeding.BATCH_SIZE)
+        parser.add_argument("--clear", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            orders, products = seeding.clear()
+            self.stdout.write(f"{orders} commande(s) et {products} produit(s) générés supprimés.")
+
+        def progress(label, done, total):
+            self.stdout.write(f"  {label} : {done}/{total}")
+
+        created = seeding.seed(
+            categories=options["categories"],
+            suppliers=options["suppliers"],
+            products=options["products"],
+            orders=options["orders"],
+            max_lines=options["max_lines"],
+            days=options["days"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "{categories} catégorie(s), {suppliers} fournisseur(s), {products} produit(s), "
+            "{orders} commande(s) et {order_lines} ligne(s) créés.".format(**created)
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import restock
+
+
+class Command(BaseCommand):
+    help = (
+        "Envoie à chaque fournisseur la liste de ses produits passés en stock bas "
+        "depuis la passe précédente (à planifier, par exemple chaque heure)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Affiche les emails sans les envoyer.")
+        parser.add_argument(
+            "--report", action="store_true",
+            help="Affiche tous les produits en stock bas, par fournisseur, sans rien envoyer.",
+        )
+
+    def handle(self, *args, **options):
+        if options["report"]:
+            for supplier, products in restock.restock_report():
+                self.stdout.write(f"{supplier or 'Sans fournisseur'} ({len(products)})")
+                for product in products:
+                    self.stdout.write(f"  {product.name} : {product.quantity}")
+            return
+
+        run, emails = restock.send_alerts(dry_run=options["dry_run"])
+        if run is None:
+            raise CommandError("Une autre passe est en cours.")
+        for email in emails:
+            self.stdout.write(f"{', '.join(email.to)} : {email.subject}")
+        verb = "à envoyer" if options["dry_run"] else "envoyé(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{run.products_alerted} produit(s) en stock bas, {len(emails)} email(s) {verb}."
+        ))
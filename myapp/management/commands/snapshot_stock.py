@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from myapp import ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Fige le stock des produits qui ont bougé depuis la passe précédente "
+        "(à lancer chaque nuit). La première passe fige tout le catalogue."
+    )
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write(f"  {done}/{total}")
+
+        count = ledger.take_snapshots(progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"{count} instantané(s) de stock enregistré(s)."))
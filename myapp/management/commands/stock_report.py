@@ -0,0 +1,44 @@
+import csv
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from myapp import ledger
+from myapp.models import Product, StockEvent
+
+
+def parse_day(value):
+    try:
+        day = datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Date invalide : {value!r} (AAAA-MM-JJ attendu)")
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class Command(BaseCommand):
+    help = (
+        "Mouvements de stock par produit entre deux dates (CSV) : stock d'ouverture, "
+        "total par origine, stock de clôture. Calculé depuis les instantanés."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("start", help="Premier jour (AAAA-MM-JJ).")
+        parser.add_argument("end", nargs="?", help="Dernier jour inclus (AAAA-MM-JJ), par défaut le premier.")
+
+    def handle(self, *args, **options):
+        start = parse_day(options["start"])
+        end = parse_day(options["end"] or options["start"]) + timedelta(days=1)
+        if end <= start:
+            raise CommandError("La date de fin précède la date de début.")
+
+        report = ledger.movements(start, end)
+        names = dict(Product.objects.values_list("pk", "name"))
+        sources = [code for code, _ in StockEvent.SOURCE_CHOICES]
+        writer = csv.writer(self.stdout, lineterminator="\n")
+        writer.writerow(["produit", "nom", "ouverture", *sources, "clôture"])
+        for pk in sorted(report):
+            row = report[pk]
+            writer.writerow([
+                pk, names.get(pk, ""), row["opening"], *(row.get(source, 0) for source in sources), row["closing"],
+            ])
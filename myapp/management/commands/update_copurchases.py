@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import copurchase
+
+
+class Command(BaseCommand):
+    help = (
+        "Compte les produits commandés ensemble dans les commandes arrivées depuis "
+        "la dernière passe (à planifier chaque nuit). --full recompte tout l'historique."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Repart de zéro.")
+        parser.add_argument("--chunk-size", type=int, default=copurchase.CHUNK_SIZE)
+        parser.add_argument(
+            "--window-days", type=int, default=copurchase.WINDOW.days,
+            help="Écart maximal entre deux commandes d'un client pour former un panier.",
+        )
+
+    def handle(self, *args, **options):
+        if copurchase.running() is not None:
+            raise CommandError("Une autre passe est en cours.")
+        if options["full"]:
+            copurchase.reset()
+
+        def progress(done, total):
+            self.stdout.write(f"  {done}/{total}")
+
+        run = copurchase.update_index(
+            chunk_size=options["chunk_size"],
+            window=timedelta(days=options["window_days"]),
+            progress=progress,
+        )
+        if run is None:
+            raise CommandError("Une autre passe est en cours.")
+        self.stdout.write(self.style.SUCCESS(
+            f"{run.orders_processed} commande(s) traitée(s), {run.pairs_updated} paire(s) mise(s) à jour."
+        ))
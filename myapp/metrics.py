@@ -0,0 +1,175 @@
+import math
+import threading
+import time
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates, Template
+
+
+# ================= MÉTRIQUES PAR REQUÊTE =================
+# Histogrammes en mémoire, par nom de route ("home", "admin:myapp_product_
+# changelist"...), remplis par RequestMetricsMiddleware pour une fraction
+# des requêtes (REQUEST_METRICS_SAMPLE_RATE). Chaque processus a les
+# siens : Prometheus additionne les processus qu'il interroge.
+
+# Bornes supérieures des seaux (la dernière, +Inf, est implicite)
+MS_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+METRICS = {
+    # nom -> (aide, seaux)
+    "queries": ("Requêtes SQL par requête HTTP", QUERY_BUCKETS),
+    "sql_ms": ("Temps passé en SQL (ms)", MS_BUCKETS),
+    "view_ms": ("Temps de la vue hors rendu des gabarits (ms)", MS_BUCKETS),
+    "render_ms": ("Temps de rendu des gabarits (ms)", MS_BUCKETS),
+    "total_ms": ("Durée totale de la requête (ms)", MS_BUCKETS),
+}
+PREFIX = "myshop_request_"
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = next((i for i, bound in enumerate(self.bounds) if value <= bound), len(self.bounds))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimation par interpolation linéaire dans le seau concerné."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[i - 1] if i else 0
+                if i == len(self.bounds):
+                    # Au-delà de la dernière borne : rien de mieux que celle-ci
+                    return lower
+                return lower + (self.bounds[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+_lock = threading.Lock()
+_histograms = {}  # (métrique, route) -> Histogram
+
+
+def record(route, values):
+    with _lock:
+        for name, value in values.items():
+            key = (name, route)
+            if key not in _histograms:
+                _histograms[key] = Histogram(METRICS[name][1])
+            _histograms[key].observe(value)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def summary():
+    """Route -> {requêtes, moyennes et p50/p95 estimés}, trié par temps total cumulé."""
+    with _lock:
+        routes = {}
+        for (name, route), histogram in _histograms.items():
+            routes.setdefault(route, {})[name] = {
+                "count": histogram.count,
+                "mean": histogram.sum / histogram.count,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "total": histogram.sum,
+            }
+    return sorted(routes.items(), key=lambda item: -item[1]["total_ms"]["total"])
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(value):
+    return "+Inf" if value == math.inf else str(value)
+
+
+def prometheus_text():
+    """Format d'exposition texte de Prometheus (version 0.0.4)."""
+    with _lock:
+        snapshot = {
+            key: (list(h.counts), h.count, h.sum) for key, h in _histograms.items()
+        }
+    lines = []
+    for name, (help_text, bounds) in METRICS.items():
+        metric = PREFIX + name
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for (metric_name, route), (counts, count, total) in sorted(snapshot.items()):
+            if metric_name != name:
+                continue
+            label = f'route="{_escape(route)}"'
+            cumulative = 0
+            for bound, bucket in zip((*bounds, math.inf), counts):
+                cumulative += bucket
+                lines.append(f'{metric}_bucket{{{label},le="{_format(bound)}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{label}}} {float(total)}")
+            lines.append(f"{metric}_count{{{label}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+# ----------------- Mesure d'une requête -----------------
+class RequestTimer:
+    """Compteurs d'une requête échantillonnée, alimentés pendant son traitement."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.render_ms = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # Enveloppe connection.execute_wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - start) * 1000
+            self.queries += 1
+
+
+current_timer = ContextVar("current_timer", default=None)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timer = current_timer.get()
+        if timer is None or timer.rendering:
+            # Rendu imbriqué (render_to_string dans une balise) : déjà compté
+            return super().render(context, request)
+        timer.rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timer.render_ms += (time.perf_counter() - start) * 1000
+            timer.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Moteur de gabarits Django dont le rendu est chronométré pour les
+    requêtes échantillonnées. Seul le gabarit de premier niveau passe par
+    ici ({% include %} et {% extends %} restent internes) : pas de double
+    comptage.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,57 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Mesure une requête sur REQUEST_METRICS_SAMPLE_RATE : nombre et durée
+    des requêtes SQL, temps de la vue, temps de rendu des gabarits, durée
+    totale, enregistrés par nom de route dans myapp.metrics. Les requêtes
+    non échantillonnées ne paient qu'un tirage aléatoire.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "REQUEST_METRICS_SAMPLE_RATE", 0.1)
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timer = metrics.RequestTimer()
+        token = metrics.current_timer.set(timer)
+        request._metrics_view_start = None
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                # Les TemplateResponse sont rendues avant de revenir ici
+                response = self.get_response(request)
+        finally:
+            metrics.current_timer.reset(token)
+        end = time.perf_counter()
+
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            # Fichiers statiques, 404 du résolveur : pas de route à qui imputer
+            return response
+        view_start = request._metrics_view_start or start
+        metrics.record(match.view_name, {
+            "queries": timer.queries,
+            "sql_ms": timer.sql_ms,
+            "view_ms": max(0.0, (end - view_start) * 1000 - timer.render_ms),
+            "render_ms": timer.render_ms,
+            "total_ms": (end - start) * 1000,
+        })
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, "_metrics_view_start"):
+            request._metrics_view_start = time.perf_counter()
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+from myapp import search
+
+
+def create_search_index(apps, schema_editor):
+    search.create_index(schema_editor)
+
+    # Connexion de la migration (base migrée), pas la connexion par défaut
+    Product = apps.get_model("myapp", "Product")
+    search.fill_index(Product.objects.using(schema_editor.connection.alias), schema_editor=schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0002_alter_commande_options_commande_total_amount_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.migrations.exceptions import IrreversibleError
+
+
+def move_products_to_lines(apps, schema_editor):
+    Commande = apps.get_model('myapp', 'Commande')
+    CommandeLine = apps.get_model('myapp', 'CommandeLine')
+
+    lines = []
+    for commande in Commande.objects.select_related('product').iterator():
+        if commande.quantity and commande.total_amount:
+            unit_price = commande.total_amount / commande.quantity
+        else:
+            unit_price = commande.product.price
+        lines.append(CommandeLine(
+            commande_id=commande.pk,
+            product_id=commande.product_id,
+            quantity=commande.quantity,
+            unit_price=unit_price,
+        ))
+    CommandeLine.objects.bulk_create(lines, batch_size=1000)
+
+
+def move_lines_to_products(apps, schema_editor):
+    Commande = apps.get_model('myapp', 'Commande')
+    CommandeLine = apps.get_model('myapp', 'CommandeLine')
+
+    if Commande.objects.filter(lines__isnull=True).exists():
+        raise IrreversibleError(
+            "Commandes sans ligne : impossible de revenir à un produit par commande"
+        )
+    # Retour arrière : seule la première ligne de chaque commande est conservée
+    for line in CommandeLine.objects.order_by('-id').iterator():
+        Commande.objects.filter(pk=line.commande_id).update(
+            product_id=line.product_id, quantity=line.quantity
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommandeLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('commande', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='myapp.commande')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_lines', to='myapp.product')),
+            ],
+            options={
+                'verbose_name': 'Ligne de commande',
+                'verbose_name_plural': 'Lignes de commande',
+            },
+        ),
+        # Colonnes rendues facultatives avant d'être retirées : au retour
+        # arrière, elles sont recréées vides, remplies depuis les lignes,
+        # puis redeviennent obligatoires
+        migrations.AlterField(
+            model_name='commande',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='myapp.product'),
+        ),
+        migrations.AlterField(
+            model_name='commande',
+            name='quantity',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.RunPython(move_products_to_lines, move_lines_to_products),
+        migrations.RemoveField(
+            model_name='commande',
+            name='product',
+        ),
+        migrations.RemoveField(
+            model_name='commande',
+            name='quantity',
+        ),
+    ]
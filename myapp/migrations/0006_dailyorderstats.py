@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:02
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_stats(apps, schema_editor):
+    Commande = apps.get_model('myapp', 'Commande')
+    DailyOrderStats = apps.get_model('myapp', 'DailyOrderStats')
+
+    days = (
+        Commande.objects
+        .annotate(day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()))
+        .values('day')
+        .annotate(
+            orders_total=Count('id'),
+            orders_delivered=Count('id', filter=Q(is_delivered=True)),
+        )
+        .order_by('day')
+    )
+    DailyOrderStats.objects.bulk_create([DailyOrderStats(**row) for row in days], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_commande_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrderStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('orders_total', models.PositiveIntegerField(default=0)),
+                ('orders_delivered', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Statistique journalière',
+                'verbose_name_plural': 'Statistiques journalières',
+                'ordering': ['day'],
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
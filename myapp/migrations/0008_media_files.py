@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:27
+
+import myapp.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Fichier média',
+                'verbose_name_plural': 'Fichiers médias',
+            },
+        ),
+        migrations.AlterField(
+            model_name='homepage',
+            name='logo',
+            field=models.ImageField(storage=myapp.storage.get_media_storage, upload_to='logos/'),
+        ),
+        migrations.AlterField(
+            model_name='homeslide',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=myapp.storage.get_media_storage, upload_to='slides/'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=myapp.storage.get_media_storage, upload_to='products/'),
+        ),
+        migrations.AlterField(
+            model_name='slide',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=myapp.storage.get_media_storage, upload_to='slides/'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_product_names(apps, schema_editor):
+    # Un seul UPDATE : nom actuel du produit, le seul connu pour les
+    # commandes passées avant le figement
+    CommandeLine = apps.get_model('myapp', 'CommandeLine')
+    Product = apps.get_model('myapp', 'Product')
+    CommandeLine.objects.filter(product_name='').update(
+        product_name=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('name')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commandeline',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Produit commandé'),
+        ),
+        migrations.RunPython(backfill_product_names, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='commandeline',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_lines', to='myapp.product'),
+        ),
+    ]
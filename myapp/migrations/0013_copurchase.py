@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_similar_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='copurchases', to='myapp.product')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='myapp.product')),
+            ],
+            options={
+                'verbose_name': 'Achat conjoint',
+                'verbose_name_plural': 'Achats conjoints',
+                'indexes': [models.Index(fields=['product', '-count'], name='copurchase_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'other'), name='copurchase_pair_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CoPurchaseRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_order_id', models.PositiveBigIntegerField(default=0)),
+                ('orders_processed', models.PositiveIntegerField(default=0)),
+                ('pairs_updated', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Calcul des achats conjoints',
+                'verbose_name_plural': 'Calculs des achats conjoints',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['customer_email', 'created_at'], name='commande_customer_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0013_copurchase'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.BigIntegerField()),
+                ('source', models.CharField(choices=[('order', 'Commande'), ('adjustment', 'Ajustement manuel'), ('import', 'Import')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_events', to='myapp.product')),
+            ],
+            options={
+                'verbose_name': 'Mouvement de stock',
+                'verbose_name_plural': 'Mouvements de stock',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockAlertRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_event_id', models.PositiveBigIntegerField(default=0)),
+                ('products_alerted', models.PositiveIntegerField(default=0)),
+                ('emails_sent', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Alerte de stock bas',
+                'verbose_name_plural': 'Alertes de stock bas',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('quantity__lte', 5)), fields=['supplier', 'quantity'], name='product_low_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_stock_events'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockevent',
+            name='source',
+            field=models.CharField(choices=[('order', 'Commande'), ('cancellation', 'Annulation de commande'), ('adjustment', 'Ajustement manuel'), ('import', 'Import')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='stockevent',
+            index=models.Index(fields=['product', 'id'], name='stock_event_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockevent',
+            index=models.Index(fields=['created_at'], name='stock_event_created_idx'),
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('last_event_id', models.PositiveBigIntegerField()),
+                ('quantity', models.BigIntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='myapp.product')),
+            ],
+            options={
+                'verbose_name': 'Instantané de stock',
+                'verbose_name_plural': 'Instantanés de stock',
+                'indexes': [models.Index(fields=['taken_at'], name='stock_snapshot_taken_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'taken_at'), name='stock_snapshot_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0015_stock_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='copurchaserun',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0016_copurchaserun_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockevent',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_events', to='myapp.product'),
+        ),
+        migrations.AlterField(
+            model_name='stocksnapshot',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_snapshots', to='myapp.product'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0017_stock_history_keeps_deleted_products'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockevent',
+            name='commande',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='stock_events', to='myapp.commande'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0018_stockevent_commande'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockalertrun',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0019_stockalertrun_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockevent',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='stock_events', to='myapp.product'),
+        ),
+        migrations.AlterField(
+            model_name='stockevent',
+            name='source',
+            field=models.CharField(choices=[('order', 'Commande'), ('cancellation', 'Annulation de commande'), ('adjustment', 'Ajustement manuel'), ('import', 'Import'), ('deletion', 'Suppression du produit')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='stocksnapshot',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='stock_snapshots', to='myapp.product'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0020_stock_history_keeps_product_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commande',
+            name='cancelled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
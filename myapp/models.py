@@ -1,6 +1,26 @@
-from django.db import models
+from django.db import models, transaction
 from ckeditor.fields import RichTextField
-from PIL import Image
+
+from .storage import get_media_storage
+
+
+class LoadedImageMixin:
+    """
+    Garde le nom de l'image chargée : au save(), l'image remplacée ou
+    retirée perd sa référence (voir images.schedule_variants).
+    """
+    image_field = "image"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_image = instance.__dict__.get(cls.image_field)
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        image = self.__dict__.get(self.image_field)
+        self._loaded_image = getattr(image, "name", image)
 
 
 # ================= CATEGORY =================
@@ -34,7 +54,13 @@ class Supplier(models.Model):
 
 
 # ================= PRODUCT =================
-class Product(models.Model):
+# Seuil de réapprovisionnement : voir Product.is_low_stock et restock.py
+LOW_STOCK_THRESHOLD = 5
+
+
+class Product(LoadedImageMixin, models.Model):
+    # Référence fournisseur / SKU : clé des imports de catalogue
+    reference = models.CharField("Référence", max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField(blank=True, null=True)
@@ -44,20 +70,70 @@ class Product(models.Model):
     supplier = models.ForeignKey(
         Supplier, on_delete=models.SET_NULL, null=True, blank=True, related_name="products"
     )
-    image = models.ImageField(upload_to="products/", blank=True, null=True)
+    image = models.ImageField(upload_to="products/", storage=get_media_storage, blank=True, null=True)
+    # Noms des tailles générées en arrière-plan (voir images.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Produit"
         verbose_name_plural = "Produits"
+        indexes = [
+            # Catalogue de l'accueil : produits en stock, du plus récent au
+            # plus ancien, pagination par clé (created_at, id)
+            models.Index(
+                fields=["created_at", "id"], name="product_in_stock_idx",
+                condition=models.Q(quantity__gt=0),
+            ),
+            # Liste admin triée par date d'ajout
+            models.Index(fields=["created_at"], name="product_created_idx"),
+            # Produits à réapprovisionner, par fournisseur : une petite
+            # partie du catalogue, lue sans parcourir les autres
+            models.Index(
+                fields=["supplier", "quantity"], name="product_low_stock_idx",
+                condition=models.Q(quantity__lte=LOW_STOCK_THRESHOLD),
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Fournisseur et prix chargés, pour ne recalculer les produits
+        # similaires que s'ils changent
+        instance._loaded_criteria = instance._criteria()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_criteria = self._criteria()
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if self._state.adding or (update_fields is not None and "quantity" not in update_fields):
+            return super().save(*args, **kwargs)
+        # Stock en base juste avant l'écriture, ligne verrouillée : la
+        # variation journalisée (signals.record_stock_change) est celle que
+        # l'écriture fait vraiment, même si une commande a été validée
+        # depuis le chargement du produit
+        with transaction.atomic():
+            self._stock_before = (
+                Product.objects.select_for_update().filter(pk=self.pk)
+                .values_list("quantity", flat=True).first()
+            )
+            super().save(*args, **kwargs)
+
+    def _criteria(self):
+        """Critères de similarité portés par la ligne (les catégories sont à part)."""
+        return self.__dict__.get("supplier_id"), self.__dict__.get("price")
+
     @property
     def categories_list(self):
-        cats = self.categories.all()
-        if cats.exists():
-            return ", ".join(cat.name for cat in cats)
+        # Pas de .exists() : profite d'un prefetch_related('categories')
+        names = [cat.name for cat in self.categories.all()]
+        if names:
+            return ", ".join(names)
         return "Aucune catégorie"
 
     categories_list.fget.short_description = "Catégories"
@@ -70,7 +146,161 @@ class Product(models.Model):
 
     @property
     def is_low_stock(self):
-        return self.quantity <= 5
+        return self.quantity <= LOW_STOCK_THRESHOLD
+
+
+# ================= MOUVEMENTS DE STOCK =================
+class StockEvent(models.Model):
+    """
+    Variation du stock d'un produit, écrite avec elle (voir stock.py).
+    Journal en ajout seul : une ligne n'est jamais modifiée.
+    """
+    ORDER = "order"
+    CANCELLATION = "cancellation"
+    ADJUSTMENT = "adjustment"
+    IMPORT = "import"
+    DELETION = "deletion"
+    SOURCE_CHOICES = [
+        (ORDER, "Commande"),
+        (CANCELLATION, "Annulation de commande"),
+        (ADJUSTMENT, "Ajustement manuel"),
+        (IMPORT, "Import"),
+        (DELETION, "Suppression du produit"),
+    ]
+
+    # Sans contrainte : un produit supprimé garde son historique sous son
+    # identifiant (sa suppression est journalisée, stock remis à zéro)
+    product = models.ForeignKey(
+        Product, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name="stock_events",
+    )
+    # Commande à l'origine du mouvement (commande, annulation). Sans
+    # contrainte : l'identifiant reste après la suppression de la commande
+    commande = models.ForeignKey(
+        "Commande", on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name="stock_events",
+    )
+    delta = models.BigIntegerField()
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Mouvement de stock"
+        verbose_name_plural = "Mouvements de stock"
+        ordering = ["-id"]
+        indexes = [
+            # Mouvements d'un produit après un instantané
+            models.Index(fields=["product", "id"], name="stock_event_product_idx"),
+            # Mouvements d'une période (rapports)
+            models.Index(fields=["created_at"], name="stock_event_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.delta:+d} ({self.get_source_display()})"
+
+
+class StockSnapshot(models.Model):
+    """
+    Stock d'un produit à `taken_at`, mouvements jusqu'à `last_event_id`
+    inclus (voir ledger.py).
+    """
+    # Sans contrainte, comme StockEvent.product
+    product = models.ForeignKey(
+        Product, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name="stock_snapshots",
+    )
+    taken_at = models.DateTimeField()
+    last_event_id = models.PositiveBigIntegerField()
+    quantity = models.BigIntegerField()
+
+    class Meta:
+        verbose_name = "Instantané de stock"
+        verbose_name_plural = "Instantanés de stock"
+        constraints = [
+            # Sert aussi d'index : dernier instantané d'un produit avant une date
+            models.UniqueConstraint(fields=["product", "taken_at"], name="stock_snapshot_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["taken_at"], name="stock_snapshot_taken_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} : {self.quantity} au {self.taken_at:%d/%m/%Y %H:%M}"
+
+
+class StockAlertRun(models.Model):
+    """Passe des alertes de stock bas ; le dernier mouvement traité sert de reprise."""
+    started_at = models.DateTimeField(auto_now_add=True)
+    # Une passe arrêtée net n'en bloque pas d'autre au-delà de restock.STALE
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_event_id = models.PositiveBigIntegerField(default=0)
+    products_alerted = models.PositiveIntegerField(default=0)
+    emails_sent = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Alerte de stock bas"
+        verbose_name_plural = "Alertes de stock bas"
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        return f"Alertes du {self.started_at:%d/%m/%Y %H:%M}"
+
+
+# ================= PRODUITS SIMILAIRES =================
+class SimilarProduct(models.Model):
+    """Voisin précalculé d'un produit (voir recommendations.py), par rang croissant."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="neighbours")
+    similar = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    score = models.PositiveSmallIntegerField()
+
+    class Meta:
+        verbose_name = "Produit similaire"
+        verbose_name_plural = "Produits similaires"
+        constraints = [
+            # Sert aussi d'index à la lecture de la fiche produit
+            models.UniqueConstraint(fields=["product", "rank"], name="similar_product_rank_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} → {self.similar_id} (#{self.rank})"
+
+
+# ================= IMPORT DE CATALOGUE =================
+class ProductImportJob(models.Model):
+    """Import CSV/XLSX de produits traité en arrière-plan (voir product_io.py)."""
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "En attente"),
+        (RUNNING, "En cours"),
+        (DONE, "Terminé"),
+        (FAILED, "Échoué"),
+    ]
+
+    filename = models.CharField(max_length=255)
+    path = models.CharField(max_length=500)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_created = models.PositiveIntegerField(default=0)
+    rows_updated = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    error_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Import de produits"
+        verbose_name_plural = "Imports de produits"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Import #{self.pk} - {self.filename}"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
 
 
 # ================= SUPPLIER DETAIL =================
@@ -106,9 +336,12 @@ class SupplierDetail(models.Model):
         return f"Détails de {self.supplier}"
 
 # ================= HOME PAGE =================
-class HomePage(models.Model):
+class HomePage(LoadedImageMixin, models.Model):
+    image_field = "logo"
+
     site_name = models.CharField(max_length=255)
-    logo = models.ImageField(upload_to="logos/")
+    logo = models.ImageField(upload_to="logos/", storage=get_media_storage)
+    logo_variants = models.JSONField(default=dict, blank=True, editable=False)
     welcome_titre = models.CharField(max_length=255)
     welcome_message = RichTextField(default="Bienvenue sur notre site")
 
@@ -210,9 +443,6 @@ class Commande(models.Model):
         ("WAVE", "Wave"),
     ]
 
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
-    quantity = models.PositiveIntegerField()
-
     customer_name = models.CharField(max_length=255)
     customer_email = models.EmailField()
     customer_phone = models.CharField(max_length=20)
@@ -224,35 +454,170 @@ class Commande(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     is_delivered = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Annulée (stock remis en rayon, voir orders.cancel_orders) : gardée
+    # avec ses lignes, hors des statistiques
+    cancelled_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         verbose_name = "Commande"
         verbose_name_plural = "Commandes"
         ordering = ["-created_at"]
+        indexes = [
+            # Tri par défaut (admin, tableau de bord) ; couvre aussi le
+            # recalcul des statistiques par jour (date + livrée)
+            models.Index(fields=["created_at", "is_delivered"], name="commande_created_idx"),
+            # Filtre "paiement" de l'admin, trié par date
+            models.Index(fields=["payment", "created_at"], name="commande_payment_idx"),
+            # Commandes à livrer : petite partie de la table
+            models.Index(
+                fields=["created_at"], name="commande_pending_idx",
+                condition=models.Q(is_delivered=False),
+            ),
+            # Commandes d'un même client autour d'une date (achats conjoints)
+            models.Index(fields=["customer_email", "created_at"], name="commande_customer_idx"),
+        ]
 
     def __str__(self):
         return f"Commande #{self.id} - {self.customer_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valeur chargée, pour détecter un changement de livraison au save()
+        instance._loaded_is_delivered = instance.__dict__.get("is_delivered")
+        return instance
+
     @property
     def status(self):
+        if self.cancelled_at:
+            return "Annulée"
         return "Livrée" if self.is_delivered else "En attente"
 
+    @property
+    def items_count(self):
+        return sum(line.quantity for line in self.lines.all())
+
+    @property
+    def products_summary(self):
+        return ", ".join(f"{line.product_name} × {line.quantity}" for line in self.lines.all())
+
+
+class CommandeLine(models.Model):
+    commande = models.ForeignKey(Commande, on_delete=models.CASCADE, related_name="lines")
+    # Nom et prix figés à la commande : listes, factures et rapports se
+    # lisent sans Product, et un produit supprimé ne vide pas l'historique
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name="order_lines")
+    product_name = models.CharField("Produit commandé", max_length=100, blank=True)
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        verbose_name = "Ligne de commande"
+        verbose_name_plural = "Lignes de commande"
+
+    def __str__(self):
+        return f"{self.product_name} × {self.quantity}"
+
+    def save(self, *args, **kwargs):
+        if not self.product_name and self.product_id:
+            self.product_name = self.product.name
+        super().save(*args, **kwargs)
+
+    @property
+    def line_total(self):
+        return self.quantity * self.unit_price
+
+# ================= ACHATS CONJOINTS =================
+class CoPurchase(models.Model):
+    """Nombre de fois où deux produits ont été commandés ensemble (voir copurchase.py)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="copurchases")
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Achat conjoint"
+        verbose_name_plural = "Achats conjoints"
+        constraints = [
+            models.UniqueConstraint(fields=["product", "other"], name="copurchase_pair_uniq"),
+        ]
+        indexes = [
+            # Les k plus fréquents d'un produit : lecture d'un début d'index
+            models.Index(fields=["product", "-count"], name="copurchase_top_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id} ({self.count})"
+
+
+class CoPurchaseRun(models.Model):
+    """Passe du calcul des achats conjoints ; la plus haute commande traitée sert de reprise."""
+    started_at = models.DateTimeField(auto_now_add=True)
+    # Avancée du dernier lot : une passe arrêtée net n'en bloque pas d'autre
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_order_id = models.PositiveBigIntegerField(default=0)
+    orders_processed = models.PositiveIntegerField(default=0)
+    pairs_updated = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Calcul des achats conjoints"
+        verbose_name_plural = "Calculs des achats conjoints"
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        return f"Calcul du {self.started_at:%d/%m/%Y %H:%M}"
+
+
+# ================= STATISTIQUES =================
+class DailyOrderStats(models.Model):
+    day = models.DateField(unique=True)
+    orders_total = models.PositiveIntegerField(default=0)
+    orders_delivered = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Statistique journalière"
+        verbose_name_plural = "Statistiques journalières"
+        ordering = ["day"]
+
+    def __str__(self):
+        return f"Commandes du {self.day:%d/%m/%Y}"
+
+    @property
+    def orders_pending(self):
+        return self.orders_total - self.orders_delivered
+
+
+# ================= MÉDIAS =================
+class MediaFile(models.Model):
+    """Fichier stocké sous son empreinte, avec son nombre de références (voir storage.py)."""
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Fichier média"
+        verbose_name_plural = "Fichiers médias"
+
+    def __str__(self):
+        return self.name
+
+
 # ================= SLIDES =================
-class HomeSlide(models.Model):
+class HomeSlide(LoadedImageMixin, models.Model):
     title = models.CharField(max_length=255)
     message = models.TextField()
-    image = models.ImageField(upload_to="slides/", blank=True, null=True)
+    image = models.ImageField(upload_to="slides/", storage=get_media_storage, blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     action_text = models.CharField(max_length=100, blank=True, null=True)
     action_link = models.URLField(blank=True, null=True)
 
 
-class Slide(models.Model):
+class Slide(LoadedImageMixin, models.Model):
     title = models.CharField(max_length=200)
-    image = models.ImageField(upload_to="slides/", blank=True, null=True)
-
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if self.image:
-            img = Image.open(self.image.path)
-            img.thumbnail((1200, 400))
-            img.save(self.image.path, optimize=True, quality=85)
+    image = models.ImageField(upload_to="slides/", storage=get_media_storage, blank=True, null=True)
+    # Le redimensionnement (1200x400 et autres tailles) est fait en
+    # arrière-plan à partir de l'original, voir images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
@@ -0,0 +1,92 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching, invoices, stats
+from .models import Commande, CommandeLine
+from .stock import release_many, reserve_many
+
+
+# ================= PRISE DE COMMANDE =================
+def place_order(commande, items):
+    """
+    Enregistre `commande` avec ses lignes `items` ([(produit, quantité)]) :
+    un UPDATE pour tout le stock, un INSERT pour la commande et un
+    bulk_create pour les lignes, dans une seule transaction.
+    Lève InsufficientStock sans rien écrire si un produit manque.
+    """
+    quantities = Counter()
+    products = {}
+    for product, quantity in items:
+        quantities[product.pk] += quantity
+        products[product.pk] = product
+
+    lines = [
+        CommandeLine(
+            product=products[pk], product_name=products[pk].name,
+            quantity=quantity, unit_price=products[pk].price,
+        )
+        for pk, quantity in quantities.items()
+    ]
+    commande.total_amount = sum(line.line_total for line in lines)
+
+    with transaction.atomic():
+        # Commande d'abord : les mouvements de stock la référencent
+        commande.save()
+        sold_out = reserve_many(quantities, commande)
+        for line in lines:
+            line.commande = commande
+        CommandeLine.objects.bulk_create(lines)
+        if sold_out:
+            # La vitrine n'affiche que "en stock" ou "épuisé" : ses pages en
+            # cache ne changent que si un produit vient d'être épuisé
+            transaction.on_commit(lambda: caching.bump_version(caching.CATALOGUE))
+        # Facture rendue en arrière-plan, prête avant le premier téléchargement
+        transaction.on_commit(lambda: invoices.schedule_invoice(commande))
+
+    return commande
+
+
+def reserve_admin_lines(commande, lines):
+    """
+    Commande saisie dans l'admin (déjà enregistrée) : fige le nom et le prix
+    des lignes et réserve le stock avant leur enregistrement par les inlines.
+    """
+    quantities = Counter()
+    for line in lines:
+        line.product_name = line.product.name
+        line.unit_price = line.product.price
+        quantities[line.product_id] += line.quantity
+    if reserve_many(quantities, commande):
+        transaction.on_commit(lambda: caching.bump_version(caching.CATALOGUE))
+    return sum(line.line_total for line in lines)
+
+
+def cancel_orders(queryset):
+    """
+    Annule les commandes non livrées de `queryset` : leur stock revient
+    (par commande, un UPDATE et un mouvement "annulation" par produit,
+    qui garde l'identifiant de la commande) et elles sont marquées
+    annulées, lignes comprises. Retourne le nombre de commandes annulées.
+    """
+    with transaction.atomic():
+        commandes = list(
+            queryset.filter(is_delivered=False, cancelled_at__isnull=True).select_for_update()
+        )
+        quantities = defaultdict(Counter)
+        for commande_id, product_id, quantity in CommandeLine.objects.filter(
+            commande__in=commandes, product__isnull=False
+        ).values_list("commande_id", "product_id", "quantity"):
+            quantities[commande_id][product_id] += quantity
+        for commande in commandes:
+            release_many(quantities[commande.pk], commande)
+            # Sortie des statistiques du jour, comme une commande supprimée
+            stats.record_deleted(commande)
+        now = timezone.now()
+        Commande.objects.filter(pk__in=[commande.pk for commande in commandes]).update(
+            cancelled_at=now, updated_at=now
+        )
+        transaction.on_commit(lambda: caching.bump_version(caching.CATALOGUE))
+    return len(commandes)
+
@@ -0,0 +1,72 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+# ================= PAGINATION PAR CURSEUR =================
+# Le catalogue est trié par (created_at, id) décroissants. Le curseur
+# mémorise le dernier couple affiché : la page suivante est un simple
+# "WHERE (created_at, id) < curseur", sans OFFSET, donc son coût ne
+# dépend pas de la profondeur de défilement.
+
+PAGE_SIZE = getattr(settings, "CATALOGUE_PAGE_SIZE", 24)
+DEFAULT_ORDERING = ("created_at", "id")
+
+
+def _cursor_value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(obj, fields=DEFAULT_ORDERING):
+    values = [_cursor_value(getattr(obj, field)) for field in fields]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, fields=DEFAULT_ORDERING):
+    """
+    Retourne les valeurs de tri du curseur, ou None s'il est absent ou invalide.
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, binascii.Error, UnicodeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(fields):
+        return None
+    return values
+
+
+def keyset_page(queryset, cursor=None, size=PAGE_SIZE, fields=DEFAULT_ORDERING):
+    """
+    Retourne (objets, curseur_suivant) pour la page qui suit `cursor`.
+    `fields` est le couple (clé de tri, clé unique), trié en décroissant.
+    `curseur_suivant` vaut None sur la dernière page.
+    """
+    sort_key, unique_key = fields
+    queryset = queryset.order_by(f"-{sort_key}", f"-{unique_key}")
+
+    position = decode_cursor(cursor, fields)
+    if position:
+        sort_value, unique_value = position
+        try:
+            queryset = queryset.filter(
+                Q(**{f"{sort_key}__lt": sort_value})
+                | Q(**{sort_key: sort_value, f"{unique_key}__lt": unique_value})
+            )
+        except (ValidationError, ValueError, TypeError):
+            # Curseur bien formé mais valeurs incohérentes : on repart du début
+            pass
+
+    # Une ligne de plus pour savoir s'il reste une page, sans COUNT
+    items = list(queryset[:size + 1])
+    if len(items) > size:
+        items = items[:size]
+        return items, encode_cursor(items[-1], fields)
+    return items, None
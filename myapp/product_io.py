@@ -0,0 +1,428 @@
+import csv
+import io
+import logging
+import os
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import caching, recommendations, search, stock
+from .models import Category, Product, ProductImportJob, StockEvent, Supplier
+
+
+# ================= IMPORT / EXPORT DU CATALOGUE =================
+# Le fichier (CSV ou XLSX) est lu ligne à ligne et traité par lots : un
+# seul lot en mémoire, un upsert (bulk_create + update_conflicts) par
+# lot, clé = référence du produit. Fournisseurs et catégories sont
+# retrouvés par nom dans des tables chargées une fois, les inconnus sont
+# créés en bloc. Seules les colonnes présentes dans le fichier sont mises
+# à jour : une liste de prix "reference;price" ne touche qu'au prix.
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = getattr(settings, "PRODUCT_IMPORT_CHUNK_SIZE", 1000)
+IMPORT_DIR = getattr(settings, "PRODUCT_IMPORT_DIR", os.path.join(settings.BASE_DIR, "imports"))
+EXPORT_CHUNK_SIZE = 2000
+MAX_STORED_ERRORS = 100
+CATEGORY_SEPARATOR = "|"
+
+COLUMNS = ["reference", "name", "price", "quantity", "description", "supplier", "categories"]
+# Colonnes recopiées sur Product lors d'une mise à jour
+UPDATABLE = ["name", "price", "quantity", "description", "supplier"]
+FORMATS = (".csv", ".xlsx")
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="product-import")
+
+
+class ImportFormatError(ValueError):
+    """Fichier illisible ou sans les colonnes nécessaires."""
+
+
+def xlsx_supported():
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ----------------- Lecture -----------------
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _csv_rows(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(text, dialect)
+    header = next(reader, [])
+    return header, reader
+
+
+def _xlsx_rows(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError("Le format XLSX nécessite le paquet openpyxl.")
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    rows = workbook.active.iter_rows(values_only=True)
+    header = next(rows, ())
+
+    def values():
+        try:
+            yield from rows
+        finally:
+            workbook.close()
+    return header, values()
+
+
+def open_rows(fileobj, filename):
+    """
+    Colonnes du fichier et itérateur de lignes (dict colonne -> texte),
+    lues au fil de l'eau.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".csv":
+        header, rows = _csv_rows(fileobj)
+    elif extension == ".xlsx":
+        header, rows = _xlsx_rows(fileobj)
+    else:
+        raise ImportFormatError(f"Format non pris en charge : {extension or filename}")
+
+    columns = [_cell(name).lower() for name in header]
+    if "reference" not in columns:
+        raise ImportFormatError("Colonne « reference » obligatoire.")
+    if not set(columns) & set(UPDATABLE + ["categories"]):
+        raise ImportFormatError("Aucune colonne à importer en plus de « reference ».")
+
+    known = [name for name in columns if name in COLUMNS]
+    return known, (
+        {name: _cell(value) for name, value in zip(columns, row) if name in COLUMNS}
+        for row in rows
+        if any(value not in (None, "") for value in row)
+    )
+
+
+def parse_row(row, columns):
+    """Valeurs typées d'une ligne ; ValueError avec un message lisible sinon."""
+    values = {"reference": row.get("reference", "")}
+    if not values["reference"]:
+        raise ValueError("référence manquante")
+    if len(values["reference"]) > 64:
+        raise ValueError("référence trop longue (64 caractères maximum)")
+
+    if "name" in columns:
+        values["name"] = row.get("name", "")
+        if len(values["name"]) > 100:
+            raise ValueError("nom trop long (100 caractères maximum)")
+    if "price" in columns:
+        try:
+            price = Decimal(row.get("price", "").replace(" ", "").replace(",", "."))
+        except InvalidOperation:
+            raise ValueError(f"prix invalide : {row.get('price')!r}")
+        if price < 0 or not price.is_finite():
+            raise ValueError(f"prix invalide : {row.get('price')!r}")
+        values["price"] = price.quantize(Decimal("0.01"))
+    if "quantity" in columns:
+        try:
+            values["quantity"] = int(row.get("quantity") or 0)
+        except ValueError:
+            raise ValueError(f"quantité invalide : {row.get('quantity')!r}")
+        if values["quantity"] < 0:
+            raise ValueError("quantité négative")
+    if "description" in columns:
+        values["description"] = row.get("description", "")
+    if "supplier" in columns:
+        values["supplier"] = row.get("supplier", "")
+    if "categories" in columns:
+        values["categories"] = [
+            name.strip() for name in row.get("categories", "").split(CATEGORY_SEPARATOR) if name.strip()
+        ]
+    return values
+
+
+# ----------------- Écriture -----------------
+class NameLookup:
+    """Table nom -> id d'un modèle (Supplier, Category), complétée au besoin."""
+
+    def __init__(self, model, **defaults):
+        self.model = model
+        self.defaults = defaults
+        self.ids = {}
+        for pk, name in model.objects.order_by("pk").values_list("pk", "name"):
+            self.ids.setdefault(name.casefold(), pk)
+
+    def resolve(self, names):
+        missing = {}
+        for name in names:
+            if name and name.casefold() not in self.ids:
+                missing.setdefault(name.casefold(), name[:100])
+        if missing:
+            self.model.objects.bulk_create(
+                [self.model(name=name, **self.defaults) for name in missing.values()]
+            )
+            for pk, name in self.model.objects.filter(
+                name__in=missing.values()
+            ).order_by("pk").values_list("pk", "name"):
+                self.ids.setdefault(name.casefold(), pk)
+
+    def get(self, name):
+        return self.ids.get(name.casefold()) if name else None
+
+
+def import_chunk(rows, columns, suppliers, categories):
+    """
+    Upsert d'un lot de lignes (numéro, valeurs). Retourne
+    (créés, mis à jour, erreurs).
+    """
+    # Une référence répétée dans le lot : la dernière ligne l'emporte
+    by_reference = {}
+    for line, values in rows:
+        by_reference[values["reference"]] = (line, values)
+
+    existing = set(
+        Product.objects.filter(reference__in=by_reference).values_list("reference", flat=True)
+    )
+    if "supplier" in columns:
+        suppliers.resolve(values["supplier"] for _, values in by_reference.values())
+    if "categories" in columns:
+        categories.resolve(
+            name for _, values in by_reference.values() for name in values["categories"]
+        )
+
+    errors = []
+    products = []
+    for reference, (line, values) in by_reference.items():
+        if reference not in existing:
+            if not values.get("name"):
+                errors.append((line, "nom obligatoire pour un nouveau produit"))
+                continue
+            if "price" not in values:
+                errors.append((line, "prix obligatoire pour un nouveau produit"))
+                continue
+        fields = {name: values[name] for name in UPDATABLE if name in values and name != "supplier"}
+        if "supplier" in columns:
+            fields["supplier_id"] = suppliers.get(values["supplier"])
+        products.append(Product(reference=reference, **fields))
+
+    if not products:
+        return 0, 0, errors
+
+    Through = Product.categories.through
+    update_fields = [name for name in UPDATABLE if name in columns]
+    with transaction.atomic():
+        if "quantity" in columns:
+            # Stock avant écriture, verrouillé : la variation est journalisée
+            before = dict(
+                Product.objects.select_for_update()
+                .filter(reference__in=[p.reference for p in products])
+                .values_list("reference", "quantity")
+            )
+        # Sans colonne à recopier (catégories seules), tous les produits
+        # existent déjà : rien à insérer
+        if update_fields:
+            Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=["reference"],
+                update_fields=update_fields,
+            )
+        ids = dict(
+            Product.objects.filter(reference__in=[p.reference for p in products])
+            .values_list("reference", "pk")
+        )
+        if "categories" in columns:
+            Through.objects.filter(product_id__in=ids.values()).delete()
+            Through.objects.bulk_create([
+                Through(product_id=ids[p.reference], category_id=categories.get(name))
+                for p in products
+                for name in dict.fromkeys(by_reference[p.reference][1]["categories"])
+            ], ignore_conflicts=True)
+        if "quantity" in columns:
+            stock.record_movements(
+                {ids[p.reference]: p.quantity - before.get(p.reference, 0) for p in products},
+                StockEvent.IMPORT,
+            )
+        # Index de recherche depuis la base : le fichier peut n'avoir que le prix
+        search.index_products(
+            Product.objects.filter(pk__in=ids.values()).only("id", "name", "description")
+        )
+        recommendations.schedule_refresh(ids.values())
+
+    created = sum(1 for p in products if p.reference not in existing)
+    return created, len(products) - created, errors
+
+
+def import_products(fileobj, filename, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Importe tout le fichier, lot par lot. `progress(result)` est appelé
+    après chaque lot. Retourne le bilan : lignes lues, créées, mises à
+    jour, erreurs [(ligne, message)] (les premières seulement).
+    """
+    columns, rows = open_rows(fileobj, filename)
+    suppliers = NameLookup(Supplier, phone="")
+    categories = NameLookup(Category)
+    result = {"processed": 0, "created": 0, "updated": 0, "error_count": 0, "errors": []}
+
+    def add_errors(errors):
+        result["error_count"] += len(errors)
+        room = MAX_STORED_ERRORS - len(result["errors"])
+        result["errors"].extend(errors[:max(room, 0)])
+
+    def flush(batch):
+        created, updated, errors = import_chunk(batch, columns, suppliers, categories)
+        result["created"] += created
+        result["updated"] += updated
+        add_errors(errors)
+        if progress:
+            progress(result)
+
+    batch = []
+    # Ligne 1 = en-têtes
+    for line, row in enumerate(rows, start=2):
+        result["processed"] += 1
+        try:
+            batch.append((line, parse_row(row, columns)))
+        except ValueError as exc:
+            add_errors([(line, str(exc))])
+        if len(batch) >= chunk_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    caching.bump_version(caching.CATALOGUE)
+    return result
+
+
+# ----------------- Import en arrière-plan -----------------
+def start_import(upload):
+    """
+    Copie le fichier envoyé hors de la requête puis lance l'import en
+    arrière-plan après la transaction. Retourne le ProductImportJob.
+    """
+    extension = os.path.splitext(upload.name)[1].lower()
+    if extension not in FORMATS:
+        raise ImportFormatError(f"Format non pris en charge : {extension or upload.name}")
+
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    path = os.path.join(IMPORT_DIR, f"{uuid.uuid4().hex}{extension}")
+    with open(path, "wb") as out:
+        for chunk in upload.chunks():
+            out.write(chunk)
+
+    job = ProductImportJob.objects.create(filename=upload.name, path=path)
+    transaction.on_commit(lambda: _executor.submit(_run_job, job.pk))
+    return job
+
+
+def run_job(job_id):
+    job = ProductImportJob.objects.get(pk=job_id)
+    jobs = ProductImportJob.objects.filter(pk=job_id)
+    jobs.update(status=ProductImportJob.RUNNING)
+
+    def progress(result):
+        jobs.update(
+            rows_processed=result["processed"],
+            rows_created=result["created"],
+            rows_updated=result["updated"],
+            error_count=result["error_count"],
+            errors=result["errors"],
+        )
+
+    status = ProductImportJob.FAILED
+    try:
+        with open(job.path, "rb") as source:
+            progress(import_products(source, job.filename, progress=progress))
+        status = ProductImportJob.DONE
+    except Exception as exc:
+        logger.exception("Échec de l'import de produits #%s", job_id)
+        jobs.update(errors=[(None, str(exc))], error_count=1)
+    finally:
+        jobs.update(status=status, finished_at=timezone.now())
+        try:
+            os.unlink(job.path)
+        except OSError:
+            pass
+
+
+def _run_job(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Connexions propres au thread du pool : ne pas les laisser ouvertes
+        connections.close_all()
+
+
+# ----------------- Export -----------------
+def _export_rows(queryset):
+    yield COLUMNS
+    products = (
+        queryset.select_related("supplier")
+        .prefetch_related("categories")
+        .order_by("pk")
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for p in products:
+        yield [
+            p.reference or "",
+            p.name,
+            p.price,
+            p.quantity,
+            p.description or "",
+            p.supplier.name if p.supplier else "",
+            CATEGORY_SEPARATOR.join(c.name for c in p.categories.all()),
+        ]
+
+
+class _Echo:
+    """Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de l'écrire."""
+
+    def write(self, value):
+        return value
+
+
+def iter_products_csv(queryset):
+    """CSV produit au fil de l'eau, relisible tel quel par l'import."""
+    writer = csv.writer(_Echo(), delimiter=";")
+    # BOM : Excel ouvre le fichier en UTF-8
+    yield "\ufeff"
+    for row in _export_rows(queryset):
+        yield writer.writerow(row)
+
+
+def iter_products_xlsx(queryset):
+    """
+    Classeur XLSX en mode écriture seule (lignes non gardées en mémoire),
+    rendu dans un fichier temporaire puis envoyé par morceaux.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ImportFormatError("Le format XLSX nécessite le paquet openpyxl.")
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Produits")
+    for row in _export_rows(queryset):
+        sheet.append(row)
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as out:
+        workbook.save(out)
+        out.seek(0)
+        while chunk := out.read(64 * 1024):
+            yield chunk
@@ -0,0 +1,283 @@
+import bisect
+import heapq
+import logging
+import math
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Min, Q, Subquery
+
+from .models import Product, SimilarProduct
+
+
+# ================= PRODUITS SIMILAIRES =================
+# Pour chaque produit, ses NEIGHBOURS plus proches voisins sont calculés
+# à l'avance dans SimilarProduct : catégories communes, même
+# fournisseur, puis même gamme de prix en bonus. Une liste trop courte
+# est complétée par les produits de la même gamme au prix le plus
+# proche. La fiche produit les lit en une requête sur l'index
+# (product, rank).
+#
+# Quand un produit ou ses catégories changent, sa liste est recalculée
+# en arrière-plan, ainsi que celles des produits qui l'avaient parmi
+# leurs voisins ou dont il entre désormais dans les meilleurs (le score
+# est symétrique). Les demandes rapprochées sont regroupées en un seul
+# calcul. Seuls les compléments par gamme de prix peuvent rester en
+# retard, jusqu'au prochain recalcul du produit concerné.
+
+logger = logging.getLogger(__name__)
+
+# Voisins gardés par produit ; la fiche en montre SHOWN, en stock
+NEIGHBOURS = getattr(settings, "SIMILAR_PRODUCTS_STORED", 8)
+SHOWN = 4
+
+CATEGORY_WEIGHT = 3  # par catégorie commune
+SUPPLIER_WEIGHT = 2
+PRICE_BAND_WEIGHT = 1
+
+BATCH_SIZE = 1000
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recommendations")
+_lock = threading.Lock()
+_pending = set()
+
+
+def price_band(price):
+    """Gamme de prix : tranches dont les bornes doublent (1024-2047, 2048-4095...)."""
+    return int(math.log2(price)) if price >= 1 else 0
+
+
+def _band_filter(band):
+    """Produits de la gamme `band` (voir price_band)."""
+    if band == 0:
+        return Q(price__lt=2)
+    return Q(price__gte=2 ** band, price__lt=2 ** (band + 1))
+
+
+class Catalogue:
+    """
+    Critères des produits, avec les index inversés qui donnent les
+    candidats. Avec `product_ids`, seuls ces produits et leurs candidats
+    (mêmes catégories, fournisseur ou gamme) sont chargés : les scores et
+    voisins ne sont alors valables que pour `product_ids`.
+    """
+
+    def __init__(self, product_ids=None):
+        self.features = {}  # id -> (catégories, fournisseur, gamme, prix)
+        self.by_category = defaultdict(list)
+        self.by_supplier = defaultdict(list)
+        self.by_band = defaultdict(list)  # gamme -> [(prix, id)] trié
+
+        links = Product.categories.through.objects.all()
+        products = Product.objects.all()
+        if product_ids is not None:
+            product_ids = list(product_ids)
+            links = links.filter(category_id__in=Subquery(
+                links.filter(product_id__in=product_ids).values("category_id")
+            ))
+            rows = list(Product.objects.filter(pk__in=product_ids).values_list("supplier_id", "price"))
+            suppliers, bands = {s for s, _ in rows if s is not None}, {price_band(p) for _, p in rows}
+            candidates = Q(pk__in=product_ids) | Q(pk__in=links.values("product_id")) | Q(supplier_id__in=suppliers)
+            for band in bands:
+                candidates |= _band_filter(band)
+            products = products.filter(candidates)
+
+        categories = defaultdict(set)
+        for product_id, category_id in links.values_list(
+            "product_id", "category_id"
+        ).iterator(chunk_size=5000):
+            categories[product_id].add(category_id)
+            self.by_category[category_id].append(product_id)
+
+        for pk, supplier_id, price in products.values_list(
+            "pk", "supplier_id", "price"
+        ).iterator(chunk_size=5000):
+            band = price_band(price)
+            self.features[pk] = (categories.get(pk, set()), supplier_id, band, price)
+            if supplier_id is not None:
+                self.by_supplier[supplier_id].append(pk)
+            self.by_band[band].append((price, pk))
+        for products in self.by_band.values():
+            products.sort()
+
+    def scores(self, pk):
+        categories, supplier_id, band, _ = self.features[pk]
+        shared = Counter()
+        for category_id in categories:
+            # Comptage en C : les listes par catégorie sont les plus longues
+            shared.update(self.by_category[category_id])
+        scores = Counter({other: count * CATEGORY_WEIGHT for other, count in shared.items()})
+        if supplier_id is not None:
+            for other in self.by_supplier[supplier_id]:
+                scores[other] += SUPPLIER_WEIGHT
+        scores.pop(pk, None)
+        for other in scores:
+            if self.features[other][2] == band:
+                scores[other] += PRICE_BAND_WEIGHT
+        return scores
+
+    def nearest_in_band(self, pk, exclude, limit):
+        """Produits de la même gamme au prix le plus proche, hors `exclude`."""
+        _, _, band, price = self.features[pk]
+        products = self.by_band[band]
+        right = bisect.bisect_left(products, (price, pk))
+        left = right - 1
+        found = []
+        while len(found) < limit and (left >= 0 or right < len(products)):
+            # Du côté le plus proche en prix
+            if right >= len(products) or (left >= 0 and price - products[left][0] <= products[right][0] - price):
+                other = products[left][1]
+                left -= 1
+            else:
+                other = products[right][1]
+                right += 1
+            if other != pk and other not in exclude:
+                found.append(other)
+        return found
+
+    def neighbours(self, pk, limit=NEIGHBOURS):
+        """[(id, score)] : meilleur score d'abord, puis prix le plus proche."""
+        price = self.features[pk][3]
+
+        def distance(other):
+            return abs(self.features[other][3] - price), other
+
+        by_score = defaultdict(list)
+        for other, score in self.scores(pk).items():
+            by_score[score].append(other)
+        # Seul le dernier palier retenu est départagé par le prix
+        result = []
+        for score in sorted(by_score, reverse=True):
+            room = limit - len(result)
+            if room <= 0:
+                break
+            result += [(other, score) for other in heapq.nsmallest(room, by_score[score], key=distance)]
+        if len(result) < limit:
+            chosen = {other for other, _ in result}
+            result += [
+                (other, PRICE_BAND_WEIGHT)
+                for other in self.nearest_in_band(pk, chosen, limit - len(result))
+            ]
+        return result
+
+
+
+def _store(catalogue, product_ids):
+    rows = [
+        SimilarProduct(product_id=pk, similar_id=other, rank=rank, score=score)
+        for pk in product_ids
+        if pk in catalogue.features
+        for rank, (other, score) in enumerate(catalogue.neighbours(pk), start=1)
+    ]
+    with transaction.atomic():
+        SimilarProduct.objects.filter(product_id__in=product_ids).delete()
+        SimilarProduct.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def rebuild(progress=None):
+    """Recalcule les voisins de tout le catalogue. Retourne le nombre de produits."""
+    catalogue = Catalogue()
+    ids = sorted(catalogue.features)
+    SimilarProduct.objects.exclude(product_id__in=ids).delete()
+    for start in range(0, len(ids), BATCH_SIZE):
+        _store(catalogue, ids[start:start + BATCH_SIZE])
+        if progress:
+            progress(min(start + BATCH_SIZE, len(ids)), len(ids))
+    return len(ids)
+
+
+def _entering(catalogue, product_ids):
+    """Produits dont l'un de `product_ids` a un score assez haut pour entrer dans la liste."""
+    best = Counter()
+    for pk in product_ids:
+        if pk in catalogue.features:
+            for other, score in catalogue.scores(pk).items():
+                best[other] = max(best[other], score)
+
+    candidates = list(best)
+    entering = set()
+    for start in range(0, len(candidates), BATCH_SIZE):
+        chunk = candidates[start:start + BATCH_SIZE]
+        stored = {
+            row["product_id"]: (row["count"], row["lowest"])
+            for row in SimilarProduct.objects.filter(product_id__in=chunk)
+            .values("product_id").annotate(count=Count("id"), lowest=Min("score"))
+        }
+        for other in chunk:
+            count, lowest = stored.get(other, (0, 0))
+            # À égalité de score, le prix départage : à recalculer aussi
+            if count < NEIGHBOURS or best[other] >= lowest:
+                entering.add(other)
+    return entering
+
+
+def refresh(product_ids):
+    """
+    Après un changement des produits `product_ids` : leurs voisins, et
+    ceux des produits qui pourraient les gagner ou les perdre.
+    """
+    affected = set(product_ids)
+    affected.update(
+        SimilarProduct.objects.filter(similar_id__in=product_ids).values_list("product_id", flat=True)
+    )
+    affected |= _entering(Catalogue(product_ids), product_ids)
+    affected = sorted(affected)
+    # Candidats de tous les produits à reclasser, pas tout le catalogue
+    catalogue = Catalogue(affected)
+    for start in range(0, len(affected), BATCH_SIZE):
+        _store(catalogue, affected[start:start + BATCH_SIZE])
+    return len(affected)
+
+
+def run_pending():
+    """Traite toutes les demandes en attente en un seul calcul."""
+    with _lock:
+        product_ids = list(_pending)
+        _pending.clear()
+    return refresh(product_ids) if product_ids else 0
+
+
+def _run():
+    try:
+        run_pending()
+    except Exception:
+        logger.exception("Échec du calcul des produits similaires")
+    finally:
+        # Connexions propres au thread du pool : ne pas les laisser ouvertes
+        connections.close_all()
+
+
+def schedule_refresh(product_ids):
+    """
+    Planifie refresh() après la transaction, regroupé avec les demandes en
+    attente. Avec SIMILAR_PRODUCTS_INLINE (tests), le calcul est fait sur
+    place, sans thread, dans la transaction de l'appelant.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+
+    def submit():
+        with _lock:
+            idle = not _pending
+            _pending.update(product_ids)
+        if getattr(settings, "SIMILAR_PRODUCTS_INLINE", False):
+            run_pending()
+        elif idle:
+            _executor.submit(_run)
+
+    transaction.on_commit(submit)
+
+
+def similar_products(product, limit=SHOWN):
+    """Voisins en stock de `product`, en une requête."""
+    return [
+        row.similar
+        for row in SimilarProduct.objects
+        .filter(product=product, similar__quantity__gt=0)
+        .select_related("similar")
+        .order_by("rank")[:limit]
+    ]
@@ -0,0 +1,165 @@
+import logging
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import LOW_STOCK_THRESHOLD, Product, StockAlertRun, StockEvent, SupplierDetail
+
+
+# ================= ALERTES DE STOCK BAS =================
+# Une passe (commande send_low_stock_alerts, planifiée) lit les
+# mouvements de stock arrivés depuis la précédente, garde les produits
+# touchés qui sont sous le seuil et envoie un email par fournisseur
+# (SupplierDetail.contact_email). Le coût dépend du nombre de mouvements
+# de la période, pas de la taille du catalogue ; le rapport complet lit
+# l'index partiel des produits sous le seuil.
+#
+# Un produit qui reste sous le seuil et continue de se vendre est
+# signalé à nouveau à la passe suivante.
+#
+# Une seule passe à la fois : deux passes partiraient de la même reprise
+# et enverraient deux fois les mêmes emails. Comme pour les achats
+# conjoints (copurchase.py), une passe se déclare en verrouillant la
+# dernière passe enregistrée et renonce si une autre n'est pas terminée ;
+# une passe sans nouvelle depuis STALE est considérée comme arrêtée.
+
+logger = logging.getLogger(__name__)
+
+# Mouvements trop récents laissés à la passe suivante : une transaction
+# plus lente pourrait encore valider un mouvement d'identifiant inférieur
+SETTLE = timedelta(minutes=1)
+STALE = timedelta(minutes=30)
+
+
+def low_stock():
+    """Produits sous le seuil, avec fournisseur et contact (index partiel)."""
+    return (
+        Product.objects.filter(quantity__lte=LOW_STOCK_THRESHOLD)
+        .select_related("supplier__details")
+        .order_by("supplier_id", "quantity", "pk")
+    )
+
+
+def contact_email(supplier):
+    if supplier is None:
+        return None
+    try:
+        return supplier.details.contact_email or None
+    except SupplierDetail.DoesNotExist:
+        return None
+
+
+def by_supplier(products):
+    """[(fournisseur ou None, [produits])], dans l'ordre de `products` (trié par fournisseur)."""
+    return [
+        (group[0].supplier, group)
+        for _, items in groupby(products, key=lambda p: p.supplier_id)
+        for group in [list(items)]
+    ]
+
+
+def restock_report():
+    """Tout le catalogue sous le seuil, groupé par fournisseur."""
+    return by_supplier(low_stock())
+
+
+def watermark():
+    """Identifiant du dernier mouvement déjà traité."""
+    return StockAlertRun.objects.aggregate(last=Max("last_event_id"))["last"] or 0
+
+
+def running():
+    """Passe en cours (non terminée et active depuis moins de STALE), ou None."""
+    return StockAlertRun.objects.filter(
+        finished_at__isnull=True, updated_at__gte=timezone.now() - STALE
+    ).first()
+
+
+def _claim():
+    with transaction.atomic():
+        # Deux passes qui démarrent ensemble se suivent ici
+        list(StockAlertRun.objects.select_for_update().order_by("-pk")[:1])
+        if running() is not None:
+            return None
+        # La reprise n'avance qu'une fois les emails envoyés
+        return StockAlertRun.objects.create(last_event_id=watermark())
+
+
+def _message(supplier, products, recipient):
+    name = supplier.name if supplier else "Sans fournisseur"
+    lines = [
+        f"- {p.name}{f' (réf. {p.reference})' if p.reference else ''} : {p.quantity} en stock"
+        for p in products
+    ]
+    return EmailMessage(
+        subject=f"Réapprovisionnement {name} : {len(products)} produit(s) en stock bas",
+        body=(
+            f"Bonjour,\n\nLes produits suivants sont à {LOW_STOCK_THRESHOLD} unités ou moins :\n\n"
+            + "\n".join(lines)
+            + "\n\nMerci de nous indiquer vos délais de livraison.\n"
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient],
+    )
+
+
+def build_alerts(after, until):
+    """
+    Emails des produits sous le seuil dont le stock a varié entre les
+    mouvements `after` (exclu) et `until` (inclus). Retourne (emails,
+    produits signalés, produits sans contact).
+    """
+    touched = StockEvent.objects.filter(pk__gt=after, pk__lte=until).values("product_id")
+    products = list(low_stock().filter(pk__in=touched))
+
+    emails, orphans = [], []
+    for supplier, group in by_supplier(products):
+        recipient = contact_email(supplier)
+        if recipient:
+            emails.append(_message(supplier, group, recipient))
+        else:
+            orphans += group
+    if orphans and getattr(settings, "STOCK_ALERT_EMAIL", ""):
+        emails.append(_message(None, orphans, settings.STOCK_ALERT_EMAIL))
+    elif orphans:
+        logger.warning("%s produit(s) en stock bas sans contact fournisseur", len(orphans))
+    return emails, products, orphans
+
+
+def send_alerts(dry_run=False):
+    """
+    Passe des alertes depuis la précédente. Retourne la passe (non
+    enregistrée avec `dry_run`, qui n'envoie rien) et ses emails, ou
+    (None, []) si une autre passe est en cours.
+    """
+    if dry_run:
+        run = StockAlertRun(last_event_id=watermark())
+    else:
+        run = _claim()
+        if run is None:
+            logger.warning("Alertes de stock bas déjà en cours, passe annulée")
+            return None, []
+    after = run.last_event_id
+    until = (
+        StockEvent.objects.filter(pk__gt=after, created_at__lt=timezone.now() - SETTLE)
+        .order_by("-pk").values_list("pk", flat=True).first()
+    ) or after
+    emails, products, _ = build_alerts(after, until)
+
+    run.products_alerted, run.emails_sent = len(products), len(emails)
+    if dry_run:
+        run.last_event_id = until
+        return run, emails
+    if emails:
+        # Une seule connexion SMTP pour toute la passe
+        get_connection().send_messages(emails)
+    run.last_event_id = until
+    run.finished_at = timezone.now()
+    run.save(update_fields=["last_event_id", "products_alerted", "emails_sent", "finished_at", "updated_at"])
+    logger.info("%s produit(s) en stock bas, %s email(s) envoyé(s)", len(products), len(emails))
+    return run, emails
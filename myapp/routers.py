@@ -0,0 +1,115 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# ================= RÉPLIQUE EN LECTURE =================
+# Les pages en lecture seule (vitrine, tableau de bord) lisent sur l'alias
+# "replica" quand il est configuré ; tout le reste, et toutes les
+# écritures, vont sur la base principale. Après une commande (ou un POST
+# dans l'admin), le visiteur reçoit un cookie qui le garde sur la base
+# principale le temps que la réplique rattrape son retard : il relit
+# toujours ce qu'il vient d'écrire.
+#
+# Sessions et comptes sont toujours lus sur la base principale : ils
+# sont chargés à la demande, souvent dans le bloc (request.session,
+# request.user), et une réplique en retard déconnecterait un visiteur
+# qui vient de se connecter.
+#
+# Tout ce qui remplit un cache (fragments, pages anonymes) lit aussi sur
+# la base principale (primary_reads) : une réplique en retard y
+# figerait, sous la nouvelle version, des données d'avant l'écriture qui
+# l'a fait changer, pour toute la durée du cache.
+
+REPLICA = "replica"
+STICKY_COOKIE = "myshop_primary"
+STICKY_SECONDS = getattr(settings, "REPLICA_STICKY_SECONDS", 15)
+
+# Applications jamais lues sur la réplique
+PRIMARY_APPS = {"sessions", "auth", "contenttypes"}
+
+_read_alias = ContextVar("read_alias", default=None)
+_primary_only = ContextVar("primary_only", default=False)
+
+
+def _target(alias):
+    params = connections[alias].settings_dict
+    return params["HOST"], params["PORT"], str(params["NAME"])
+
+
+def replica_configured():
+    """
+    Alias "replica" présent et distinct de la base principale. En test,
+    c'est un miroir de la base de test, sur une autre connexion : il ne
+    verrait pas les données non validées des TestCase.
+    """
+    return REPLICA in settings.DATABASES and _target(REPLICA) != _target(DEFAULT_DB_ALIAS)
+
+
+def is_pinned(request):
+    return request is not None and STICKY_COOKIE in request.COOKIES
+
+
+def pin_to_primary(response):
+    """Garde le visiteur sur la base principale pendant STICKY_SECONDS."""
+    response.set_cookie(STICKY_COOKIE, "1", max_age=STICKY_SECONDS, httponly=True, samesite="Lax")
+    return response
+
+
+@contextmanager
+def replica_reads(request=None):
+    """Les lectures du bloc vont sur la réplique, sauf visiteur épinglé."""
+    use_replica = (
+        not _primary_only.get()
+        and replica_configured()
+        and not is_pinned(request)
+        and (request is None or request.method in ("GET", "HEAD"))
+    )
+    token = _read_alias.set(REPLICA if use_replica else None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Les lectures du bloc vont sur la base principale, même dans un replica_reads."""
+    primary_token = _primary_only.set(True)
+    alias_token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(alias_token)
+        _primary_only.reset(primary_token)
+
+
+def read_from_replica(view):
+    """Décorateur de vue : voir replica_reads."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        with replica_reads(request):
+            return view(request, *args, **kwargs)
+    return wrapped
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # Jamais sur la réplique, même pour un objet qui en a été lu
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mêmes données des deux côtés
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplique reçoit le schéma par la réplication
+        return db != REPLICA
@@ -0,0 +1,192 @@
+import re
+import unicodedata
+
+from django.db import connection, transaction
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+
+# ================= RECHERCHE PLEIN TEXTE =================
+# Index séparé de la table produit :
+#   - SQLite     : table virtuelle FTS5 (rowid = id du produit)
+#   - PostgreSQL : table tsvector + index GIN
+# Le texte est indexé "plié" (minuscules, sans accents) pour que
+# "ecouteurs" trouve "Écouteurs". Le nom pèse plus que la description.
+
+SQLITE_TABLE = "myapp_product_fts"
+POSTGRES_TABLE = "myapp_product_search"
+
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def fold(text):
+    """Minuscules et suppression des accents."""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(query):
+    return re.findall(r"\w+", fold(query))
+
+
+def is_supported():
+    return connection.vendor in ("sqlite", "postgresql")
+
+
+# ----------------- Schéma -----------------
+def create_index(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    with conn.cursor() as cursor:
+        if conn.vendor == "sqlite":
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} "
+                "USING fts5(name, description, tokenize='unicode61 remove_diacritics 2')"
+            )
+        elif conn.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} ("
+                "product_id bigint PRIMARY KEY "
+                "REFERENCES myapp_product(id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+                "document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {POSTGRES_TABLE}_document_idx "
+                f"ON {POSTGRES_TABLE} USING GIN (document)"
+            )
+
+
+def drop_index(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    with conn.cursor() as cursor:
+        if conn.vendor == "sqlite":
+            cursor.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE}")
+        elif conn.vendor == "postgresql":
+            cursor.execute(f"DROP TABLE IF EXISTS {POSTGRES_TABLE}")
+
+
+# ----------------- Synchronisation -----------------
+def index_products(products, schema_editor=None):
+    """Indexe plusieurs produits en un seul aller-retour par instruction."""
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor not in ("sqlite", "postgresql"):
+        return
+    rows = [(p.pk, fold(p.name), fold(p.description)) for p in products]
+    if not rows:
+        return
+
+    with conn.cursor() as cursor:
+        if conn.vendor == "sqlite":
+            cursor.executemany(
+                f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [(pk,) for pk, _, _ in rows]
+            )
+            cursor.executemany(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+                rows,
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {POSTGRES_TABLE} (product_id, document) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'B')) "
+                "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+
+
+def index_product(product):
+    index_products([product])
+
+
+def remove_product(product_id):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [product_id])
+        else:
+            cursor.execute(f"DELETE FROM {POSTGRES_TABLE} WHERE product_id = %s", [product_id])
+
+
+def fill_index(products, batch_size=1000, schema_editor=None):
+    """Indexe `products` par lots. Retourne leur nombre."""
+    count = 0
+    batch = []
+    for product in products.only("id", "name", "description").order_by("id").iterator(chunk_size=batch_size):
+        batch.append(product)
+        if len(batch) == batch_size:
+            index_products(batch, schema_editor)
+            count += len(batch)
+            batch = []
+    index_products(batch, schema_editor)
+    return count + len(batch)
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Vide puis reconstruit l'index à partir de la table produit, dans une
+    seule transaction : les recherches concurrentes voient l'ancien index
+    (SQLite en WAL) ou attendent le nouveau (verrou de PostgreSQL sur la
+    table), jamais une table absente ou à moitié remplie.
+    """
+    from .models import Product
+
+    with transaction.atomic():
+        drop_index()
+        create_index()
+        return fill_index(Product.objects.all(), batch_size)
+
+
+# ----------------- Requêtes -----------------
+def _match_expression(tokens):
+    # Chaque mot est cherché en préfixe : "clav" trouve "clavier"
+    if connection.vendor == "sqlite":
+        return " ".join(f'"{token}"*' for token in tokens)
+    return " & ".join(f"{token}:*" for token in tokens)
+
+
+def search_products(queryset, query):
+    """
+    Filtre `queryset` sur `query` et l'annote avec `search_rank`
+    (plus la valeur est haute, plus le produit est pertinent).
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+
+    if not is_supported():
+        condition = Q()
+        for token in tokens:
+            condition &= Q(name__icontains=token) | Q(description__icontains=token)
+        return queryset.filter(condition).annotate(
+            search_rank=RawSQL("0", [], output_field=FloatField())
+        )
+
+    match = _match_expression(tokens)
+    table = queryset.model._meta.db_table
+
+    if connection.vendor == "sqlite":
+        matching_ids = RawSQL(
+            f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s", [match]
+        )
+        rank = RawSQL(
+            f"SELECT -bm25({SQLITE_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}) "
+            f"FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s "
+            f"AND rowid = {table}.id",
+            [match],
+            output_field=FloatField(),
+        )
+    else:
+        matching_ids = RawSQL(
+            f"SELECT product_id FROM {POSTGRES_TABLE} "
+            "WHERE document @@ to_tsquery('simple', %s)",
+            [match],
+        )
+        rank = RawSQL(
+            f"SELECT ts_rank(document, to_tsquery('simple', %s)) "
+            f"FROM {POSTGRES_TABLE} WHERE product_id = {table}.id",
+            [match],
+            output_field=FloatField(),
+        )
+
+    return queryset.filter(id__in=matching_ids).annotate(search_rank=rank)
@@ -0,0 +1,169 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching, recommendations, search, stats
+from .models import Category, Commande, CommandeLine, Product, StockEvent, Supplier
+
+
+# ================= DONNÉES DE TEST =================
+# Catalogue et commandes synthétiques, créés par bulk_create et par lots.
+# Même graine = mêmes données : deux mesures sur deux machines portent
+# sur la même base. Les lignes créées sont reconnaissables (référence
+# "SEED-", email "@seed.invalid") pour pouvoir les retirer.
+
+REFERENCE_PREFIX = "SEED-"
+EMAIL_DOMAIN = "seed.invalid"
+BATCH_SIZE = 5000
+
+WORDS = [
+    "Clavier", "Souris", "Écran", "Casque", "Enceinte", "Chargeur", "Câble", "Sac",
+    "Montre", "Téléphone", "Tablette", "Imprimante", "Ventilateur", "Climatiseur",
+    "Réfrigérateur", "Mixeur", "Aspirateur", "Lampe", "Routeur", "Disque",
+]
+ADJECTIVES = [
+    "sans fil", "pro", "compact", "premium", "rechargeable", "RGB", "portable",
+    "silencieux", "étanche", "rapide", "connecté", "mini",
+]
+CITIES = ["Abidjan", "Bouaké", "Yamoussoukro", "San-Pédro", "Daloa", "Korhogo", "Man"]
+PAYMENTS = [code for code, _ in Commande.PAYMENT_CHOICES]
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Laisse bulk_create écrire les dates fournies (auto_now / auto_now_add coupés)."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field, _, _ in saved:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _batches(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+def seed(categories=20, suppliers=50, products=5000, orders=100000, max_lines=3,
+         days=365, seed=42, batch_size=BATCH_SIZE, progress=None):
+    """Crée les volumes demandés. Retourne le nombre de lignes créées par modèle."""
+    rng = random.Random(seed)
+    now = timezone.now()
+    report = progress or (lambda label, done, total: None)
+
+    category_ids = [c.pk for c in Category.objects.bulk_create(
+        [Category(name=f"Catégorie {i + 1}") for i in range(categories)]
+    )]
+    supplier_ids = [s.pk for s in Supplier.objects.bulk_create(
+        [Supplier(name=f"Fournisseur {i + 1}", phone=f"07{rng.randrange(10**8):08d}") for i in range(suppliers)]
+    )]
+
+    # ----------------- Produits -----------------
+    prices, names = {}, {}
+    Through = Product.categories.through
+    created_field = Product._meta.get_field("created_at")
+    event_field = StockEvent._meta.get_field("created_at")
+    for start, count in _batches(products, batch_size):
+        batch = []
+        for i in range(start, start + count):
+            name = f"{rng.choice(WORDS)} {rng.choice(ADJECTIVES)} {i + 1}"
+            batch.append(Product(
+                reference=f"{REFERENCE_PREFIX}{seed}-{i + 1:07d}",
+                name=name,
+                description=f"{name} : {' '.join(rng.sample(ADJECTIVES, 3))}.",
+                price=Decimal(rng.randrange(500, 500000, 50)),
+                # Un produit sur dix en rupture, comme en vrai
+                quantity=0 if rng.random() < 0.1 else rng.randrange(1, 500),
+                supplier_id=rng.choice(supplier_ids) if supplier_ids else None,
+                created_at=now - timedelta(seconds=rng.randrange(days * 86400)),
+            ))
+        with transaction.atomic(), explicit_timestamps(created_field, event_field):
+            batch = Product.objects.bulk_create(batch)
+            # Stock initial journalisé à la date d'ajout du produit
+            StockEvent.objects.bulk_create([
+                StockEvent(product_id=p.pk, delta=p.quantity, source=StockEvent.IMPORT, created_at=p.created_at)
+                for p in batch
+                if p.quantity
+            ])
+            if category_ids:
+                Through.objects.bulk_create([
+                    Through(product_id=p.pk, category_id=category_id)
+                    for p in batch
+                    for category_id in rng.sample(category_ids, min(len(category_ids), rng.randint(1, 2)))
+                ])
+        prices.update((p.pk, p.price) for p in batch)
+        names.update((p.pk, p.name) for p in batch)
+        report("produits", start + count, products)
+
+    # ----------------- Commandes -----------------
+    product_ids = list(prices)
+    lines_created = 0
+    order_fields = [Commande._meta.get_field(name) for name in ("created_at", "updated_at")]
+    for start, count in _batches(orders if product_ids else 0, batch_size):
+        commandes, lines = [], []
+        for i in range(start, start + count):
+            created_at = now - timedelta(seconds=rng.randrange(days * 86400))
+            items = [
+                (product_id, rng.randint(1, 4))
+                for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(1, max_lines)))
+            ]
+            lines.append(items)
+            commandes.append(Commande(
+                customer_name=f"Client {i + 1}",
+                customer_email=f"client{i + 1}@{EMAIL_DOMAIN}",
+                customer_phone=f"05{rng.randrange(10**8):08d}",
+                customer_address=rng.choice(CITIES),
+                payment=rng.choice(PAYMENTS),
+                total_amount=sum(prices[pid] * qty for pid, qty in items),
+                is_delivered=rng.random() < 0.7,
+                created_at=created_at,
+                updated_at=created_at,
+            ))
+        with transaction.atomic(), explicit_timestamps(*order_fields):
+            commandes = Commande.objects.bulk_create(commandes)
+            order_lines = [
+                CommandeLine(
+                    commande_id=c.pk, product_id=pid, product_name=names[pid],
+                    quantity=qty, unit_price=prices[pid],
+                )
+                for c, items in zip(commandes, lines)
+                for pid, qty in items
+            ]
+            CommandeLine.objects.bulk_create(order_lines)
+        lines_created += len(order_lines)
+        report("commandes", start + count, orders)
+
+    # bulk_create n'envoie aucun signal : index, statistiques et cache à la main
+    search.rebuild_index()
+    stats.rebuild()
+    recommendations.rebuild()
+    caching.bump_version(caching.CATALOGUE)
+    return {
+        "categories": len(category_ids),
+        "suppliers": len(supplier_ids),
+        "products": len(product_ids),
+        "orders": orders if product_ids else 0,
+        "order_lines": lines_created,
+    }
+
+
+def clear():
+    """Supprime les commandes et produits générés (pas les catégories ni fournisseurs)."""
+    with transaction.atomic():
+        orders = Commande.objects.filter(customer_email__endswith=f"@{EMAIL_DOMAIN}")
+        CommandeLine.objects.filter(commande__in=orders).delete()
+        # Sans signal par commande (les statistiques sont recalculées ensuite)
+        deleted_orders = orders._raw_delete(orders.db)
+        _, deleted = Product.objects.filter(reference__startswith=REFERENCE_PREFIX).delete()
+    search.rebuild_index()
+    stats.rebuild()
+    recommendations.rebuild()
+    caching.bump_version(caching.CATALOGUE)
+    return deleted_orders, deleted.get(Product._meta.label, 0)
@@ -1,17 +1,160 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
-from .models import Commande
- 
+from django.db import transaction
+from .models import (
+    Category, Commande, HomePage, HomeSlide, Product, SimilarProduct, Slide, StockEvent, Supplier,
+)
+from . import caching, images, recommendations, search, stats, stock
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """
+    Maintient l'index de recherche à jour après chaque enregistrement.
+    """
+    if not raw:
+        search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def record_stock_change(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """
+    Journalise la variation du stock (fiche admin, list_editable...).
+    `_stock_source` précise l'origine si ce n'est pas un ajustement manuel.
+    """
+    if raw or (update_fields and "quantity" not in update_fields):
+        return
+    # Stock lu en base par Product.save(), sous verrou
+    before = 0 if created else instance.__dict__.pop("_stock_before", None)
+    if before is None:
+        # Produit absent de la base avant l'écriture : rien à comparer
+        return
+    source = getattr(instance, "_stock_source", StockEvent.ADJUSTMENT)
+    stock.record_movements({instance.pk: instance.quantity - before}, source)
+
+
+@receiver(pre_delete, sender=Product)
+def record_stock_deletion(sender, instance, **kwargs):
+    """
+    Journalise la sortie du stock restant : l'historique du produit
+    supprimé se termine à zéro.
+    """
+    # Stock lu en base, sous verrou (la suppression est transactionnelle)
+    before = (
+        Product.objects.select_for_update().filter(pk=instance.pk)
+        .values_list("quantity", flat=True).first()
+    )
+    if before:
+        stock.record_movements({instance.pk: -before}, StockEvent.DELETION)
+
+
+@receiver(post_save, sender=Product)
+def refresh_similar_products(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """
+    Produits similaires recalculés en arrière-plan, après la transaction,
+    seulement si le fournisseur ou le prix a changé (les catégories
+    passent par m2m_changed) : pas pour un simple mouvement de stock.
+    """
+    if raw or (update_fields and not {"supplier", "supplier_id", "price"} & set(update_fields)):
+        return
+    criteria = instance._criteria()
+    if created or getattr(instance, "_loaded_criteria", None) != criteria:
+        recommendations.schedule_refresh([instance.pk])
+    instance._loaded_criteria = criteria
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def refresh_similar_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        # Catégorie vidée : les produits concernés ne sont plus connus après
+        instance._cleared_products = list(instance.products.values_list("pk", flat=True))
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        recommendations.schedule_refresh(pk_set or getattr(instance, "_cleared_products", []))
+    else:
+        recommendations.schedule_refresh([instance.pk])
+
+
+@receiver(pre_delete, sender=Product)
+def release_similar_products(sender, instance, **kwargs):
+    # Les produits qui l'avaient pour voisin doivent en trouver un autre
+    recommendations.schedule_refresh(
+        SimilarProduct.objects.filter(similar=instance).values_list("product_id", flat=True)
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=HomePage)
+@receiver(post_save, sender=HomeSlide)
+@receiver(post_save, sender=Slide)
+def generate_image_variants(sender, instance, raw=False, **kwargs):
+    """
+    Tailles d'image générées en arrière-plan, après la transaction.
+    """
+    if not raw:
+        images.schedule_variants(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=HomePage)
+@receiver(post_delete, sender=HomeSlide)
+@receiver(post_delete, sender=Slide)
+def delete_image_variants(sender, instance, **kwargs):
+    field_name, variants_name, _ = images.IMAGE_FIELDS[sender._meta.label]
+    field_file = getattr(instance, field_name)
+    storage, name = field_file.storage, field_file.name
+    variants = getattr(instance, variants_name)
+
+    def release():
+        images.delete_variants(storage, variants)
+        if name:
+            storage.delete(name)
+
+    transaction.on_commit(release)
+
+
+@receiver([post_save, post_delete], sender=HomePage)
+def invalidate_home_data(sender, **kwargs):
+    caching.bump_version(caching.HOMEPAGE)
+
+
+@receiver([post_save, post_delete], sender=HomeSlide)
+def invalidate_slides(sender, **kwargs):
+    caching.bump_version(caching.SLIDES)
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver(m2m_changed, sender=Product.categories.through)
+# Noms des filtres de l'accueil
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Supplier)
+def invalidate_catalogue(sender, **kwargs):
+    caching.bump_version(caching.CATALOGUE)
+
+
 @receiver(post_save, sender=Commande)
-def update_product_quantity(sender, instance, created, **kwargs):
-    """
-    Décrémente la quantité du produit après validation de la commande.
-    """
-    if created:  # Vérifie si la commande est nouvellement créée
-        # Assure-toi que la quantité est bien disponible avant de la décrémenter
-        if instance.product.quantity >= instance.quantity:
-            instance.product.quantity -= instance.quantity
-            instance.product.save()
-        else:
-            # Gérer le cas où il n'y a pas suffisamment de stock
-            print(f"Stock insuffisant pour le produit {instance.product.name}. Quantité disponible: {instance.product.quantity}")
\ No newline at end of file
+def update_order_stats(sender, instance, created, raw=False, **kwargs):
+    """
+    Statistiques du tableau de bord : nouvelle commande ou changement de
+    livraison. Une commande annulée n'y compte plus.
+    """
+    if raw or instance.cancelled_at:
+        return
+    if created:
+        stats.record_created(instance)
+    elif instance.is_delivered != getattr(instance, "_loaded_is_delivered", instance.is_delivered):
+        stats.record_delivery_change(instance)
+    instance._loaded_is_delivered = instance.is_delivered
+
+
+@receiver(post_delete, sender=Commande)
+def remove_order_stats(sender, instance, **kwargs):
+    # Commande annulée : déjà sortie des statistiques
+    if instance.cancelled_at is None:
+        stats.record_deleted(instance)
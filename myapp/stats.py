@@ -0,0 +1,94 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Count, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from . import caching
+from .models import Commande, DailyOrderStats, Product
+
+
+# ================= STATISTIQUES DU TABLEAU DE BORD =================
+# Une ligne par jour, tenue à jour à chaque commande créée, livrée,
+# annulée ou supprimée ; une commande annulée n'y compte plus. Le tableau
+# de bord lit quelques centaines de lignes au lieu de compter toute la
+# table des commandes. Le nombre de produits est gardé en cache jusqu'au
+# prochain changement du catalogue.
+
+
+def _increment(day, total=0, delivered=0):
+    changes = {
+        "orders_total": F("orders_total") + total,
+        "orders_delivered": F("orders_delivered") + delivered,
+    }
+    # Cas courant : la ligne du jour existe, un seul UPDATE
+    if DailyOrderStats.objects.filter(day=day).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailyOrderStats.objects.create(
+                day=day, orders_total=total, orders_delivered=delivered
+            )
+    except IntegrityError:
+        # Créée entre-temps par une autre commande
+        DailyOrderStats.objects.filter(day=day).update(**changes)
+
+
+def _day(commande):
+    return timezone.localdate(commande.created_at)
+
+
+def record_created(commande):
+    _increment(_day(commande), total=1, delivered=int(commande.is_delivered))
+
+
+def record_delivery_change(commande):
+    _increment(_day(commande), delivered=1 if commande.is_delivered else -1)
+
+
+def record_deleted(commande):
+    _increment(_day(commande), total=-1, delivered=-int(commande.is_delivered))
+
+
+def dashboard_stats():
+    """
+    Commandes par mois et totaux livrées / en attente, en une requête.
+    """
+    monthly = list(
+        DailyOrderStats.objects
+        .annotate(month=TruncMonth("day"))
+        .values("month")
+        .annotate(total=Sum("orders_total"), delivered_count=Sum("orders_delivered"))
+        .order_by("month")
+    )
+    for row in monthly:
+        row["pending_count"] = row["total"] - row["delivered_count"]
+
+    return {
+        "monthly_orders": monthly,
+        "orders_delivered": sum(row["delivered_count"] for row in monthly),
+        "orders_pending": sum(row["pending_count"] for row in monthly),
+    }
+
+
+def products_count():
+    return caching.get_or_set("products_count", caching.CATALOGUE, Product.objects.count)
+
+
+def rebuild():
+    """Recalcule toute la table depuis les commandes existantes (non annulées)."""
+    days = (
+        Commande.objects.filter(cancelled_at__isnull=True)
+        .annotate(day=TruncDate("created_at", tzinfo=timezone.get_current_timezone()))
+        .values("day")
+        .annotate(
+            orders_total=Count("id"),
+            orders_delivered=Count("id", filter=Q(is_delivered=True)),
+        )
+        .order_by("day")
+    )
+    with transaction.atomic():
+        DailyOrderStats.objects.all().delete()
+        DailyOrderStats.objects.bulk_create(
+            [DailyOrderStats(**row) for row in days], batch_size=1000
+        )
+    return DailyOrderStats.objects.count()
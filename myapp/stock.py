@@ -0,0 +1,87 @@
+from django.db.models import Case, F, PositiveBigIntegerField, Value, When
+
+
+# ================= RÉSERVATION DE STOCK =================
+# Le stock est décrémenté par un seul UPDATE conditionnel :
+#   UPDATE product SET quantity = quantity - n WHERE id = ... AND quantity >= n
+# La base arbitre seule les commandes concurrentes : pas de lecture
+# préalable, donc pas de survente possible entre lecture et écriture.
+# Pour un panier, toutes les lignes passent dans le même UPDATE
+# (CASE id WHEN ... THEN n END).
+#
+# Chaque variation est journalisée dans StockEvent, dans la même
+# transaction : commandes ici, enregistrements de Product par le signal
+# record_stock_change, imports et copies par leurs bulk_create.
+
+
+class InsufficientStock(ValueError):
+    def __init__(self, requested):
+        # {product_id: quantité demandée}
+        self.requested = dict(requested)
+        super().__init__(
+            "Stock insuffisant pour le(s) produit(s) "
+            + ", ".join(str(pk) for pk in self.requested)
+        )
+
+
+def reserve_many(quantities, commande=None):
+    """
+    Retire du stock toutes les quantités de `quantities` ({product_id: n})
+    pour `commande`, ou lève InsufficientStock si un seul produit manque.
+    Retourne les produits que la commande a épuisés.
+    À appeler dans la transaction qui enregistre la commande : l'exception
+    annule alors aussi les lignes déjà décrémentées.
+    """
+    from .models import Product, StockEvent
+
+    quantities = {pk: n for pk, n in quantities.items() if n}
+    if not quantities:
+        return set()
+
+    wanted = Case(
+        *[When(pk=pk, then=Value(n)) for pk, n in quantities.items()],
+        output_field=PositiveBigIntegerField(),
+    )
+    updated = (
+        Product.objects
+        .filter(pk__in=list(quantities), quantity__gte=wanted)
+        .update(quantity=F("quantity") - wanted)
+    )
+    if updated != len(quantities):
+        raise InsufficientStock(quantities)
+    record_movements({pk: -n for pk, n in quantities.items()}, StockEvent.ORDER, commande)
+    return set(Product.objects.filter(pk__in=list(quantities), quantity=0).values_list("pk", flat=True))
+
+
+def reserve(product_id, quantity):
+    reserve_many({product_id: quantity})
+
+
+def release_many(quantities, commande=None):
+    """Remet en stock les quantités {product_id: n} de `commande`, annulée."""
+    from .models import Product, StockEvent
+
+    quantities = {pk: n for pk, n in quantities.items() if n}
+    if not quantities:
+        return
+
+    returned = Case(
+        *[When(pk=pk, then=Value(n)) for pk, n in quantities.items()],
+        output_field=PositiveBigIntegerField(),
+    )
+    Product.objects.filter(pk__in=list(quantities)).update(quantity=F("quantity") + returned)
+    record_movements(quantities, StockEvent.CANCELLATION, commande)
+
+
+# ----------------- Journal -----------------
+def record_movements(deltas, source, commande=None, batch_size=1000):
+    """Journalise les variations {product_id: delta} ; les deltas nuls sont ignorés."""
+    from .models import StockEvent
+
+    StockEvent.objects.bulk_create(
+        [
+            StockEvent(product_id=pk, commande=commande, delta=delta, source=source)
+            for pk, delta in deltas.items() if delta
+        ],
+        batch_size=batch_size,
+    )
@@ -0,0 +1,228 @@
+import hashlib
+import posixpath
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import Storage, storages
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+
+# ================= MÉDIAS PAR EMPREINTE =================
+# Chaque fichier téléversé est rangé sous son empreinte SHA-256 :
+#   products/photo.jpg -> products/3f/3f9a...c2.jpg
+# Un même contenu n'est donc stocké qu'une fois, quel que soit le nombre
+# de produits (ou de copies de produits) qui l'utilisent. La table
+# MediaFile compte les références ; delete() ne fait que décrémenter et
+# la commande gc_media supprime ensuite les fichiers qui ne servent plus
+# (jamais pendant une requête : pas de course avec un envoi identique).
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _media_file_model():
+    return apps.get_model("myapp", "MediaFile")
+
+
+def file_digest(content):
+    """Empreinte et taille de `content` (un File Django), lu par morceaux."""
+    sha, size = hashlib.sha256(), 0
+    for chunk in content.chunks(CHUNK_SIZE):
+        sha.update(chunk)
+        size += len(chunk)
+    content.seek(0)
+    return sha.hexdigest(), size
+
+
+def hashed_name(name, digest):
+    directory, filename = posixpath.split(name)
+    extension = posixpath.splitext(filename)[1].lower()
+    return posixpath.join(directory, digest[:2], f"{digest}{extension}")
+
+
+@deconstructible(path="myapp.storage.ContentHashStorage")
+class ContentHashStorage(Storage):
+    """
+    Enveloppe d'un stockage existant (STORAGES["default"] par défaut) qui
+    déduplique par contenu et compte les références.
+    """
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+
+    @property
+    def inner(self):
+        return storages[self.alias]
+
+    # ----------------- Écriture -----------------
+    def get_available_name(self, name, max_length=None):
+        # Le nom définitif est l'empreinte, choisie dans _save()
+        return name
+
+    def _save(self, name, content):
+        digest, size = file_digest(content)
+        name = hashed_name(name, digest)
+        self.retain([name], sha256=digest, size=size)
+
+        if not self.inner.exists(name):
+            stored = self.inner.save(name, content)
+            if stored != name:
+                # Même contenu écrit au même moment par un autre envoi
+                self.inner.delete(stored)
+        return name
+
+    def retain(self, names, sha256="", size=0):
+        """Ajoute une référence à chacun des fichiers `names`."""
+        MediaFile = _media_file_model()
+        for name, count in Counter(n for n in names if n).items():
+            changes = {"refcount": F("refcount") + count}
+            if MediaFile.objects.filter(name=name).update(**changes):
+                continue
+            if not sha256:
+                # Fichier antérieur à ce stockage : non suivi
+                continue
+            try:
+                with transaction.atomic():
+                    MediaFile.objects.create(name=name, sha256=sha256, size=size, refcount=count)
+            except IntegrityError:
+                MediaFile.objects.filter(name=name).update(**changes)
+
+    def delete(self, name):
+        """Retire une référence ; le fichier reste jusqu'au passage de gc_media."""
+        _media_file_model().objects.filter(name=name, refcount__gt=0).update(
+            refcount=F("refcount") - 1
+        )
+
+    # ----------------- Lecture (délégation) -----------------
+    def _open(self, name, mode="rb"):
+        return self.inner.open(name, mode)
+
+    def exists(self, name):
+        return self.inner.exists(name)
+
+    def url(self, name):
+        return self.inner.url(name)
+
+    def size(self, name):
+        return self.inner.size(name)
+
+    def listdir(self, path):
+        return self.inner.listdir(path)
+
+    def path(self, name):
+        return self.inner.path(name)
+
+    def get_modified_time(self, name):
+        return self.inner.get_modified_time(name)
+
+
+media_storage = ContentHashStorage()
+
+
+def get_media_storage():
+    return media_storage
+
+
+# ----------------- Références et nettoyage -----------------
+def media_fields():
+    """(modèle, champ) de tous les FileField rangés dans le stockage par empreinte."""
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField) and isinstance(field.storage, ContentHashStorage):
+                yield model, field
+
+
+def iter_references():
+    """Noms de fichiers référencés par la base : images et tailles dérivées."""
+    from . import images
+
+    variant_fields = {
+        apps.get_model(label): variants_name
+        for label, (_, variants_name, _) in images.IMAGE_FIELDS.items()
+    }
+    for model, field in media_fields():
+        columns = [field.attname]
+        if model in variant_fields:
+            columns.append(variant_fields[model])
+        for row in model._default_manager.exclude(**{field.attname: ""}).values_list(*columns).iterator():
+            if row[0]:
+                yield row[0]
+            if len(row) > 1:
+                yield from images.variant_paths(row[1])
+
+
+def recount():
+    """Recalcule les compteurs depuis les références réelles. Retourne le nombre de lignes corrigées."""
+    MediaFile = _media_file_model()
+    references = Counter(iter_references())
+    fixed = []
+    for media in MediaFile.objects.only("pk", "name", "refcount").iterator():
+        if media.refcount != references.get(media.name, 0):
+            media.refcount = references.get(media.name, 0)
+            fixed.append(media)
+    MediaFile.objects.bulk_update(fixed, ["refcount"], batch_size=500)
+    return len(fixed)
+
+
+def _walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for sub in directories:
+        yield from _walk(storage, posixpath.join(directory, sub))
+
+
+def untracked_orphans(grace):
+    """
+    Fichiers des dossiers de téléversement ni suivis ni référencés
+    (anciens doublons du type photo_fWONohw.jpg).
+    """
+    MediaFile = _media_file_model()
+    inner = media_storage.inner
+    referenced = set(iter_references())
+    limit = timezone.now() - grace
+    directories = {"variants"} | {
+        str(field.upload_to).strip("/") for _, field in media_fields() if isinstance(field.upload_to, str)
+    }
+    for directory in sorted(d for d in directories if d):
+        if not inner.exists(directory):
+            continue
+        names = [
+            name for name in _walk(inner, directory)
+            # Fichier récent : peut-être écrit par une transaction encore en cours
+            if name not in referenced and inner.get_modified_time(name) < limit
+        ]
+        tracked = set(MediaFile.objects.filter(name__in=names).values_list("name", flat=True))
+        yield from (name for name in names if name not in tracked)
+
+
+def collect_garbage(grace=timedelta(hours=1), untracked=False, dry_run=False):
+    """
+    Supprime les fichiers sans référence depuis plus de `grace`. Retourne
+    la liste des noms supprimés (ou qui le seraient avec dry_run).
+    """
+    MediaFile = _media_file_model()
+    inner = media_storage.inner
+    removed = []
+
+    orphans = MediaFile.objects.filter(refcount=0, created_at__lt=timezone.now() - grace)
+    for media in orphans.only("pk", "name").iterator():
+        removed.append(media.name)
+        if dry_run:
+            continue
+        # Revérifié au moment de supprimer : un envoi a pu le réutiliser.
+        # Le fichier part dans la même transaction que la ligne, un envoi
+        # identique attend donc la fin et réécrit le fichier.
+        with transaction.atomic():
+            if MediaFile.objects.filter(pk=media.pk, refcount=0).delete()[0]:
+                inner.delete(media.name)
+
+    if untracked:
+        for name in untracked_orphans(grace):
+            removed.append(name)
+            if not dry_run:
+                inner.delete(name)
+    return removed
@@ -0,0 +1,51 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+@register.filter
+def variant(field_file, name):
+    """
+    URL de la taille `name` d'une image ("thumbnail", "card", "hero").
+    Tant que le dérivé n'est pas prêt, l'original est servi.
+    Usage : {{ product.image|variant:"card" }}
+    """
+    if not field_file:
+        return ""
+    variants = getattr(field_file.instance, f"{field_file.field.name}_variants", None) or {}
+    if variants.get("source") == field_file.name and variants.get(name):
+        return field_file.storage.url(variants[name])
+    return field_file.url
+
+
+@register.simple_tag
+def responsive_image(field_file, sizes="100vw", fallback="card", **attrs):
+    """
+    Balise <picture> avec une <source> srcset par format moderne (AVIF, WebP)
+    et la taille `fallback` en <img> pour les navigateurs plus anciens.
+    Usage : {% responsive_image product.image sizes="(max-width: 768px) 50vw, 25vw" class="card-img-top" %}
+    """
+    if not field_file:
+        return ""
+    attrs.setdefault("loading", "lazy")
+    img = format_html(
+        '<img src="{}"{}>',
+        variant(field_file, fallback),
+        format_html_join("", ' {}="{}"', attrs.items()),
+    )
+
+    variants = getattr(field_file.instance, f"{field_file.field.name}_variants", None) or {}
+    if variants.get("source") != field_file.name or not variants.get("responsive"):
+        return img
+
+    url = field_file.storage.url
+    sources = format_html_join(
+        "",
+        '<source type="image/{}" srcset="{}" sizes="{}">',
+        (
+            (fmt, ", ".join(f"{url(path)} {width}w" for width, path in files), sizes)
+            for fmt, files in variants["responsive"].items()
+        ),
+    )
+    return format_html("<picture>{}{}</picture>", sources, img)
@@ -1,3 +1,1346 @@
-from django.test import TestCase
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+import shutil
+import tempfile
+import threading
+import zipfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    benchmarks, bulk, caching, copurchase, facets, images, invoices, ledger, metrics, product_io, recommendations,
+    restock, routers, search, seeding, stats, storage,
+)
+from .models import (
+    Category, Commande, CommandeLine, CoPurchase, CoPurchaseRun, DailyOrderStats, HomePage, HomeSlide, MediaFile, Product,
+    ProductImportJob, SimilarProduct, Slide, StockAlertRun, StockEvent, StockSnapshot, Supplier, SupplierDetail,
+)
+from .pagination import keyset_page
+from .search import search_products
+from .orders import cancel_orders, place_order
+from .stock import InsufficientStock
+
+
+class CataloguePaginationTests(TestCase):
+    def setUp(self):
+        for i in range(7):
+            Product.objects.create(name=f"Produit {i}", price=1000, quantity=3)
+        Product.objects.create(name="Épuisé", price=1000, quantity=0)
+
+    def test_keyset_walks_whole_catalogue_once(self):
+        seen = []
+        cursor = None
+        while True:
+            items, cursor = keyset_page(Product.objects.filter(quantity__gt=0), cursor, size=3)
+            seen.extend(p.pk for p in items)
+            if cursor is None:
+                break
+        expected = list(
+            Product.objects.filter(quantity__gt=0)
+            .order_by("-created_at", "-id")
+            .values_list("pk", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_restarts_from_first_page(self):
+        first, _ = keyset_page(Product.objects.all(), None, size=3)
+        items, _ = keyset_page(Product.objects.all(), "pas-un-curseur", size=3)
+        self.assertEqual(items, first)
+
+    def test_products_endpoint_returns_fragment_and_cursor(self):
+        response = self.client.get(reverse("home_products"))
+        data = response.json()
+        self.assertIn("Produit 6", data["html"])
+        self.assertNotIn("Épuisé", data["html"])
+
+    def test_home_grid_has_id_targeted_by_infinite_scroll(self):
+        cache.clear()
+        for i in range(7, 30):
+            Product.objects.create(name=f"Produit {i}", price=1000, quantity=3)
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, "getElementById('product-grid')")
+        self.assertContains(response, 'id="product-grid"')
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.ecouteurs = Product.objects.create(
+            name="Écouteurs AirPods Pro", price=150000, quantity=4,
+            description="Réduction de bruit active",
+        )
+        self.clavier = Product.objects.create(
+            name="Clavier mécanique RGB", price=45000, quantity=2,
+            description="Compatible avec les écouteurs filaires",
+        )
+        Product.objects.create(name="Souris sans fil", price=9000, quantity=5)
+
+    def search(self, query):
+        return list(search_products(Product.objects.all(), query).order_by("-search_rank"))
+
+    def test_accent_folding_and_prefix(self):
+        self.assertEqual(self.search("ecout"), [self.ecouteurs, self.clavier])
+        self.assertEqual(self.search("MECANIQUE"), [self.clavier])
+
+    def test_name_match_ranks_above_description_match(self):
+        self.assertEqual(self.search("écouteurs")[0], self.ecouteurs)
+
+    def test_index_follows_save_and_delete(self):
+        self.clavier.name = "Clavier gamer"
+        self.clavier.save()
+        self.assertEqual(self.search("gamer"), [self.clavier])
+        self.clavier.delete()
+        self.assertEqual(self.search("gamer"), [])
+
+    def test_failed_rebuild_leaves_the_previous_index(self):
+        self.assertEqual(search.rebuild_index(), 3)
+        with mock.patch.object(search, "index_products", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                search.rebuild_index()
+        self.assertEqual(self.search("ecout"), [self.ecouteurs, self.clavier])
+
+    def test_home_search_is_paginated_by_rank(self):
+        response = self.client.get(reverse("home_products"), {"q": "ecouteurs"})
+        html = response.json()["html"]
+        self.assertLess(html.index("AirPods"), html.index("Clavier"))
+
+
+# Produits similaires calculés sur place dans les tests qui exécutent les
+# callbacks on_commit : pas de thread qui écrirait dans la base de test
+# pendant la transaction d'un test
+similar_products_inline = override_settings(SIMILAR_PRODUCTS_INLINE=True)
+
+
+def make_commande():
+    return Commande(
+        customer_name="Client", customer_email="client@example.com",
+        customer_phone="0700000000", customer_address="Abidjan", payment="LIVRAISON",
+    )
+
+
+CUSTOMER = {
+    "payment": "WAVE", "customer_name": "Client", "customer_email": "client@example.com",
+    "customer_phone": "0700000000", "customer_address": "Abidjan",
+}
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Clavier", price=45000, quantity=3)
+
+    def test_order_decrements_stock(self):
+        place_order(make_commande(), [(self.product, 2)])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 1)
+
+    def test_short_stock_rejects_order_without_writing(self):
+        with self.assertRaises(InsufficientStock):
+            place_order(make_commande(), [(self.product, 4)])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 3)
+        self.assertFalse(Commande.objects.exists())
+
+    def test_view_reports_short_stock_on_form(self):
+        response = self.client.post(
+            reverse("commande", args=[self.product.id]), {"quantity": 5, **CUSTOMER}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].non_field_errors())
+        self.assertFalse(Commande.objects.exists())
+
+
+class MultiLineOrderTests(TestCase):
+    def setUp(self):
+        self.clavier = Product.objects.create(name="Clavier", price=45000, quantity=3)
+        self.souris = Product.objects.create(name="Souris", price=9000, quantity=10)
+
+    def test_cart_add_requires_csrf_token_from_cookie_endpoint(self):
+        client = Client(enforce_csrf_checks=True)
+        url = reverse("cart_add", args=[self.clavier.id])
+        self.assertEqual(client.post(url, {"quantity": 1}).status_code, 403)
+
+        self.assertEqual(client.get(reverse("csrf_cookie")).status_code, 204)
+        token = client.cookies[settings.CSRF_COOKIE_NAME].value
+        response = client.post(url, {"quantity": 1, "csrfmiddlewaretoken": token})
+        self.assertRedirects(response, reverse("cart"), fetch_redirect_response=False)
+        self.assertEqual(client.session["cart"], {str(self.clavier.id): 1})
+
+    def test_cart_checkout_creates_one_order_with_lines(self):
+        self.client.post(reverse("cart_add", args=[self.clavier.id]), {"quantity": 2})
+        self.client.post(reverse("cart_add", args=[self.souris.id]), {"quantity": 3})
+
+        DailyOrderStats.objects.create(day=timezone.localdate())
+        with self.assertNumQueries(13):
+            # session, produits du panier, INSERT commande, statistiques du jour, UPDATE du
+            # stock, son journal et les produits épuisés, bulk_create des lignes, session vidée
+            # (+ 4 savepoints)
+            response = self.client.post(reverse("cart"), CUSTOMER)
+
+        commande = Commande.objects.get()
+        self.assertRedirects(response, reverse("commande_confirmation", args=[commande.id]))
+        self.assertEqual(commande.total_amount, 2 * 45000 + 3 * 9000)
+        self.assertEqual(
+            sorted((line.product.name, line.quantity) for line in commande.lines.all()),
+            [("Clavier", 2), ("Souris", 3)],
+        )
+        self.clavier.refresh_from_db()
+        self.souris.refresh_from_db()
+        self.assertEqual((self.clavier.quantity, self.souris.quantity), (1, 7))
+
+    def test_one_short_line_rejects_whole_cart(self):
+        with self.assertRaises(InsufficientStock):
+            place_order(make_commande(), [(self.clavier, 4), (self.souris, 1)])
+        self.souris.refresh_from_db()
+        self.assertEqual(self.souris.quantity, 10)
+        self.assertFalse(Commande.objects.exists())
+
+    def test_order_keeps_name_and_price_snapshot(self):
+        commande = place_order(make_commande(), [(self.clavier, 1)])
+        Product.objects.filter(pk=self.clavier.pk).update(name="Clavier v2", price=1)
+        self.clavier.delete()
+
+        commande = Commande.objects.prefetch_related("lines").get(pk=commande.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(commande.products_summary, "Clavier × 1")
+            self.assertEqual(commande.lines.all()[0].line_total, 45000)
+        self.assertIsNone(commande.lines.get().product_id)
+
+
+@similar_products_inline
+class ConcurrentStockReservationTests(TransactionTestCase):
+    stock = 10
+    buyers = 25
+
+    # Pas de rendu de facture en arrière-plan pendant le test
+    @mock.patch.object(invoices, "schedule_invoice")
+    def test_parallel_orders_never_oversell(self, schedule_invoice):
+        product = Product.objects.create(name="Écouteurs", price=150000, quantity=self.stock)
+        barrier = threading.Barrier(self.buyers)
+        results = []
+
+        def buy():
+            barrier.wait()
+            try:
+                place_order(make_commande(), [(product, 1)])
+                results.append("ok")
+            except InsufficientStock:
+                results.append("refused")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(self.buyers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(results.count("ok"), self.stock)
+        self.assertEqual(results.count("refused"), self.buyers - self.stock)
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(Commande.objects.count(), self.stock)
+
+
+class DatabaseConfigurationTests(TestCase):
+    @skipUnless(connection.vendor == "sqlite", "SQLite uniquement")
+    def test_sqlite_runs_in_wal_mode(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+
+    @skipUnless(connection.vendor == "postgresql", "PostgreSQL uniquement")
+    def test_postgresql_connections_are_reused(self):
+        settings_dict = connection.settings_dict
+        self.assertTrue(settings_dict["CONN_HEALTH_CHECKS"])
+        self.assertTrue(settings_dict["OPTIONS"].get("pool") or settings_dict["CONN_MAX_AGE"])
+
+
+@similar_products_inline
+class StorefrontCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.home = HomePage.objects.create(
+            site_name="MyShop", logo="logos/logo.png", welcome_titre="Bienvenue",
+            action1_message="a", action1_lien="#", action2_message="b", action2_lien="#",
+        )
+        self.product = Product.objects.create(name="Clavier", price=45000, quantity=3)
+
+    def test_second_anonymous_hit_runs_no_query(self):
+        self.client.get(reverse("home"), {"q": "clavier"})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("home"), {"q": "clavier"})
+        self.assertContains(response, "Clavier")
+
+    def test_admin_edits_invalidate_cached_page(self):
+        self.client.get(reverse("home"))
+        self.home.site_name = "MyShop CI"
+        self.home.save()
+        HomeSlide.objects.create(title="Soldes d'hiver", message="-50%")
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, "MyShop CI")
+        self.assertContains(response, "Soldes d&#x27;hiver")
+
+    def test_order_invalidates_displayed_stock(self):
+        self.client.get(reverse("home"))
+        with mock.patch.object(invoices, "schedule_invoice"):
+            with self.captureOnCommitCallbacks(execute=True):
+                place_order(make_commande(), [(self.product, 2)])
+            # Toujours en stock : la page en cache reste valable
+            with self.assertNumQueries(0):
+                self.assertContains(self.client.get(reverse("home")), "Clavier")
+
+            with self.captureOnCommitCallbacks(execute=True):
+                place_order(make_commande(), [(self.product, 1)])
+        self.assertNotContains(self.client.get(reverse("home")), "Clavier")
+
+
+class InvoiceCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        patcher = mock.patch.object(invoices, "CACHE_DIR", self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        product = Product.objects.create(name="Clavier", price=45000, quantity=3)
+        self.commande = place_order(make_commande(), [(product, 1)])
+        self.url = reverse("generate_pdf", args=[self.commande.id])
+
+    def test_pdf_is_rendered_once_then_served_from_disk(self):
+        with mock.patch.object(invoices, "render_invoice", wraps=invoices.render_invoice) as render:
+            first = self.client.get(self.url)
+            second = self.client.get(self.url)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first["Content-Type"], "application/pdf")
+        self.assertEqual(b"".join(first.streaming_content), b"".join(second.streaming_content))
+
+    def test_matching_etag_returns_304(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_modified_order_gets_a_new_invoice(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.commande.customer_address = "Yamoussoukro"
+        self.commande.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+
+class InvoiceExportTests(TestCase):
+    def setUp(self):
+        product = Product.objects.create(name="Clavier", price=45000, quantity=20)
+        self.commandes = [place_order(make_commande(), [(product, 1)]) for _ in range(3)]
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+
+    def export(self, action):
+        response = self.client.post(reverse("admin:myapp_commande_changelist"), {
+            "action": action,
+            "_selected_action": [c.pk for c in self.commandes],
+        })
+        return b"".join(response.streaming_content)
+
+    def test_zip_export_holds_one_pdf_per_order(self):
+        archive = zipfile.ZipFile(BytesIO(self.export("export_invoices_zip")))
+        self.assertEqual(
+            sorted(archive.namelist()),
+            sorted(f"commande_{c.pk}.pdf" for c in self.commandes),
+        )
+        self.assertTrue(all(archive.read(name).startswith(b"%PDF") for name in archive.namelist()))
+
+    def test_pdf_export_is_one_document(self):
+        content = self.export("export_invoices_pdf")
+        self.assertTrue(content.startswith(b"%PDF"))
+        self.assertEqual(content.count(b"/Type /Page\n"), 3)
+
+    def test_large_pdf_export_falls_back_to_zip(self):
+        with mock.patch.object(invoices, "PDF_EXPORT_LIMIT", 2):
+            archive = zipfile.ZipFile(BytesIO(self.export("export_invoices_pdf")))
+        self.assertEqual(len(archive.namelist()), 3)
+
+    def test_command_refuses_large_pdf_export(self):
+        output = os.path.join(tempfile.mkdtemp(), "commandes.pdf")
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        with mock.patch.object(invoices, "PDF_EXPORT_LIMIT", 2):
+            with self.assertRaisesMessage(CommandError, "--format zip"):
+                call_command("export_invoices", output, "--format", "pdf", stdout=StringIO())
+        self.assertFalse(os.path.exists(output))
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Le nombre de requêtes d'une liste admin ne dépend pas du nombre de lignes."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        self.rows = 0
+
+    def add_rows(self, count):
+        for _ in range(count):
+            self.rows += 1
+            supplier = Supplier.objects.create(name=f"Fournisseur {self.rows}", phone="0700")
+            SupplierDetail.objects.create(supplier=supplier, contact_email="f@example.com")
+            category = Category.objects.create(name=f"Catégorie {self.rows}")
+            product = Product.objects.create(
+                name=f"Produit {self.rows}", price=1000, quantity=50, supplier=supplier
+            )
+            product.categories.add(category)
+            place_order(make_commande(), [(product, 1)])
+
+    def count_queries(self, model):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f"admin:myapp_{model}_changelist"))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_run_constant_queries(self):
+        models = ["product", "category", "commande", "supplier", "supplierdetail"]
+        self.add_rows(2)
+        small = {model: self.count_queries(model) for model in models}
+        self.add_rows(3)
+        large = {model: self.count_queries(model) for model in models}
+        self.assertEqual(small, large)
+
+
+class BulkProductActionTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        self.category = Category.objects.create(name="Informatique")
+        self.products = []
+        for i in range(5):
+            product = Product.objects.create(name=f"Clavier {i}", price="1000.00", quantity=2)
+            product.categories.add(self.category)
+            self.products.append(product)
+
+    def run_action(self, action, **extra):
+        return self.client.post(reverse("admin:myapp_product_changelist"), {
+            "action": action,
+            "_selected_action": [p.pk for p in self.products],
+            **extra,
+        })
+
+    def prices(self):
+        return sorted(set(Product.objects.values_list("price", flat=True)))
+
+    def test_discount_is_one_update_per_chunk(self):
+        with CaptureQueriesContext(connection) as queries:
+            bulk.adjust_prices(Product.objects.all(), bulk.PERCENT, -10, chunk_size=2)
+        updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(self.prices(), [Decimal("900.00")])
+
+    def test_adjust_prices_action_with_fixed_amount(self):
+        response = self.run_action("adjust_prices")
+        self.assertContains(response, "Ajuster les prix")
+        self.run_action("adjust_prices", apply="1", mode="fixed", value="-1500")
+        self.assertEqual(self.prices(), [Decimal("0.00")])
+
+    def test_duplicate_copies_categories_and_search_index(self):
+        self.run_action("duplicate_product")
+        self.assertEqual(Product.objects.count(), 10)
+        self.assertEqual(self.category.products.count(), 10)
+        self.assertEqual(len(search_products(Product.objects.all(), "clavier")), 10)
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Clavier", price=45000, quantity=50)
+
+    def snapshot(self):
+        return list(DailyOrderStats.objects.values_list("day", "orders_total", "orders_delivered"))
+
+    def test_incremental_stats_match_rebuild(self):
+        commandes = [place_order(make_commande(), [(self.product, 1)]) for _ in range(4)]
+        delivered = Commande.objects.get(pk=commandes[0].pk)
+        delivered.is_delivered = True
+        delivered.save()
+        delivered.save()
+        commandes[1].delete()
+
+        incremental = self.snapshot()
+        stats.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+        summary = stats.dashboard_stats()
+        self.assertEqual((summary["orders_delivered"], summary["orders_pending"]), (1, 2))
+
+    def test_cancelled_order_kept_out_of_stats(self):
+        commandes = [place_order(make_commande(), [(self.product, 2)]) for _ in range(3)]
+        self.assertEqual(cancel_orders(Commande.objects.filter(pk=commandes[0].pk)), 1)
+        # Déjà annulée : rien à refaire
+        self.assertEqual(cancel_orders(Commande.objects.filter(pk=commandes[0].pk)), 0)
+
+        cancelled = Commande.objects.get(pk=commandes[0].pk)
+        self.assertEqual((cancelled.status, cancelled.lines.count()), ("Annulée", 1))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 46)
+        # Livraison cochée par erreur, puis suppression : toujours hors des statistiques
+        cancelled.is_delivered = True
+        cancelled.save()
+        cancelled.delete()
+
+        incremental = self.snapshot()
+        stats.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+        summary = stats.dashboard_stats()
+        self.assertEqual((summary["orders_delivered"], summary["orders_pending"]), (0, 2))
+
+    def test_dashboard_reads_order_stats_in_one_query(self):
+        place_order(make_commande(), [(self.product, 1)])
+        with self.assertNumQueries(1):
+            stats.dashboard_stats()
+
+    def test_dashboard_renders(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        place_order(make_commande(), [(self.product, 1)])
+        response = self.client.get(reverse("admin:dashboard"))
+        self.assertEqual(response.context["orders_pending"], 1)
+
+    def test_products_count_cached_until_catalogue_changes(self):
+        cache.clear()
+        self.assertEqual(stats.products_count(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(stats.products_count(), 1)
+        Product.objects.create(name="Souris", price=9000, quantity=5)
+        self.assertEqual(stats.products_count(), 2)
+
+
+def make_image(name="photo.jpg", size=(1600, 1200), color="navy"):
+    from PIL import Image
+
+    out = BytesIO()
+    Image.new("RGB", size, color).save(out, "JPEG")
+    return SimpleUploadedFile(name, out.getvalue(), content_type="image/jpeg")
+
+
+@similar_products_inline
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # Le pool est remplacé par un appel direct : même connexion que le test
+        patcher = mock.patch.object(images, "_executor")
+        executor = patcher.start()
+        executor.submit.side_effect = lambda fn, *args: images.process_image(*args)
+        self.addCleanup(patcher.stop)
+        self.submit = executor.submit
+
+    def save(self, instance):
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+        instance.refresh_from_db()
+        return instance
+
+    def test_variants_are_generated_after_save(self):
+        from PIL import Image
+
+        product = self.save(Product(name="Clavier", price=45000, image=make_image()))
+        variants = product.image_variants
+        self.assertEqual(variants["source"], product.image.name)
+        for name, (width, height) in images.VARIANTS.items():
+            with product.image.storage.open(variants[name]) as variant:
+                size = Image.open(variant).size
+            self.assertLessEqual(size[0], width)
+            self.assertLessEqual(size[1], height)
+
+        html = Template('{% load image_variants %}{{ product.image|variant:"card" }}').render(
+            Context({"product": product})
+        )
+        self.assertEqual(html, product.image.storage.url(variants["card"]))
+
+    def test_unchanged_image_is_not_reprocessed(self):
+        product = self.save(Product(name="Clavier", price=45000, image=make_image()))
+        product.price = 40000
+        self.save(product)
+        self.assertEqual(self.submit.call_count, 1)
+
+    def test_replaced_image_drops_old_variants(self):
+        slide = self.save(Slide(title="Soldes", image=make_image("soldes.jpg")))
+        old = slide.image_variants
+        storage = slide.image.storage
+
+        slide.image = make_image("rentree.jpg", color="orange")
+        slide = self.save(slide)
+        self.assertNotEqual(slide.image_variants["hero"], old["hero"])
+        # Plus référencées : supprimées au prochain passage de gc_media
+        self.assertEqual(MediaFile.objects.get(name=old["hero"]).refcount, 0)
+        self.assertEqual(MediaFile.objects.get(name=old["source"]).refcount, 0)
+
+        # Une tâche en retard sur l'ancienne image ne doit rien écraser
+        self.assertIsNone(images.process_image("myapp.Slide", slide.pk, old["source"]))
+        slide.refresh_from_db()
+        self.assertEqual(slide.image_variants["source"], slide.image.name)
+
+    def test_image_replaced_before_its_variants_is_released(self):
+        slide = Slide.objects.create(title="Soldes", image=make_image("soldes.jpg"))
+        pending = slide.image.name
+        # Dérivés jamais générés (tâche en attente ou en échec)
+        self.assertEqual(slide.image_variants, {})
+
+        slide = Slide.objects.get(pk=slide.pk)
+        slide.image = make_image("rentree.jpg", color="orange")
+        self.save(slide)
+        self.assertEqual(MediaFile.objects.get(name=pending).refcount, 0)
+        self.assertEqual(MediaFile.objects.get(name=slide.image.name).refcount, 1)
+
+        slide.image = None
+        self.save(slide)
+        self.assertEqual(MediaFile.objects.filter(refcount__gt=0).count(), 0)
+
+    def test_responsive_variants_render_srcset(self):
+        product = self.save(Product(name="Clavier", price=45000, image=make_image()))
+        responsive = product.image_variants["responsive"]
+        self.assertEqual(set(responsive), set(images.available_formats()))
+        self.assertEqual([width for width, _ in responsive["webp"]], [320, 640, 960, 1280])
+
+        html = Template(
+            '{% load image_variants %}'
+            '{% responsive_image product.image sizes="50vw" class="card-img-top" %}'
+        ).render(Context({"product": product}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(f'{product.image.storage.url(responsive["webp"][0][1])} 320w', html)
+        self.assertIn('sizes="50vw"', html)
+        self.assertIn('class="card-img-top"', html)
+
+    def test_small_image_is_not_upscaled(self):
+        product = self.save(Product(name="Souris", price=9000, image=make_image(size=(500, 500))))
+        self.assertEqual([w for w, _ in product.image_variants["responsive"]["webp"]], [320, 500])
+
+    def test_pending_variant_falls_back_to_original(self):
+        product = Product(name="Clavier", price=45000, image=make_image())
+        product.image.name = "products/photo.jpg"
+        html = Template('{% load image_variants %}{{ product.image|variant:"card" }}').render(
+            Context({"product": product})
+        )
+        self.assertEqual(html, product.image.url)
+
+        html = Template('{% load image_variants %}{% responsive_image product.image %}').render(
+            Context({"product": product})
+        )
+        self.assertNotIn("<picture>", html)
+        self.assertIn(product.image.url, html)
+
+
+@similar_products_inline
+class MediaStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Pas de tailles dérivées ici : seul l'original compte
+        patcher = mock.patch.object(images, "schedule_variants")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def files_on_disk(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        first = Product.objects.create(name="MacBook Air", price=900000, image=make_image("MacBook_Air_M2b.jpg"))
+        second = Product.objects.create(name="MacBook Air bis", price=900000, image=make_image("MacBook_Air_M2b.jpg"))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith("products/"))
+        self.assertEqual(len(self.files_on_disk()), 1)
+        self.assertEqual(MediaFile.objects.get(name=first.image.name).refcount, 2)
+
+    def test_duplicates_hold_a_reference_until_deleted(self):
+        original = Product.objects.create(name="Casque", price=250000, image=make_image())
+        bulk.duplicate_products(Product.objects.filter(pk=original.pk))
+        media = MediaFile.objects.get(name=original.image.name)
+        self.assertEqual(media.refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=original.pk).delete()
+        self.assertEqual(storage.collect_garbage(grace=timedelta(0)), [])
+        self.assertEqual(len(self.files_on_disk()), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.all().delete()
+        self.assertEqual(storage.collect_garbage(grace=timedelta(0)), [media.name])
+        self.assertEqual(self.files_on_disk(), [])
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_recount_and_untracked_orphans(self):
+        product = Product.objects.create(name="Souris", price=9000, image=make_image())
+        MediaFile.objects.update(refcount=7)
+        self.assertEqual(storage.recount(), 1)
+        self.assertEqual(MediaFile.objects.get().refcount, 1)
+
+        # Ancien doublon déposé avant le stockage par empreinte
+        os.makedirs(os.path.join(self.media_root, "products"), exist_ok=True)
+        with open(os.path.join(self.media_root, "products", "souris_fWONohw.jpg"), "wb") as legacy:
+            legacy.write(b"x")
+        removed = storage.collect_garbage(grace=timedelta(0), untracked=True)
+        self.assertEqual(removed, ["products/souris_fWONohw.jpg"])
+        self.assertEqual(self.files_on_disk(), [product.image.name])
+
+
+@similar_products_inline
+class ProductImportExportTests(TestCase):
+    CATALOGUE = (
+        "reference;name;price;quantity;supplier;categories\n"
+        "KB-1;Clavier;45 000,00;10;Logitech;Informatique|Accessoires\n"
+        "MS-1;Souris;9000;25;logitech;Accessoires\n"
+        "HP-1;Casque;120000;3;Sony;\n"
+        "XX-1;Sans prix;;1;;\n"
+        ";Sans référence;1000;1;;\n"
+    )
+
+    def import_text(self, text, filename="produits.csv", chunk_size=2):
+        return product_io.import_products(BytesIO(text.encode()), filename, chunk_size=chunk_size)
+
+    def test_import_creates_products_and_resolves_names(self):
+        result = self.import_text(self.CATALOGUE)
+        self.assertEqual((result["processed"], result["created"], result["updated"]), (5, 3, 0))
+        self.assertEqual([line for line, _ in result["errors"]], [5, 6])
+
+        keyboard = Product.objects.get(reference="KB-1")
+        self.assertEqual(keyboard.price, Decimal("45000.00"))
+        self.assertEqual(keyboard.supplier.name, "Logitech")
+        self.assertEqual(sorted(c.name for c in keyboard.categories.all()), ["Accessoires", "Informatique"])
+        # Noms résolus sans tenir compte de la casse : pas de doublon
+        self.assertEqual(Supplier.objects.count(), 2)
+        self.assertEqual(Category.objects.count(), 2)
+        self.assertEqual(list(search_products(Product.objects.all(), "clavier")), [keyboard])
+
+    def test_price_list_updates_only_prices(self):
+        self.import_text(self.CATALOGUE)
+        result = self.import_text("reference,price\nKB-1,39000\nMS-1,8500\nNEW-1,10\n")
+        self.assertEqual((result["created"], result["updated"]), (0, 2))
+        self.assertEqual(result["errors"], [(4, "nom obligatoire pour un nouveau produit")])
+
+        keyboard = Product.objects.get(reference="KB-1")
+        self.assertEqual((keyboard.name, keyboard.price, keyboard.quantity), ("Clavier", Decimal("39000.00"), 10))
+        self.assertEqual(keyboard.categories.count(), 2)
+
+    def test_export_round_trip(self):
+        self.import_text(self.CATALOGUE)
+        exported = "".join(product_io.iter_products_csv(Product.objects.all()))
+        result = self.import_text(exported)
+        self.assertEqual((result["created"], result["updated"], result["error_count"]), (0, 3, 0))
+
+    @skipUnless(product_io.xlsx_supported(), "openpyxl non installé")
+    def test_xlsx_round_trip(self):
+        self.import_text(self.CATALOGUE)
+        exported = b"".join(product_io.iter_products_xlsx(Product.objects.all()))
+        result = product_io.import_products(BytesIO(exported), "produits.xlsx")
+        self.assertEqual((result["created"], result["updated"]), (0, 3))
+
+    def test_missing_reference_column_is_rejected(self):
+        with self.assertRaises(product_io.ImportFormatError):
+            self.import_text("name;price\nClavier;1000\n")
+
+    def test_admin_import_runs_in_background_job(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        import_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, import_dir)
+
+        with mock.patch.object(product_io, "IMPORT_DIR", import_dir), \
+                mock.patch.object(product_io, "_executor") as executor, \
+                self.captureOnCommitCallbacks(execute=True):
+            executor.submit.side_effect = lambda fn, job_id: product_io.run_job(job_id)
+            upload = SimpleUploadedFile("produits.csv", self.CATALOGUE.encode())
+            response = self.client.post(reverse("admin:myapp_product_import"), {"file": upload})
+
+        job = ProductImportJob.objects.get()
+        self.assertRedirects(response, reverse("admin:myapp_product_import_status", args=[job.pk]))
+        self.assertEqual((job.status, job.rows_created, job.error_count), (ProductImportJob.DONE, 3, 2))
+        self.assertEqual(os.listdir(import_dir), [])
+
+        response = self.client.get(reverse("admin:myapp_product_export", args=["csv"]))
+        lines = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(lines), 4)
+
+
+class QueryIndexTests(TestCase):
+    def setUp(self):
+        product = Product.objects.create(name="Clavier", price=45000, quantity=50)
+        for _ in range(3):
+            place_order(make_commande(), [(product, 1)])
+
+    @skipUnlessDBFeature("supports_partial_indexes")
+    def test_access_paths_use_the_new_indexes(self):
+        plans = {name: result["plan"] for name, result in benchmarks.measure(repeat=1).items()}
+        self.assertIn("product_in_stock_idx", plans["catalogue_accueil"])
+        self.assertIn("commande_payment_idx", plans["admin_commandes_par_paiement"])
+        self.assertIn("commande_pending_idx", plans["admin_commandes_a_livrer"])
+
+    def test_comparison_leaves_indexes_in_place(self):
+        results = benchmarks.compare(repeat=1)
+        self.assertNotIn("product_in_stock_idx", results["catalogue_accueil"]["without"]["plan"])
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(cursor, Product._meta.db_table)
+        self.assertIn("product_in_stock_idx", indexes)
+
+
+class SeedAndLoadBenchmarkTests(TestCase):
+    VOLUMES = dict(categories=3, suppliers=2, products=30, orders=40, batch_size=16)
+
+    def test_seed_is_reproducible(self):
+        created = seeding.seed(**self.VOLUMES)
+        self.assertEqual(
+            (created["products"], created["orders"], Commande.objects.count()), (30, 40, 40)
+        )
+        first = list(Product.objects.order_by("reference").values_list("name", "price", "quantity"))
+        totals = list(Commande.objects.order_by("customer_email").values_list("total_amount", flat=True))
+
+        self.assertEqual(seeding.clear(), (40, 30))
+        self.assertFalse(CommandeLine.objects.exists())
+        seeding.seed(**self.VOLUMES)
+        self.assertEqual(
+            list(Product.objects.order_by("reference").values_list("name", "price", "quantity")), first
+        )
+        self.assertEqual(
+            list(Commande.objects.order_by("customer_email").values_list("total_amount", flat=True)), totals
+        )
+
+    def test_suite_rolls_back_and_flags_regressions(self):
+        seeding.seed(**self.VOLUMES)
+        orders = Commande.objects.count()
+        results = benchmarks.run_suite(iterations=2, names=["home", "search", "commande_post"])
+
+        self.assertEqual(set(results), {"home", "search", "commande_post"})
+        self.assertEqual(Commande.objects.count(), orders)
+        self.assertFalse(User.objects.exists())
+        self.assertLessEqual(results["home"]["p50"], results["home"]["p99"])
+
+        baseline = {name: dict(result, p95=result["p95"] * 10) for name, result in results.items()}
+        self.assertEqual(benchmarks.regressions(results, baseline), [])
+        baseline["home"]["queries"] -= 1
+        self.assertEqual(len(benchmarks.regressions(results, baseline)), 1)
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1, METRICS_TOKEN="secret")
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        Product.objects.create(name="Clavier", price=45000, quantity=5)
+
+    def test_sampled_request_is_recorded_by_route(self):
+        self.client.get(reverse("home"))
+        routes = dict(metrics.summary())
+        home = routes["home"]
+        self.assertEqual(home["total_ms"]["count"], 1)
+        self.assertGreater(home["queries"]["mean"], 0)
+        self.assertGreater(home["render_ms"]["mean"], 0)
+        self.assertLessEqual(home["sql_ms"]["mean"], home["total_ms"]["mean"])
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        self.client.get(reverse("home"))
+        self.assertEqual(metrics.summary(), [])
+
+    def test_prometheus_endpoint_requires_staff_or_token(self):
+        self.client.get(reverse("home"))
+        self.assertEqual(self.client.get(reverse("prometheus_metrics")).status_code, 403)
+
+        response = self.client.get(reverse("prometheus_metrics"), HTTP_AUTHORIZATION="Bearer secret")
+        body = response.content.decode()
+        self.assertIn("# TYPE myshop_request_total_ms histogram", body)
+        self.assertIn('myshop_request_total_ms_bucket{route="home",le="+Inf"} 1', body)
+        self.assertIn('myshop_request_queries_count{route="home"} 1', body)
+
+    def test_admin_page_lists_routes(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        self.client.get(reverse("home"))
+        response = self.client.get(reverse("admin:request_metrics"))
+        self.assertContains(response, "<code>home</code>", html=True)
+
+    def test_histogram_quantile_interpolates_within_bucket(self):
+        histogram = metrics.Histogram((10, 20))
+        for value in (12, 14, 16, 18):
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.5), 15)
+        histogram.observe(100)
+        self.assertEqual(histogram.counts, [0, 4, 1])
+
+
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(routers, "replica_configured", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = routers.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_alias(self, request):
+        with routers.replica_reads(request):
+            return self.router.db_for_read(Product)
+
+    def test_reads_go_to_replica_only_inside_read_only_views(self):
+        self.assertEqual(self.read_alias(self.factory.get("/")), routers.REPLICA)
+        self.assertIsNone(self.read_alias(self.factory.post("/")))
+        self.assertIsNone(self.router.db_for_read(Product))
+        self.assertEqual(self.router.db_for_write(Product), "default")
+
+    def test_sessions_and_users_are_read_from_primary(self):
+        from django.contrib.sessions.models import Session
+
+        with routers.replica_reads(self.factory.get("/")):
+            self.assertEqual(self.router.db_for_read(Session), "default")
+            self.assertEqual(self.router.db_for_read(User), "default")
+
+    def test_cache_fills_never_read_from_replica(self):
+        # Réplique en retard : rien de ce qui y est lu ne doit entrer dans le cache
+        cache.clear()
+        aliases = []
+
+        def view(request):
+            aliases.append(self.router.db_for_read(Product))
+            caching.get_or_set("lag", caching.CATALOGUE, lambda: aliases.append(self.router.db_for_read(Product)))
+            return HttpResponse("ok")
+
+        page = caching.cache_anonymous_page(caching.CATALOGUE)(routers.read_from_replica(view))
+        request = self.factory.get("/")
+        request.user = AnonymousUser()
+        page(request)
+        self.assertEqual(aliases, [None, None])
+
+        # Visiteur connecté : page hors cache, lue sur la réplique
+        request.user = User(username="admin")
+        page(request)
+        self.assertEqual(aliases[2:], [routers.REPLICA])
+
+    def test_customer_who_just_ordered_reads_from_primary(self):
+        product = Product.objects.create(name="Clavier", price=45000, quantity=5)
+        response = self.client.post(reverse("commande", args=[product.pk]), {**CUSTOMER, "quantity": 1})
+        self.assertIn(routers.STICKY_COOKIE, response.cookies)
+
+        request = self.factory.get("/")
+        request.COOKIES[routers.STICKY_COOKIE] = "1"
+        self.assertIsNone(self.read_alias(request))
+
+
+@skipUnless(routers.REPLICA in settings.DATABASES, "alias replica non configuré (DJANGO_SQLITE_REPLICA_PATH)")
+@similar_products_inline
+class ReplicaDatabaseTests(TransactionTestCase):
+    databases = "__all__"
+
+    # En test la réplique est un miroir de la base principale : routage forcé
+    @mock.patch.object(routers, "replica_configured", return_value=True)
+    def test_storefront_reads_on_replica_until_an_order_is_placed(self, replica_configured):
+        product = Product.objects.create(name="Clavier", price=45000, quantity=5)
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            self.client.get(reverse("product_detail", args=[product.pk]))
+        self.assertTrue(replica.captured_queries)
+
+        with mock.patch.object(invoices, "schedule_invoice"):
+            response = self.client.post(reverse("commande", args=[product.pk]), {**CUSTOMER, "quantity": 1})
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            self.client.get(response.url)
+        self.assertEqual(replica.captured_queries, [])
+
+
+    @mock.patch.object(routers, "replica_configured", return_value=True)
+    def test_lagging_replica_never_fills_the_page_cache(self, replica_configured):
+        cache.clear()
+        Product.objects.create(name="Clavier", price=45000, quantity=5)
+        # Réplique en retard : transaction de lecture ouverte avant l'écriture suivante
+        replica = connections["replica"].cursor()
+        replica.execute("BEGIN")
+        replica.execute("SELECT COUNT(*) FROM myapp_product")
+        try:
+            Product.objects.create(name="Souris", price=9000, quantity=5)
+            replica.execute("SELECT COUNT(*) FROM myapp_product")
+            self.assertEqual(replica.fetchone()[0], 1)
+
+            response = self.client.get(reverse("home_products"))
+        finally:
+            replica.execute("ROLLBACK")
+        self.assertIn("Souris", response.json()["html"])
+        self.assertIn("Souris", self.client.get(reverse("home_products")).json()["html"])
+
+
+@similar_products_inline
+class SimilarProductsTests(TestCase):
+    def setUp(self):
+        self.claviers, chaises = Category.objects.create(name="Claviers"), Category.objects.create(name="Chaises")
+        supplier = Supplier.objects.create(name="Logi", phone="0700")
+
+        def product(name, price, category, supplier=None, quantity=5):
+            product = Product.objects.create(name=name, price=price, quantity=quantity, supplier=supplier)
+            product.categories.add(category)
+            return product
+
+        self.clavier = product("Clavier", 45000, self.claviers, supplier)
+        self.souris = product("Souris", 40000, self.claviers, supplier)
+        product("Clavier épuisé", 44000, self.claviers, supplier, quantity=0)
+        self.ecran = product("Écran", 300000, self.claviers)
+        self.chaise = product("Chaise", 45000, chaises)
+        recommendations.rebuild()
+
+    def test_neighbours_ranked_by_shared_criteria_in_one_query(self):
+        with self.assertNumQueries(1):
+            similar = recommendations.similar_products(self.clavier)
+        # Catégorie + fournisseur + gamme de prix, puis catégorie, puis gamme
+        self.assertEqual(similar, [self.souris, self.ecran, self.chaise])
+
+    def test_neighbours_follow_category_changes_and_deletions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chaise.categories.add(self.claviers)
+        self.assertEqual(recommendations.similar_products(self.clavier), [self.souris, self.chaise, self.ecran])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.souris.delete()
+        self.assertEqual(recommendations.similar_products(self.clavier), [self.chaise, self.ecran])
+
+    def test_refresh_runs_inline_when_enabled(self):
+        with mock.patch.object(recommendations, "_executor") as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.chaise.categories.add(self.claviers)
+        executor.submit.assert_not_called()
+        self.assertIn(self.chaise, recommendations.similar_products(self.clavier))
+
+    @override_settings(SIMILAR_PRODUCTS_INLINE=False)
+    def test_refresh_runs_in_background_by_default(self):
+        with mock.patch.object(recommendations, "_executor") as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.chaise.categories.add(self.claviers)
+        executor.submit.assert_called_once()
+
+    def test_stock_only_save_does_not_refresh(self):
+        clavier = Product.objects.get(pk=self.clavier.pk)
+        with mock.patch.object(recommendations, "schedule_refresh") as schedule:
+            clavier.quantity = 2
+            clavier.save()
+            Product.objects.get(pk=self.souris.pk).save(update_fields=["quantity"])
+            schedule.assert_not_called()
+            clavier.price = 60000
+            clavier.save()
+        schedule.assert_called_once_with([clavier.pk])
+
+    def test_partial_refresh_matches_full_rebuild(self):
+        def stored():
+            return sorted(SimilarProduct.objects.values_list("product_id", "similar_id", "rank", "score"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ecran.price = 42000
+            self.ecran.supplier = self.clavier.supplier
+            self.ecran.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chaise.categories.add(self.claviers)
+        refreshed = stored()
+        recommendations.rebuild()
+        self.assertEqual(refreshed, stored())
+
+    def test_detail_page_shows_neighbours(self):
+        response = self.client.get(reverse("product_detail", args=[self.clavier.pk]))
+        self.assertEqual(response.context["similar_products"], [self.souris, self.ecran, self.chaise])
+
+
+class CoPurchaseTests(TestCase):
+    def setUp(self):
+        self.clavier = Product.objects.create(name="Clavier", price=45000, quantity=50)
+        self.souris = Product.objects.create(name="Souris", price=8000, quantity=50)
+        self.tapis = Product.objects.create(name="Tapis", price=3000, quantity=50)
+
+    def order(self, items, email="client@example.com", days_ago=1):
+        commande = make_commande()
+        commande.customer_email = email
+        place_order(commande, [(product, 1) for product in items])
+        # Commandes assez anciennes pour être comptées (SETTLE)
+        Commande.objects.filter(pk=commande.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return commande
+
+    def pairs(self):
+        return dict(((row.product_id, row.other_id), row.count) for row in CoPurchase.objects.all())
+
+    def test_pairs_counted_once_per_order_and_incrementally(self):
+        self.order([self.clavier, self.souris], email="a@example.com")
+        self.order([self.clavier, self.souris], email="b@example.com")
+        run = copurchase.update_index(chunk_size=1)
+        self.assertEqual(run.orders_processed, 2)
+        self.assertEqual(self.pairs(), {(self.clavier.pk, self.souris.pk): 2, (self.souris.pk, self.clavier.pk): 2})
+
+        # Passe suivante : seules les nouvelles commandes
+        self.order([self.clavier, self.souris], email="c@example.com")
+        commande = self.order([self.tapis])
+        Commande.objects.filter(pk=commande.pk).update(created_at=timezone.now())
+        run = copurchase.update_index()
+        self.assertEqual(run.orders_processed, 1)
+        self.assertEqual(self.pairs()[(self.clavier.pk, self.souris.pk)], 3)
+        self.assertEqual(copurchase.watermark(), commande.pk - 1)
+
+    def test_customer_orders_within_window_form_one_basket(self):
+        self.order([self.clavier], days_ago=3)
+        self.order([self.souris], days_ago=2)
+        self.order([self.tapis], days_ago=30)
+        copurchase.update_index()
+        self.assertEqual(self.pairs(), {(self.clavier.pk, self.souris.pk): 1, (self.souris.pk, self.clavier.pk): 1})
+
+    def test_frequently_bought_with_in_one_query(self):
+        for email in ("a@example.com", "b@example.com"):
+            self.order([self.clavier, self.souris, self.tapis], email=email)
+        self.order([self.clavier, self.souris], email="c@example.com")
+        self.order([self.clavier, self.tapis], email="d@example.com")
+        self.order([self.clavier, self.tapis], email="e@example.com")
+        copurchase.update_index()
+        Product.objects.filter(pk=self.tapis.pk).update(quantity=0)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(copurchase.frequently_bought_with(self.clavier), [self.souris])
+        response = self.client.get(reverse("product_detail", args=[self.clavier.pk]))
+        self.assertEqual(response.context["bought_together"], [self.souris])
+        self.assertContains(response, "Souvent commandés ensemble")
+
+
+    def test_only_one_pass_at_a_time(self):
+        self.order([self.clavier, self.souris], email="a@example.com")
+        CoPurchaseRun.objects.create(last_order_id=0)
+        with self.assertLogs("myapp.copurchase", "WARNING"):
+            self.assertIsNone(copurchase.update_index())
+        self.assertEqual(self.pairs(), {})
+        with self.assertRaises(CommandError):
+            call_command("update_copurchases", stdout=StringIO())
+
+        # Passe arrêtée net : plus rien ne bouge depuis STALE
+        CoPurchaseRun.objects.update(updated_at=timezone.now() - copurchase.STALE)
+        self.assertEqual(copurchase.update_index().orders_processed, 1)
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.claviers, self.ecrans = Category.objects.create(name="Claviers"), Category.objects.create(name="Écrans")
+        self.logi = Supplier.objects.create(name="Logi", phone="0700")
+
+        def product(name, price, categories, supplier=None, quantity=5):
+            product = Product.objects.create(name=name, price=price, quantity=quantity, supplier=supplier)
+            product.categories.set(categories)
+            return product
+
+        self.clavier = product("Clavier", 45000, [self.claviers], self.logi)
+        self.combo = product("Clavier écran", 120000, [self.claviers, self.ecrans], self.logi)
+        self.ecran = product("Écran", 95000, [self.ecrans])
+        product("Clavier épuisé", 40000, [self.claviers], self.logi, quantity=0)
+
+    def counts(self, filters):
+        return {
+            facet["name"]: {option["label"]: option["count"] for option in facet["options"]}
+            for facet in facets.build_facets(filters)
+        }
+
+    def test_counts_apply_other_dimensions_filters(self):
+        self.assertEqual(self.counts({}), {
+            "category": {"Claviers": 2, "Écrans": 2},
+            "supplier": {"Logi": 2},
+            "price": {"10 000 à 50 000 FCFA": 1, "50 000 à 100 000 FCFA": 1, "100 000 à 500 000 FCFA": 1},
+        })
+        self.assertEqual(self.counts({"category": self.ecrans.pk, "supplier": self.logi.pk}), {
+            "category": {"Claviers": 2, "Écrans": 1},
+            "supplier": {"Logi": 1},
+            "price": {"100 000 à 500 000 FCFA": 1},
+        })
+
+    def test_counts_cached_until_catalogue_changes(self):
+        facets.build_facets({})
+        with self.assertNumQueries(0):
+            facets.build_facets({"category": self.claviers.pk})
+
+        self.ecran.categories.add(self.claviers)
+        self.assertEqual(self.counts({})["category"]["Claviers"], 3)
+        self.logi.name = "Logitech"
+        self.logi.save()
+        self.assertEqual(self.counts({})["supplier"], {"Logitech": 2})
+
+    def test_home_filters_products(self):
+        response = self.client.get(reverse("home"), {"category": self.claviers.pk, "price": "3"})
+        self.assertEqual(list(response.context["products"]), [self.combo])
+        self.assertEqual(response.context["filters"], f"category={self.claviers.pk}&price=3")
+
+        response = self.client.get(
+            reverse("home_products"), {"supplier": self.logi.pk, "price": "nope", "format": "html"}
+        )
+        self.assertContains(response, "<h6>Clavier</h6>")
+        self.assertContains(response, "<h6>Clavier écran</h6>")
+        self.assertNotContains(response, "<h6>Écran</h6>")
+
+
+@mock.patch.object(restock, "SETTLE", timedelta(0))
+class LowStockAlertTests(TestCase):
+    def setUp(self):
+        self.logi = Supplier.objects.create(name="Logi", phone="0700")
+        SupplierDetail.objects.create(supplier=self.logi, contact_email="stock@logi.example")
+        self.clavier = Product.objects.create(name="Clavier", price=45000, quantity=8, supplier=self.logi)
+        self.souris = Product.objects.create(name="Souris", price=9000, quantity=40, supplier=self.logi)
+        self.orphelin = Product.objects.create(name="Câble", price=1000, quantity=2)
+
+    def events(self, product):
+        return list(product.stock_events.order_by("pk").values_list("delta", "source"))
+
+    def test_every_stock_change_is_logged(self):
+        place_order(make_commande(), [(self.clavier, 3)])
+        self.clavier.refresh_from_db()
+        self.clavier.quantity = 20
+        self.clavier.save()
+        self.clavier.name = "Clavier pro"
+        self.clavier.save()
+        product_io.import_products(BytesIO(b"reference,name,price,quantity\nKB-1,Clavier,45000,7\n"), "p.csv")
+        product_io.import_products(BytesIO(b"reference,price,quantity\nKB-1,45000,4\n"), "p.csv")
+
+        self.assertEqual(self.events(self.clavier), [
+            (8, StockEvent.ADJUSTMENT), (-3, StockEvent.ORDER), (15, StockEvent.ADJUSTMENT),
+        ])
+        imported = Product.objects.get(reference="KB-1")
+        self.assertEqual(self.events(imported), [(7, StockEvent.IMPORT), (-3, StockEvent.IMPORT)])
+
+    def test_logged_change_is_measured_against_stock_in_database(self):
+        stale = Product.objects.get(pk=self.clavier.pk)
+        # Commande validée après le chargement de la fiche : 8 -> 5
+        place_order(make_commande(), [(self.clavier, 3)])
+        stale.quantity = 10
+        stale.save()
+        self.assertEqual(self.events(self.clavier)[1:], [(-3, StockEvent.ORDER), (5, StockEvent.ADJUSTMENT)])
+        self.assertEqual(sum(delta for delta, _ in self.events(self.clavier)), 10)
+
+    def test_alerts_grouped_per_supplier_and_incremental(self):
+        # Câble sous le seuil, sans fournisseur ni STOCK_ALERT_EMAIL : journalisé seulement
+        with self.assertLogs("myapp.restock", "WARNING"):
+            restock.send_alerts()
+        self.assertEqual(mail.outbox, [])
+
+        place_order(make_commande(), [(self.clavier, 4), (self.souris, 1)])
+        # Déclaration de la passe (5, savepoint compris), mouvements, produits, fin de passe
+        with self.settings(STOCK_ALERT_EMAIL="achats@myshop.example"), self.assertNumQueries(9):
+            run, emails = restock.send_alerts()
+        self.assertEqual(run.products_alerted, 1)
+        self.assertEqual([email.to for email in mail.outbox], [["stock@logi.example"]])
+        self.assertIn("- Clavier : 4 en stock", mail.outbox[0].body)
+
+        # Rien de nouveau : aucun email
+        mail.outbox.clear()
+        restock.send_alerts()
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(
+            {supplier: [p.name for p in products] for supplier, products in restock.restock_report()},
+            {None: ["Câble"], self.logi: ["Clavier"]},
+        )
+
+    def test_only_one_pass_at_a_time(self):
+        with self.assertLogs("myapp.restock", "WARNING"):
+            restock.send_alerts()
+        place_order(make_commande(), [(self.clavier, 4)])
+        StockAlertRun.objects.create(last_event_id=restock.watermark())
+        with self.assertLogs("myapp.restock", "WARNING"):
+            self.assertEqual(restock.send_alerts(), (None, []))
+        with self.assertRaises(CommandError):
+            call_command("send_low_stock_alerts", stdout=StringIO())
+        self.assertEqual(mail.outbox, [])
+
+        # Passe arrêtée net : plus rien ne bouge depuis STALE, ses mouvements sont repris
+        StockAlertRun.objects.update(updated_at=timezone.now() - restock.STALE)
+        run, _ = restock.send_alerts()
+        self.assertEqual(run.products_alerted, 1)
+        self.assertEqual([email.to for email in mail.outbox], [["stock@logi.example"]])
+
+
+class StockLedgerTests(TestCase):
+    T0 = timezone.make_aware(datetime(2026, 3, 1, 12, 0))
+
+    def day(self, offset):
+        return self.T0 + timedelta(days=offset)
+
+    def at(self, offset):
+        return mock.patch("django.utils.timezone.now", return_value=self.day(offset))
+
+    def setUp(self):
+        with self.at(0):
+            self.clavier = Product.objects.create(name="Clavier", price=45000, quantity=10)
+            self.souris = Product.objects.create(name="Souris", price=9000, quantity=5)
+        with self.at(1):
+            self.assertEqual(ledger.take_snapshots(), 2)  # point de départ : tout le catalogue
+        with self.at(2):
+            self.commande = place_order(make_commande(), [(self.clavier, 3)])
+        with self.at(3):
+            self.clavier.refresh_from_db()
+            self.clavier.quantity = 20
+            self.clavier.save()
+        with self.at(4):
+            self.assertEqual(ledger.take_snapshots(), 1)  # seul le clavier a bougé
+        with self.at(5):
+            self.assertEqual(cancel_orders(Commande.objects.all()), 1)
+            place_order(make_commande(), [(self.souris, 2)])
+
+    def test_stock_at_from_nearest_snapshot(self):
+        self.clavier.refresh_from_db()
+        self.assertEqual(self.clavier.quantity, 23)
+        self.assertIsNotNone(Commande.objects.get(pk=self.commande.pk).cancelled_at)
+        with self.assertNumQueries(2):
+            self.assertEqual(ledger.stock_at(self.clavier, self.day(2.5)), 7)
+        self.assertEqual(ledger.stock_at(self.clavier, self.day(3.5)), 20)
+        self.assertEqual(ledger.stock_at(self.clavier, self.day(6)), 23)
+        # Avant le premier instantané : à rebours
+        self.assertEqual(ledger.stock_at(self.clavier, self.day(0.5)), 10)
+        self.assertEqual(ledger.stock_at(self.clavier, self.day(-1)), 0)
+
+    def test_catalogue_levels_and_movements(self):
+        self.assertEqual(ledger.stock_levels(self.day(4.5)), {self.clavier.pk: 20, self.souris.pk: 5})
+        self.assertEqual(ledger.stock_levels(self.day(6)), {self.clavier.pk: 23, self.souris.pk: 3})
+        self.assertEqual(ledger.stock_levels(self.day(0.5)), {self.clavier.pk: 10, self.souris.pk: 5})
+
+        report = ledger.movements(self.day(2), self.day(6))
+        self.assertEqual(report[self.clavier.pk], {
+            "opening": 10, StockEvent.ORDER: -3, StockEvent.ADJUSTMENT: 13,
+            StockEvent.CANCELLATION: 3, "closing": 23,
+        })
+        self.assertEqual(report[self.souris.pk], {"opening": 5, StockEvent.ORDER: -2, "closing": 3})
+
+    def test_cancelled_order_stays_traceable_in_the_ledger(self):
+        self.assertEqual(
+            list(StockEvent.objects.filter(commande_id=self.commande.pk).order_by("pk").values_list(
+                "product_id", "delta", "source"
+            )),
+            [(self.clavier.pk, -3, StockEvent.ORDER), (self.clavier.pk, 3, StockEvent.CANCELLATION)],
+        )
+        # Ajustements manuels : sans commande
+        self.assertTrue(StockEvent.objects.filter(source=StockEvent.ADJUSTMENT, commande__isnull=True).exists())
+
+    def test_deleted_product_keeps_its_history(self):
+        pk = self.souris.pk
+        with self.at(6.5):
+            self.souris.delete()
+        # Historique sous son identifiant, sortie du stock restant comprise
+        self.assertEqual(
+            list(StockEvent.objects.filter(product_id=pk).order_by("pk").values_list("delta", "source")),
+            [(5, StockEvent.ADJUSTMENT), (-2, StockEvent.ORDER), (-3, StockEvent.DELETION)],
+        )
+        self.assertEqual(StockSnapshot.objects.filter(product_id=pk).count(), 1)
+        self.assertEqual(ledger.stock_at(pk, self.day(0.5)), 5)
+        self.assertEqual(ledger.stock_at(pk, self.day(6)), 3)
+        self.assertEqual(ledger.stock_at(pk, self.day(7)), 0)
+
+        self.assertEqual(ledger.stock_levels(self.day(6)), {self.clavier.pk: 23, pk: 3})
+        self.assertEqual(ledger.stock_levels(self.day(7)), {self.clavier.pk: 23})
+        self.assertEqual(
+            ledger.movements(self.day(6), self.day(7))[pk], {"opening": 3, StockEvent.DELETION: -3, "closing": 0},
+        )
+        with self.at(8):
+            self.assertEqual(ledger.take_snapshots(), 2)  # la souris finit à zéro
+        self.assertEqual(StockSnapshot.objects.filter(product_id=pk).latest("taken_at").quantity, 0)
+        self.assertEqual(ledger.stock_levels(self.day(9)), {self.clavier.pk: 23})
+        self.assertEqual(ledger.stock_at(pk, self.day(9)), 0)
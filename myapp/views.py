@@ -1,24 +1,35 @@
 # views.py
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.template.loader import render_to_string
 from django.contrib import messages
 from django.conf import settings
 from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import ensure_csrf_cookie
 
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.utils import ImageReader
-from django.db.models import Q
+from django.db.models import Q, prefetch_related_objects
 
 from django.contrib.admin.models import LogEntry
 from django.db.models import Count, Q
 from django.db.models.functions import TruncMonth
 
 import os
+from concurrent.futures import TimeoutError as FuturesTimeout
 
 from .models import Product, HomePage, HomeSlide, Commande 
 from .forms import CommandeForm
+from .pagination import keyset_page
+from .search import search_products
+from .stock import InsufficientStock
+from .orders import place_order
+from .cart import Cart
+from . import caching, copurchase, facets, invoices, metrics, recommendations
+from .routers import pin_to_primary, read_from_replica
+from .caching import cache_anonymous_page
 
 
 
@@ -44,44 +55,97 @@ from .forms import CommandeForm
 #     })
 
 
+def catalogue_page(query=None, cursor=None, filters=None):
+    products = facets.apply_filters(Product.objects.filter(quantity__gt=0), filters or {})
+
+    if query:
+        # Résultats classés par pertinence (index plein texte)
+        return keyset_page(
+            search_products(products, query), cursor, fields=('search_rank', 'id')
+        )
+    return keyset_page(products, cursor)
+
+
+@cache_anonymous_page(caching.HOMEPAGE, caching.SLIDES, caching.CATALOGUE)
+@read_from_replica
 def home(request):
-    home_data = HomePage.objects.first()
-    slides = HomeSlide.objects.all()
+    home_data = caching.get_home_data()
+    slides = caching.get_slides()
 
     query = request.GET.get('q')
+    # Filtres catégorie / fournisseur / prix, comptes tirés du cache
+    filters = facets.parse_filters(request.GET)
 
-    products = Product.objects.filter(quantity__gt=0)
-
-    if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query)
-        )
+    # Seule la première page est rendue, la suite arrive par défilement
+    products, next_cursor = catalogue_page(query, request.GET.get('cursor'), filters)
 
     return render(request, 'home.html', {
         'home_data': home_data,
         'products': products,
+        'next_cursor': next_cursor,
         'slides': slides,
         'query': query,
+        'facets': facets.build_facets(filters, query),
+        'filters': facets.filters_query(filters),
     })
 
+
+@cache_anonymous_page(caching.CATALOGUE)
+@read_from_replica
+def home_products(request):
+    """
+    Page suivante du catalogue (défilement infini) : fragment HTML des
+    cartes produits et curseur de la page d'après.
+    """
+    query = request.GET.get('q')
+    products, next_cursor = catalogue_page(
+        query, request.GET.get('cursor'), facets.parse_filters(request.GET)
+    )
+    html = render_to_string(
+        'partials/product_cards.html', {'products': products}, request=request
+    )
+
+    if request.GET.get('format') == 'html':
+        response = HttpResponse(html)
+        response['X-Next-Cursor'] = next_cursor or ''
+        return response
+
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
 # =================== COMMANDE ===================
+def parse_quantity(value):
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def shortage_message(quantities):
+    """Message d'erreur listant les produits dont le stock ne suffit plus."""
+    products = Product.objects.filter(pk__in=list(quantities)).only('name', 'quantity')
+    missing = [
+        f"{p.name} ({p.quantity} disponible(s))"
+        for p in products if p.quantity < quantities[p.pk]
+    ]
+    return "Stock insuffisant : " + ", ".join(missing)
+
+
 def commande(request, product_id):
     product = get_object_or_404(Product, id=product_id)
 
     if request.method == "POST":
         form = CommandeForm(request.POST)
-        quantity = int(request.POST.get('quantity', 1))
+        quantity = parse_quantity(request.POST.get('quantity', 1))
 
         if form.is_valid():
-            cmd = form.save(commit=False)
-            cmd.product = product
-            cmd.quantity = quantity
-            cmd.total_amount = product.price * quantity
-            cmd.save()
-
-            messages.success(request, "Commande enregistrée avec succès !")
-            return redirect('commande_confirmation', cmd.id)
+            try:
+                cmd = place_order(form.save(commit=False), [(product, quantity)])
+            except InsufficientStock as exc:
+                form.add_error(None, shortage_message(exc.requested))
+            else:
+                messages.success(request, "Commande enregistrée avec succès !")
+                # La confirmation doit relire la commande : base principale
+                return pin_to_primary(redirect('commande_confirmation', cmd.id))
     else:
         form = CommandeForm()
 
@@ -91,55 +155,122 @@ def commande(request, product_id):
     })
 
 
-def commande_confirmation(request, commande_id):
-    commande = get_object_or_404(Commande, id=commande_id)
-    return render(request, 'commande_confirmation.html', {'commande': commande})
+# =================== PANIER ===================
+# Les cartes produits de la vitrine (pages en cache, communes à tous)
+# n'embarquent pas de jeton CSRF : le formulaire le lit dans le cookie
+# au moment de l'envoi, posé au besoin par csrf_cookie.
+@never_cache
+@ensure_csrf_cookie
+def csrf_cookie(request):
+    return HttpResponse(status=204)
 
 
-# =================== GENERATION PDF ===================
-def generate_pdf(request, commande_id):
-    commande = get_object_or_404(Commande, id=commande_id)
+def cart_add(request, product_id):
+    product = get_object_or_404(Product, id=product_id)
+    if request.method == "POST":
+        Cart(request).add(product.id, parse_quantity(request.POST.get('quantity', 1)))
+        messages.success(request, f"{product.name} ajouté au panier.")
+    return redirect('cart')
 
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="commande_{commande.id}.pdf"'
 
-    p = canvas.Canvas(response, pagesize=letter)
-    width, height = letter
+def cart_remove(request, product_id):
+    if request.method == "POST":
+        Cart(request).remove(product_id)
+    return redirect('cart')
 
-    logo_path = os.path.join(settings.MEDIA_ROOT, 'logo.png')
-    if os.path.exists(logo_path):
-        p.drawImage(ImageReader(logo_path), 50, height - 47, width=80, height=25)
 
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(180, height - 50, f"Confirmation de Commande - #{commande.id}")
+def cart(request):
+    """
+    Panier et validation : une seule commande pour tous les produits.
+    """
+    basket = Cart(request)
+    lines = basket.lines()
 
-    p.line(50, height - 60, 550, height - 60)
+    if request.method == "POST" and lines:
+        form = CommandeForm(request.POST)
+
+        if form.is_valid():
+            try:
+                cmd = place_order(form.save(commit=False), lines)
+            except InsufficientStock as exc:
+                form.add_error(None, shortage_message(exc.requested))
+            else:
+                basket.clear()
+                messages.success(request, "Commande enregistrée avec succès !")
+                return pin_to_primary(redirect('commande_confirmation', cmd.id))
+    else:
+        form = CommandeForm()
+
+    return render(request, 'panier.html', {
+        'lines': [
+            {'product': product, 'quantity': quantity, 'total': product.price * quantity}
+            for product, quantity in lines
+        ],
+        'total': sum(product.price * quantity for product, quantity in lines),
+        'form': form,
+    })
+
+
+@read_from_replica
+def commande_confirmation(request, commande_id):
+    commande = get_object_or_404(
+        Commande.objects.prefetch_related('lines'), id=commande_id
+    )
+    return render(request, 'commande_confirmation.html', {'commande': commande})
 
-    y = height - 100
-    details = [
-        ("Client", commande.customer_name),
-        ("Produit", commande.product.name),
-        ("Quantité", str(commande.quantity)),
-        ("Adresse", commande.customer_address),
-        ("Paiement", commande.payment),
-        ("Date", commande.created_at.strftime("%d/%m/%Y %H:%M")),
-        ("Total", f"{commande.total_amount} €"),
-    ]
 
-    for label, value in details:
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(100, y, f"{label} :")
-        p.setFont("Helvetica", 12)
-        p.drawString(250, y, value)
-        y -= 25
+# =================== GENERATION PDF ===================
+INVOICE_WAIT_TIMEOUT = getattr(settings, 'INVOICE_WAIT_TIMEOUT', 10)
+
 
-    p.drawString(100, y - 30, "Merci pour votre confiance 🚀")
-    p.showPage()
-    p.save()
+def generate_pdf(request, commande_id):
+    commande = get_object_or_404(Commande, id=commande_id)
 
+    # Facture inchangée depuis le dernier téléchargement : 304
+    etag = invoices.invoice_etag(commande)
+    not_modified = get_conditional_response(request, etag=quote_etag(etag))
+    if not_modified is not None:
+        return not_modified
+
+    path = invoices.invoice_path(commande)
+    if not os.path.exists(path):
+        prefetch_related_objects([commande], 'lines')
+        future = invoices.schedule_invoice(commande)
+        if future is not None:
+            try:
+                future.result(timeout=INVOICE_WAIT_TIMEOUT)
+            except FuturesTimeout:
+                response = HttpResponse(
+                    "Votre facture est en cours de génération, réessayez dans un instant.",
+                    status=202,
+                )
+                response['Retry-After'] = '5'
+                return response
+
+    response = FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=f"commande_{commande.id}.pdf",
+        content_type='application/pdf',
+    )
+    response['ETag'] = quote_etag(etag)
+    patch_cache_control(response, private=True, max_age=3600)
     return response
 
 
+# =================== MÉTRIQUES (PROMETHEUS) ===================
+def prometheus_metrics(request):
+    """Histogrammes par route, pour le personnel ou avec le jeton METRICS_TOKEN."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    allowed = request.user.is_staff or (
+        token and constant_time_compare(authorization, f"Bearer {token}")
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # =================== DASHBOARD ADMIN ===================
 # def dashboard_view(self, request):
 #     # 5 dernières commandes
@@ -212,16 +343,18 @@ def dashboard_view(self, request):
 #         'product': product,
         
 #     })
+@read_from_replica
 def product_detail(request, id):
     product = get_object_or_404(Product, id=id)
   
-    # 🔁 Produits similaires (même catégorie)
-    similar_products = Product.objects.filter(
-       
-    ).exclude(id=product.id)[:4]
+    # 🔁 Produits similaires : voisins précalculés (catégories, fournisseur, prix)
+    similar_products = recommendations.similar_products(product)
+    # 🛒 Souvent commandés ensemble : calculés chaque nuit (update_copurchases)
+    bought_together = copurchase.frequently_bought_with(product)
 
     return render(request, 'product_detail.html', {
         'product': product,
        
         'similar_products': similar_products,
+        'bought_together': bought_together,
     })
\ No newline at end of file
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'myapp.middleware.RequestMetricsMiddleware',  # en premier : mesure toute la chaîne
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Ajoute cette ligne 
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -81,7 +82,7 @@ DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 # ]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'myapp.metrics.TimedDjangoTemplates',  # DjangoTemplates chronométré
         # 'DIRS': [os.path.join(BASE_DIR, 'myapp', 'templates')],
         'DIRS': [BASE_DIR / 'templates'],  # 👈 OBLIGATOIRE
         'APP_DIRS': True,
@@ -102,12 +103,113 @@ WSGI_APPLICATION = 'myproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DJANGO_DB_ENGINE=postgresql pour la production (variables POSTGRES_*),
+# SQLite sinon. Les tests tournent sur le moteur choisi, y compris ceux
+# de concurrence (une connexion par thread).
+
+if os.environ.get('DJANGO_DB_ENGINE', 'sqlite') == 'postgresql':
+    POSTGRES_POOL_SIZE = int(os.environ.get('POSTGRES_POOL_SIZE', '0'))
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'myshop'),
+            'USER': os.environ.get('POSTGRES_USER', 'myshop'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'OPTIONS': {
+                'connect_timeout': 5,
+            },
+            # Connexion vérifiée avant réutilisation : un serveur redémarré
+            # ne fait pas échouer la première requête suivante
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if POSTGRES_POOL_SIZE:
+        # Pool psycopg partagé par les threads du processus (psycopg[pool]) ;
+        # incompatible avec CONN_MAX_AGE, qui reste à 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', '2')),
+            'max_size': POSTGRES_POOL_SIZE,
+            'timeout': int(os.environ.get('POSTGRES_POOL_TIMEOUT', '10')),
+        }
+    else:
+        # Connexions persistantes : une par thread, gardée CONN_MAX_AGE secondes
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DJANGO_CONN_MAX_AGE', '60'))
+else:
+    SQLITE_INIT = [
+        # Les lectures ne bloquent plus pendant une écriture (et inversement)
+        'PRAGMA journal_mode=WAL',
+        # En WAL, synchronisation au checkpoint seulement : sans risque de
+        # corruption, une coupure de courant peut perdre la dernière écriture
+        'PRAGMA synchronous=NORMAL',
+    ] if os.environ.get('DJANGO_SQLITE_WAL', '1') == '1' else []
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Les écritures concurrentes (commandes) attendent le verrou
+                # au lieu d'échouer immédiatement avec "database is locked"
+                'timeout': int(os.environ.get('DJANGO_SQLITE_TIMEOUT', '20')),
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': ';'.join(SQLITE_INIT),
+            },
+            # Base de test sur fichier : les tests de concurrence ouvrent
+            # une connexion par thread (impossible en mémoire partagée)
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
     }
-}
+
+# Réplique en lecture pour la vitrine et le tableau de bord (voir
+# myapp/routers.py) : POSTGRES_REPLICA_HOST en production, ou
+# DJANGO_SQLITE_REPLICA_PATH pour essayer en local. En test, la réplique
+# est un miroir de la base de test.
+REPLICA_HOST = os.environ.get('POSTGRES_REPLICA_HOST')
+REPLICA_PATH = os.environ.get('DJANGO_SQLITE_REPLICA_PATH')
+if REPLICA_HOST and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'OPTIONS': {**DATABASES['default']['OPTIONS']},
+        'HOST': REPLICA_HOST,
+        'PORT': os.environ.get('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+elif REPLICA_PATH and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'OPTIONS': {**DATABASES['default']['OPTIONS']},
+        'NAME': REPLICA_PATH,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['myapp.routers.ReplicaRouter']
+# Durée pendant laquelle un client qui vient d'écrire lit sur la base principale
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '15'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Mémoire locale par défaut ; DJANGO_CACHE_DIR bascule sur le cache fichier
+# (partagé entre les workers gunicorn d'une même machine).
+
+if os.environ.get('DJANGO_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['DJANGO_CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'myshop',
+        }
+    }
+
+STOREFRONT_CACHE_TIMEOUT = 60 * 15
 
 
 # Password validation
@@ -161,6 +263,35 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
 
+# Factures PDF rendues en arrière-plan et servies depuis ce dossier
+# (hors MEDIA_ROOT : elles ne doivent pas être publiques)
+INVOICE_CACHE_DIR = os.path.join(BASE_DIR, 'var', 'invoices')
+INVOICE_WORKERS = 2
+INVOICE_WAIT_TIMEOUT = 10
+# Export admin en un seul PDF limité à ce nombre de commandes (ZIP au-delà)
+INVOICE_PDF_EXPORT_LIMIT = 100
+
+# Imports de catalogue : fichiers envoyés gardés ici le temps du traitement
+PRODUCT_IMPORT_DIR = os.path.join(BASE_DIR, 'var', 'imports')
+PRODUCT_IMPORT_CHUNK_SIZE = 1000
+
+# Produits similaires recalculés sur place, sans thread (activé par les
+# tests qui exécutent les callbacks on_commit, voir myapp/tests.py)
+SIMILAR_PRODUCTS_INLINE = False
+
+# Référence des mesures de charge (commande run_benchmarks)
+BENCHMARK_BASELINE = os.path.join(BASE_DIR, 'benchmarks', 'baseline.json')
+
+# Métriques par requête (admin "Métriques" et /metrics/ pour Prometheus)
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', '0.1'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # jeton "Bearer" pour /metrics/
+
+# Alertes de stock bas (commande send_low_stock_alerts) : un email par
+# fournisseur (SupplierDetail.contact_email) ; les produits sans contact
+# fournisseur vont à STOCK_ALERT_EMAIL
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'boutique@localhost')
+STOCK_ALERT_EMAIL = os.environ.get('STOCK_ALERT_EMAIL', '')
+
 SILENCED_SYSTEM_CHECKS = [
     "ckeditor.W001",
 ]
@@ -53,10 +53,17 @@ urlpatterns = [
     path('admin/', admin_site.urls),
     # Pages du site
     path('', views.home, name='home'),
+    path('produits/', views.home_products, name='home_products'),
     path('commande/<int:product_id>/', views.commande, name='commande'),
+    path('panier/', views.cart, name='cart'),
+    path('panier/ajouter/<int:product_id>/', views.cart_add, name='cart_add'),
+    path('csrf/', views.csrf_cookie, name='csrf_cookie'),
+    path('panier/retirer/<int:product_id>/', views.cart_remove, name='cart_remove'),
     path('commande-confirmation/<int:commande_id>/', views.commande_confirmation, name='commande_confirmation'),
     path('commande-confirmation-pdf/<int:commande_id>/', views.generate_pdf, name='generate_pdf'),
     path('produit/<int:id>/', views.product_detail, name='product_detail'),
+    # Métriques par requête au format Prometheus
+    path('metrics/', views.prometheus_metrics, name='prometheus_metrics'),
     # path('produit/<int:id>/', views.product_detail, name='product_detail')
 
 ]